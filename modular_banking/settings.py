@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
 from dotenv import load_dotenv
 from urllib.parse import urlparse
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "users.middleware.AuditLoggingMiddleware",
+    "users.middleware.RateLimitHeadersMiddleware",
 ]
 
 ROOT_URLCONF = "modular_banking.urls"
@@ -98,32 +100,138 @@ if DATABASE_URL:
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.UserRateThrottle",  # per authenticated user
-        "rest_framework.throttling.AnonRateThrottle",  # per anonymous user
+        # Token buckets shared by all workers on the host (see RATE_LIMIT);
+        # per user when authenticated, per IP address otherwise. A view's
+        # throttle_scope applies on top of the user/anon rate, unless it is
+        # one of RATE_LIMIT["STANDALONE_SCOPES"].
+        "users.throttling.TokenBucketThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "user": "100/day",  # authenticated users: 100 requests per day
         "anon": "10/hour",  # anonymous users: 10 requests per hour
+        "strict": "10/hour",  # also for throttle_scope = "strict" (login, transfers)
+        "list": "20/minute",  # instead, for throttle_scope = "list" (list endpoints)
     },
+    # Also answers a saturated password hashing pool with 503
+    "EXCEPTION_HANDLER": "users.utils.exception_handler",
+}
+
+# Where the rate limit buckets live; must be on a local disk shared by
+# every worker process of the host (SQLite in WAL mode)
+RATE_LIMIT = {
+    "DB_PATH": os.getenv("RATE_LIMIT_DB", os.path.join(BASE_DIR, "ratelimit.sqlite3")),
+    # Scopes that replace the user/anon rate rather than applying on top
+    "STANDALONE_SCOPES": ["list"],
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "SIGNING_KEY": os.getenv("JWT_SECRET"),
+    # Tokens carry role/kyc_verified claims checked against JWT_USER_CACHE
+    "TOKEN_OBTAIN_SERIALIZER": "users.authentication.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.authentication.ClaimsTokenRefreshSerializer",
+}
+
+# Per-process cache of users' auth versions, used to trust token claims.
+# A role/KYC/password change made in another worker applies after TTL.
+JWT_USER_CACHE = {
+    "MAX_ENTRIES": 10000,
+    "TTL": 5,  # seconds
+}
+
+# Account number serials each process reserves from the sequence at a time
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+
+# Per-account-type cap on successful outgoing transfers per day
+DAILY_TRANSFER_LIMITS = {
+    "savings": os.getenv("DAILY_LIMIT_SAVINGS", "5000.00"),
+    "current": os.getenv("DAILY_LIMIT_CURRENT", "5000.00"),
+    "fd": os.getenv("DAILY_LIMIT_FD", "5000.00"),
+}
+
+# How long a claimed KYC record stays with its reviewer before it is requeued
+KYC_REVIEW_LEASE_SECONDS = int(os.getenv("KYC_REVIEW_LEASE_SECONDS", 15 * 60))
+
+# Idempotency-Key replay store for money-moving POST endpoints (per process)
+IDEMPOTENCY_MAX_ENTRIES = 10000
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # seconds
+IDEMPOTENCY_WAIT_TIMEOUT = 30  # seconds a duplicate waits for the in-flight request
+
+# Database errors (deadlocks, lock waits) a queued transfer may hit before it
+# is marked failed instead of retried
+TRANSFER_QUEUE_MAX_ATTEMPTS = 5
+
+# `manage.py test` writes audit rows, rollups and rejected transfers inline:
+# background writers use database connections of their own, which can't see
+# a test's transaction and would wait on its locks
+TESTING = sys.argv[1:2] == ["test"]
+
+# Rejected transfers are recorded through a background bulk writer
+FAILED_TRANSFER_BUFFER = {
+    "ENABLED": not TESTING,
+    "MAX_PENDING": 10000,  # rows buffered before new ones are dropped
+    "FLUSH_SIZE": 500,
+    "FLUSH_INTERVAL": 1.0,  # seconds
 }
 
+# Audit log pipeline: durability per request kind and the buffered sink's queue
+AUDIT_LOG = {
+    # sink used for non-durable writes
+    "SINK": "users.audit.SyncAuditSink" if TESTING else "users.audit.BufferedAuditSink",
+    "READ_DURABILITY": "async",
+    "WRITE_DURABILITY": "sync",
+    "MAX_PENDING": 50000,
+    "FLUSH_SIZE": 500,
+    "FLUSH_INTERVAL": 1.0,  # seconds
+}
+
+# Hourly audit rollups behind /audit/stats/, counted in-process and flushed
+AUDIT_ROLLUPS = {
+    "ENABLED": True,
+    "FLUSH_INTERVAL": None if TESTING else 5.0,  # seconds; None applies counts inline
+    # Workers stop counting an hour this long after it closes; rollup_audit_logs
+    # only rebuilds hours closed for twice as long
+    "SETTLE_SECONDS": 300,
+}
+
+# Audit rows older than the retention window are moved here by archive_audit_logs
+AUDIT_ARCHIVE_DIR = os.environ.get(
+    "AUDIT_ARCHIVE_DIR", os.path.join(BASE_DIR, "audit_archive")
+)
+AUDIT_ARCHIVE_RETENTION_DAYS = int(os.environ.get("AUDIT_ARCHIVE_RETENTION_DAYS", 90))
+AUDIT_ARCHIVE_BLOCK_SIZE = 1000  # rows per compressed block
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# How /kyc/<id>/document/ hands files over once permissions are checked:
+# "django" (FileResponse), "x-accel" (nginx) or "x-sendfile" (Apache).
+# For x-accel, map the prefix to MEDIA_ROOT in an `internal` nginx location.
+KYC_DOCUMENT_DELIVERY = os.getenv("KYC_DOCUMENT_DELIVERY", "django")
+KYC_DOCUMENT_ACCEL_PREFIX = "/protected-media/"
+
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",  # bcrypt
+    # bcrypt_sha256 with the work factor below, run in a bounded process pool
+    "users.hashers.PooledBCryptSHA256PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
 ]
 
+# bcrypt work factor; passwords are rehashed on login after it changes
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# Logins and password changes beyond WORKERS + MAX_QUEUE concurrent hashes
+# are answered with 503 instead of waiting
+BCRYPT_POOL = {
+    "ENABLED": True,
+    "WORKERS": int(os.getenv("BCRYPT_POOL_WORKERS", 2)),
+    "MAX_QUEUE": int(os.getenv("BCRYPT_POOL_MAX_QUEUE", 16)),
+    "TIMEOUT": 5.0,  # seconds
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -16,13 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
+# Media files are not served publicly; KYC documents go through the
+# permission-checked /api/v1/kyc/<id>/document/ endpoint.
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/v1/", include("users.urls")),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
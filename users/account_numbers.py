@@ -0,0 +1,121 @@
+import threading
+
+from django.conf import settings
+from django.db import connections, router
+
+from users.models import NumberSequence
+
+SEQUENCE = "account_number"
+# "0" + 10-digit serial + Luhn check digit. Numbers from before the
+# allocator are uuid-derived and never start with "0".
+PREFIX = "0"
+SERIAL_DIGITS = 10
+LENGTH = len(PREFIX) + SERIAL_DIGITS + 1
+
+
+def luhn_check_digit(digits):
+    total = 0
+    # Doubling starts from the rightmost payload digit
+    for position, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def format_account_number(serial):
+    payload = f"{PREFIX}{serial:0{SERIAL_DIGITS}d}"
+    return payload + luhn_check_digit(payload)
+
+
+def is_valid_account_number(number):
+    """
+    Whether `number` can be an account number at all, checked without a
+    query: 12 digits, and a correct check digit on allocator numbers.
+    Typos in those are caught here; legacy numbers only get the format check.
+    """
+    if len(number) != LENGTH or not number.isdigit():
+        return False
+    if not number.startswith(PREFIX):
+        return True
+    return luhn_check_digit(number[:-1]) == number[-1]
+
+
+def reserve_serials(count):
+    """
+    Take the next `count` serials from the sequence row and return the
+    first. Runs on a connection of its own and commits at once, so the
+    row lock isn't held for the caller's transaction and a rolled-back
+    caller can't hand the same block out twice.
+    """
+    alias = router.db_for_write(NumberSequence)
+    connection = connections.create_connection(alias)
+    table = connection.ops.quote_name(NumberSequence._meta.db_table)
+    try:
+        connection.set_autocommit(False)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET next_value = next_value + %s WHERE name = %s",
+                [count, SEQUENCE],
+            )
+            cursor.execute(
+                f"SELECT next_value FROM {table} WHERE name = %s", [SEQUENCE]
+            )
+            (end,) = cursor.fetchone()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    if end > 10**SERIAL_DIGITS:
+        raise OverflowError("Account number sequence exhausted")
+    return end - count
+
+
+class AccountNumberAllocator:
+    """
+    Hands out account numbers from blocks of `block_size` serials reserved
+    per process, so opening an account touches the sequence row only once
+    per block. Serials left in a block when the process exits are skipped.
+    """
+
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def allocate(self, count=1):
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    wanted = max(self.block_size, count - len(numbers))
+                    self._next = reserve_serials(wanted)
+                    self._end = self._next + wanted
+                take = min(count - len(numbers), self._end - self._next)
+                numbers.extend(
+                    format_account_number(serial)
+                    for serial in range(self._next, self._next + take)
+                )
+                self._next += take
+        return numbers
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = AccountNumberAllocator(
+                    getattr(settings, "ACCOUNT_NUMBER_BLOCK_SIZE", 100)
+                )
+    return _allocator
@@ -0,0 +1,178 @@
+import time
+import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction as db_transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from users.audit_rollups import get_accumulator
+from users.buffers import get_writer
+from users.models import AuditLog
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def count_written(entries):
+    """Add audit rows that are in the table to the rollups."""
+    accumulator = get_accumulator()
+    if accumulator is not None:
+        accumulator.add(entries)
+
+
+class SyncAuditSink:
+    """Writes audit rows before the request returns."""
+
+    def write(self, entries):
+        AuditLog.objects.bulk_create(entries)
+        # Rows written inside a transaction that rolls back are not counted
+        db_transaction.on_commit(lambda: count_written(entries))
+
+
+class BufferedAuditSink:
+    """
+    Hands audit rows to a background bulk writer. When its queue is full the
+    row is written inline instead, so audit entries are never dropped; those
+    writes show up as "overflowed" in the writer stats.
+    """
+
+    def __init__(self):
+        self.writer = get_writer(
+            "audit_log",
+            AuditLog,
+            audit_settings(),
+            on_overflow=self._write_inline,
+            on_written=count_written,
+        )
+
+    def _write_inline(self, entry):
+        entry.save()
+        count_written([entry])
+
+    def write(self, entries):
+        for entry in entries:
+            self.writer.add(entry)
+
+
+_sinks = {}
+
+
+@receiver(setting_changed)
+def _reset_sinks(setting, **kwargs):
+    if setting == "AUDIT_LOG":
+        _sinks.clear()
+
+
+def audit_settings():
+    return getattr(settings, "AUDIT_LOG", {})
+
+
+def get_sink(durable):
+    key = "sync" if durable else "async"
+    if key not in _sinks:
+        path = (
+            "users.audit.SyncAuditSink"
+            if durable
+            else audit_settings().get("SINK", "users.audit.BufferedAuditSink")
+        )
+        _sinks[key] = import_string(path)()
+    return _sinks[key]
+
+
+def is_durable(method):
+    # Reads default to the async sink, anything that can move money to sync
+    options = audit_settings()
+    if method in SAFE_METHODS:
+        return options.get("READ_DURABILITY", "async") == "sync"
+    return options.get("WRITE_DURABILITY", "sync") == "sync"
+
+
+def record(entries, durable=True):
+    # Sinks count rows into the rollups once they are actually stored
+    get_sink(durable).write(entries)
+
+
+def record_actions(user, actions):
+    """
+    Write one durable audit row per action, tagged with the current
+    request's IP and request id, in a single bulk insert.
+    """
+    context = current_context()
+    record(
+        [
+            AuditLog(
+                user=user,
+                action=action[:255],
+                ip_address=context.ip_address if context else None,
+                request_id=context.request_id[:64] if context else "",
+            )
+            for action in actions
+        ]
+    )
+
+
+_current_context = ContextVar("audit_context", default=None)
+
+
+class AuditContext:
+    """
+    Collects every audit event raised while serving one request so they are
+    persisted as a single AuditLog row when the response goes out.
+    """
+
+    def __init__(self, request, ip_address):
+        self.request_line = f"{request.method} {request.path}"
+        self.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        self.ip_address = ip_address
+        self.durable = is_durable(request.method)
+        self.started = time.monotonic()
+        self.user = None
+        self.events = [{"action": self.request_line}]
+
+    def add(self, action, user=None, durable=True, **details):
+        event = {"action": action, "at_ms": self._elapsed_ms()}
+        event.update(details)
+        self.events.append(event)
+        if user is not None and getattr(user, "pk", None):
+            self.user = user
+        self.durable = self.durable or durable
+
+    def _elapsed_ms(self):
+        return int((time.monotonic() - self.started) * 1000)
+
+    def to_entry(self, user, status_code):
+        # The first explicit event names the row; plain requests keep the
+        # request line as before.
+        action = self.events[1]["action"] if len(self.events) > 1 else self.request_line
+        return AuditLog(
+            user=user or self.user,
+            action=action[:255],
+            ip_address=self.ip_address,
+            request_id=self.request_id[:64],
+            status_code=status_code,
+            duration_ms=self._elapsed_ms(),
+            events=self.events,
+        )
+
+
+def open_context(request, ip_address):
+    context = AuditContext(request, ip_address)
+    return context, _current_context.set(context)
+
+
+def close_context(context, token, user, status_code):
+    _current_context.reset(token)
+    record([context.to_entry(user, status_code)], context.durable)
+
+
+def current_context():
+    return _current_context.get()
+
+
+def add_event(action, **details):
+    """Attach a structured event to the current request's audit row, if any."""
+    context = current_context()
+    if context is not None:
+        context.add(action, durable=False, **details)
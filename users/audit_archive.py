@@ -0,0 +1,218 @@
+import json
+import mmap
+import os
+import zlib
+from datetime import date, datetime, timezone
+
+from django.conf import settings
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx.json"
+MANIFEST = "manifest.json"
+
+
+class ArchiveCorrupted(Exception):
+    """A segment no longer matches the block ranges its sidecar records."""
+
+
+def _dump_row(row):
+    row = dict(row)
+    row["timestamp"] = row["timestamp"].isoformat()
+    return row
+
+
+def _load_row(row):
+    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+def day_of(timestamp):
+    """Segments are cut on UTC days."""
+    return timestamp.astimezone(timezone.utc).date()
+
+
+def _key(row):
+    return (row["timestamp"], row["id"])
+
+
+class AuditArchive:
+    """
+    Append-only, per-day archive of AuditLog rows.
+
+    Each day is one segment file made of independently zlib-compressed
+    NDJSON blocks, plus a small JSON sidecar recording every block's byte
+    range, timestamp/id bounds and the user ids it contains. Readers
+    memory-map the segment and only decompress the blocks the sidecar says
+    can match. Rows are always archived oldest first behind a cutoff that
+    only moves forward, so block order within a day is also key order.
+    """
+
+    def __init__(self, root, block_size=1000):
+        self.root = root
+        self.block_size = block_size
+
+    # --- paths and metadata ---
+
+    def _path(self, day, suffix):
+        return os.path.join(self.root, day.isoformat() + suffix)
+
+    def _write_json(self, path, data):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load_index(self, day):
+        try:
+            with open(self._path(day, INDEX_SUFFIX)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"blocks": []}
+
+    def days(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            date.fromisoformat(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.root)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    @property
+    def archived_before(self):
+        """Every row older than this has been moved out of the database."""
+        try:
+            with open(os.path.join(self.root, MANIFEST)) as f:
+                return datetime.fromisoformat(json.load(f)["archived_before"])
+        except FileNotFoundError:
+            return None
+
+    def mark_archived_before(self, cutoff):
+        current = self.archived_before
+        if current is None or cutoff > current:
+            self._write_json(
+                os.path.join(self.root, MANIFEST),
+                {"archived_before": cutoff.isoformat()},
+            )
+
+    # --- writing ---
+
+    def append(self, day, rows):
+        """
+        Append `rows` (dicts, ascending (timestamp, id), all on `day`) to the
+        day's segment. Rows at or before the last archived key are skipped,
+        so re-running after a crash never duplicates them.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        index = self.load_index(day)
+        if index["blocks"]:
+            last = index["blocks"][-1]
+            last_key = (datetime.fromisoformat(last["max_ts"]), last["max_id"])
+            rows = [row for row in rows if _key(row) > last_key]
+        if not rows:
+            return 0
+
+        with open(self._path(day, SEGMENT_SUFFIX), "ab") as segment:
+            offset = segment.seek(0, os.SEEK_END)
+            for start in range(0, len(rows), self.block_size):
+                block = rows[start : start + self.block_size]
+                payload = zlib.compress(
+                    "".join(json.dumps(_dump_row(r)) + "\n" for r in block).encode()
+                )
+                segment.write(payload)
+                index["blocks"].append(
+                    {
+                        "offset": offset,
+                        "length": len(payload),
+                        "count": len(block),
+                        "min_ts": block[0]["timestamp"].isoformat(),
+                        "max_ts": block[-1]["timestamp"].isoformat(),
+                        "min_id": block[0]["id"],
+                        "max_id": block[-1]["id"],
+                        "users": sorted(
+                            {r["user_id"] for r in block if r["user_id"] is not None}
+                        ),
+                    }
+                )
+                offset += len(payload)
+            segment.flush()
+            os.fsync(segment.fileno())
+        # The sidecar is replaced only after the data is durable
+        self._write_json(self._path(day, INDEX_SUFFIX), index)
+        return len(rows)
+
+    # --- reading ---
+
+    def iter_rows(
+        self, cursor=None, user=None, ip=None, action=None, since=None, until=None
+    ):
+        """Yield archived rows newest first, with the same filters as the API."""
+        for day in reversed(self.days()):
+            if since and day < day_of(since):
+                return
+            if until and day > day_of(until):
+                continue
+            if cursor and day > day_of(cursor[0]):
+                continue
+            yield from self._iter_day(day, cursor, user, ip, action, since, until)
+
+    def _iter_day(self, day, cursor, user, ip, action, since, until):
+        blocks = self.load_index(day)["blocks"]
+        if not blocks:
+            return
+        path = self._path(day, SEGMENT_SUFFIX)
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                # mmap refuses empty files
+                raise ArchiveCorrupted(f"{path} is empty but indexed")
+            segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with segment:
+            for block in reversed(blocks):
+                min_key = (datetime.fromisoformat(block["min_ts"]), block["min_id"])
+                if cursor and min_key >= cursor:
+                    continue
+                if user is not None and user not in block["users"]:
+                    continue
+                if until and min_key[0] >= until:
+                    continue
+                if since and datetime.fromisoformat(block["max_ts"]) < since:
+                    return
+
+                payload = self._read_block(day, segment, block)
+                rows = [_load_row(json.loads(line)) for line in payload.splitlines()]
+                for row in reversed(rows):
+                    if cursor and _key(row) >= cursor:
+                        continue
+                    if user is not None and row["user_id"] != user:
+                        continue
+                    if ip and row["ip_address"] != ip:
+                        continue
+                    if action and not row["action"].startswith(action):
+                        continue
+                    if since and row["timestamp"] < since:
+                        continue
+                    if until and row["timestamp"] >= until:
+                        continue
+                    yield row
+
+    def _read_block(self, day, segment, block):
+        start, length = block["offset"], block["length"]
+        data = segment[start : start + length]
+        if len(data) < length:
+            raise ArchiveCorrupted(
+                f"{self._path(day, SEGMENT_SUFFIX)} is truncated at byte {start}"
+            )
+        try:
+            return zlib.decompress(data)
+        except zlib.error as exc:
+            raise ArchiveCorrupted(
+                f"{self._path(day, SEGMENT_SUFFIX)}: block at byte {start} "
+                f"does not decompress ({exc})"
+            ) from exc
+
+
+def get_archive():
+    root = getattr(settings, "AUDIT_ARCHIVE_DIR", None)
+    if not root:
+        return None
+    return AuditArchive(root, getattr(settings, "AUDIT_ARCHIVE_BLOCK_SIZE", 1000))
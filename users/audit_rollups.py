@@ -0,0 +1,302 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, IntegrityError, close_old_connections
+from django.db import transaction as db_transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncHour
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import AuditLog, AuditRollup, User
+
+logger = logging.getLogger(__name__)
+
+# Audit row action prefix -> rollup action class, first match wins
+ACTION_CLASSES = (
+    ("Transferred ", "transfer"),
+    ("Transfer failed", "transfer_failed"),
+    ("transfer_rejected", "transfer_failed"),
+    ("Queued transfer", "transfer_queued"),
+    ("Batch transfer", "transfer_batch"),
+    ("KYC verified", "kyc_verified"),
+    ("KYC rejected", "kyc_rejected"),
+    ("Re-submitted KYC", "kyc_submitted"),
+    ("Bulk KYC review", "kyc_bulk_review"),
+    ("User registered", "registration"),
+    ("password_reset", "password_reset"),
+    ("Created bank account", "account_created"),
+    ("Exported ", "statement_export"),
+)
+DEFAULT_CLASS = "request"
+ACTION_CLASS_NAMES = list(dict.fromkeys(name for _, name in ACTION_CLASSES)) + [
+    DEFAULT_CLASS
+]
+
+# Query parameter -> AuditRollup field
+GROUP_FIELDS = {
+    "hour": "hour",
+    "action_class": "action_class",
+    "user": "user_id",
+    "ip": "ip_address",
+}
+
+
+def action_class(action):
+    for prefix, name in ACTION_CLASSES:
+        if action.startswith(prefix):
+            return name
+    return DEFAULT_CLASS
+
+
+def action_class_expression():
+    """`action_class` as a SQL expression over AuditLog.action."""
+    return Case(
+        *[
+            When(action__startswith=prefix, then=Value(name))
+            for prefix, name in ACTION_CLASSES
+        ],
+        default=Value(DEFAULT_CLASS),
+        output_field=CharField(),
+    )
+
+
+def hour_of(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_settings():
+    return getattr(settings, "AUDIT_ROLLUPS", {})
+
+
+def settled_before(now=None):
+    """
+    Hours before this one are left to `rebuild_rollups`: workers stop adding
+    to an hour `SETTLE_SECONDS` after it closes, and rebuilds wait twice as
+    long so a flush that is still running can't land on a rebuilt hour.
+    """
+    settle = timedelta(seconds=rollup_settings().get("SETTLE_SECONDS", 300))
+    return hour_of((now or timezone.now()) - 2 * settle)
+
+
+def apply_counts(counts, errors):
+    """Add per-key counts to the rollup rows, creating missing ones."""
+    # Sorted so concurrent flushes from several processes lock rows in the
+    # same order.
+    for key in sorted(counts):
+        hour, name, user_id, ip_address = key
+        lookup = {
+            "hour": hour,
+            "action_class": name,
+            "user_id": user_id,
+            "ip_address": ip_address,
+        }
+        increments = {
+            "count": F("count") + counts[key],
+            "errors": F("errors") + errors[key],
+        }
+        if AuditRollup.objects.filter(**lookup).update(**increments):
+            continue
+        try:
+            with db_transaction.atomic():
+                AuditRollup.objects.create(
+                    **lookup, count=counts[key], errors=errors[key]
+                )
+        except IntegrityError:
+            # Another process created the row first
+            AuditRollup.objects.filter(**lookup).update(**increments)
+
+
+class RollupAccumulator:
+    """
+    Counts audit rows per rollup key in memory once the audit sinks have
+    stored them and adds them to AuditRollup from a background thread
+    every `flush_interval` seconds, and once more at interpreter shutdown.
+    With no `flush_interval` there is no thread and every `add` is applied
+    right away. Counts for hours that closed more than `settle_seconds` ago
+    are discarded, since those hours may already have been rebuilt. Counts
+    lost to a crash, a database error or a late write are restored by
+    `rollup_audit_logs`, which recomputes hours from the AuditLog table.
+    """
+
+    def __init__(self, flush_interval=5.0, settle_seconds=300):
+        self.flush_interval = flush_interval
+        self.settle = timedelta(seconds=settle_seconds)
+        self._counts = Counter()
+        self._errors = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if flush_interval:
+            self._thread = threading.Thread(
+                target=self._run, name="audit-rollups", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def add(self, entries):
+        now = timezone.now()
+        with self._lock:
+            for entry in entries:
+                key = (
+                    hour_of(entry.timestamp or now),
+                    action_class(entry.action),
+                    entry.user_id or 0,
+                    entry.ip_address or "",
+                )
+                self._counts[key] += 1
+                if (entry.status_code or 0) >= 400:
+                    self._errors[key] += 1
+        if self._thread is None:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+                errors, self._errors = self._errors, Counter()
+            settled = hour_of(timezone.now() - self.settle) - timedelta(hours=1)
+            late = [key for key in counts if key[0] <= settled]
+            if late:
+                logger.warning(
+                    "Discarding audit rollup counts for %d keys of settled hours, "
+                    "run rollup_audit_logs to include them",
+                    len(late),
+                )
+                for key in late:
+                    del counts[key]
+                    errors.pop(key, None)
+            if not counts:
+                return
+            close_old_connections()
+            try:
+                apply_counts(counts, errors)
+            except DatabaseError:
+                logger.exception("Dropping %d audit rollup keys", len(counts))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+_accumulator = None
+_accumulator_lock = threading.Lock()
+
+
+@receiver(setting_changed)
+def _reset_accumulator(setting, **kwargs):
+    global _accumulator
+    if setting == "AUDIT_ROLLUPS":
+        with _accumulator_lock:
+            if _accumulator is not None:
+                _accumulator.close()
+            _accumulator = None
+
+
+def get_accumulator():
+    """The process-wide accumulator, or None when rollups are disabled."""
+    global _accumulator
+    options = rollup_settings()
+    if not options.get("ENABLED", True):
+        return None
+    with _accumulator_lock:
+        if _accumulator is None:
+            _accumulator = RollupAccumulator(
+                options.get("FLUSH_INTERVAL", 5.0), options.get("SETTLE_SECONDS", 300)
+            )
+        return _accumulator
+
+
+def rebuild_rollups(since, until):
+    """
+    Recompute the rollup rows of the hours in [since, until) from AuditLog
+    with one grouped query. Both bounds must be on the hour. Hours the
+    workers may still add to are left alone, see `settled_before`.
+    """
+    until = min(until, settled_before())
+    if since >= until:
+        return 0
+    groups = (
+        AuditLog.objects.filter(timestamp__gte=since, timestamp__lt=until)
+        .annotate(
+            rollup_hour=TruncHour("timestamp"),
+            rollup_class=action_class_expression(),
+            rollup_user=Coalesce("user_id", 0),
+            rollup_ip=Coalesce("ip_address", Value(""), output_field=CharField()),
+        )
+        .values("rollup_hour", "rollup_class", "rollup_user", "rollup_ip")
+        .annotate(total=Count("id"), failed=Count("id", filter=Q(status_code__gte=400)))
+        .order_by()
+    )
+    with db_transaction.atomic():
+        AuditRollup.objects.filter(hour__gte=since, hour__lt=until).delete()
+        created = AuditRollup.objects.bulk_create(
+            [
+                AuditRollup(
+                    hour=group["rollup_hour"],
+                    action_class=group["rollup_class"],
+                    user_id=group["rollup_user"],
+                    ip_address=group["rollup_ip"],
+                    count=group["total"],
+                    errors=group["failed"],
+                )
+                for group in groups
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def rollup_stats(since, until, group_by, filters, limit):
+    """
+    Sum the rollups of [since, until) grouped by the `GROUP_FIELDS` names in
+    `group_by`. Rows are ordered by hour when grouping by hour, otherwise by
+    count, highest first.
+    """
+    rollups = AuditRollup.objects.filter(hour__gte=hour_of(since), hour__lt=until)
+    if filters.get("action_class"):
+        rollups = rollups.filter(action_class__in=filters["action_class"])
+    if filters.get("user") is not None:
+        rollups = rollups.filter(user_id=filters["user"])
+    if filters.get("ip"):
+        rollups = rollups.filter(ip_address=filters["ip"])
+
+    fields = [GROUP_FIELDS[name] for name in group_by]
+    ordering = ["hour", "-total"] if "hour" in fields else ["-total"]
+    rows = list(
+        rollups.values(*fields)
+        .annotate(total=Sum("count"), failed=Sum("errors"))
+        .order_by(*ordering)[:limit]
+    )
+    for row in rows:
+        row["count"] = row.pop("total")
+        row["errors"] = row.pop("failed")
+
+    if "user_id" in fields:
+        usernames = dict(
+            User.objects.filter(
+                pk__in={row["user_id"] for row in rows if row["user_id"]}
+            ).values_list("pk", "username")
+        )
+        for row in rows:
+            row["user_id"] = row["user_id"] or None
+            row["username"] = usernames.get(row["user_id"])
+    if "ip_address" in fields:
+        for row in rows:
+            row["ip_address"] = row["ip_address"] or None
+    return rows
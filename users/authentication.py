@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import transaction as db_transaction
+from django.db.models import F
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+
+# User fields carried in the tokens. "ver" is the user's auth_version when
+# the token was issued; any later change to these fields bumps it. "cver" is
+# the credentials_version, bumped by password and is_active changes.
+CLAIM_FIELDS = ("username", "role", "kyc_verified")
+VERSION_CLAIM = "ver"
+CREDENTIALS_CLAIM = "cver"
+
+
+def set_user_claims(token, user):
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    token[VERSION_CLAIM] = user.auth_version
+    token[CREDENTIALS_CLAIM] = user.credentials_version
+
+
+def revoked(token, credentials_version):
+    # Tokens from before this claim existed count as version 0
+    return token.get(CREDENTIALS_CLAIM, 0) < credentials_version
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user claims. Access tokens minted from it
+    read the claims from the database again, so a refresh picks up role
+    and KYC changes made since login. A refresh token issued before a
+    password change or deactivation mints nothing.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = User.objects.filter(pk=self[api_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            if revoked(self, user.credentials_version):
+                raise TokenError("Token was revoked by a credentials change")
+            set_user_claims(access, user)
+        return access
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class UserVersionCache:
+    """
+    Bounded, TTL-evicted map of user id -> current (auth_version,
+    credentials_version), kept per process. Changes made in this process
+    drop the entry on commit; other processes see them once their entry
+    expires.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            version, expires_at = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return version
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                options = getattr(settings, "JWT_USER_CACHE", {})
+                _cache = UserVersionCache(
+                    max_entries=options.get("MAX_ENTRIES", 10000),
+                    ttl=options.get("TTL", 5),
+                )
+    return _cache
+
+
+def bump_auth_version(user_ids, **changes):
+    """
+    Apply `changes` to the users and bump their auth_version, so tokens
+    issued before no longer stand in for the user row. Password and
+    is_active changes also bump credentials_version, revoking those tokens.
+    """
+    user_ids = list(user_ids)
+    if any(field in User.CREDENTIAL_FIELDS for field in changes):
+        changes["credentials_version"] = F("credentials_version") + 1
+    updated = User.objects.filter(pk__in=user_ids).update(
+        auth_version=F("auth_version") + 1, **changes
+    )
+    cache = get_user_cache()
+    # Dropped after commit so a concurrent request can't re-cache the old one
+    db_transaction.on_commit(lambda: cache.discard(user_ids))
+    return updated
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the token claims while
+    the token's version matches the user's current auth_version, saving the
+    user query on most requests. The current version comes from the per-
+    process cache; a stale token falls back to loading the user row, and a
+    token issued before a password change or deactivation is refused.
+
+    The user is a User instance with only the claimed fields loaded; any
+    other field is fetched from the database when first read.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        version = validated_token.get(VERSION_CLAIM)
+        if user_id is None or version is None:
+            return super().get_user(validated_token)
+        # simplejwt writes the id claim as a string
+        user_id = User._meta.pk.to_python(user_id)
+
+        cache = get_user_cache()
+        current = cache.get(user_id)
+        if current is None:
+            current = (
+                User.objects.filter(pk=user_id, is_active=True)
+                .values_list("auth_version", "credentials_version")
+                .first()
+            )
+            if current is None:
+                # Missing or inactive; let the stock lookup raise
+                return super().get_user(validated_token)
+            cache.set(user_id, current)
+        auth_version, credentials_version = current
+        if revoked(validated_token, credentials_version):
+            raise AuthenticationFailed(
+                "Token was issued before a password change, log in again.",
+                code="token_revoked",
+            )
+        if auth_version != version:
+            return super().get_user(validated_token)
+
+        loaded = {"id": user_id, "is_active": True, "auth_version": version}
+        loaded.update((field, validated_token[field]) for field in CLAIM_FIELDS)
+        # from_db() expects the values in model field order
+        fields = [
+            field.attname
+            for field in User._meta.concrete_fields
+            if field.attname in loaded
+        ]
+        return User.from_db(
+            DEFAULT_DB_ALIAS, fields, [loaded[field] for field in fields]
+        )
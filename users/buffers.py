@@ -0,0 +1,218 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.db import DataError, DatabaseError, IntegrityError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class BulkWriter:
+    """
+    Bounded in-process buffer of unsaved model instances, written off the
+    request path with bulk_create by a background thread whenever
+    `flush_size` rows are pending or `flush_interval` seconds have passed,
+    and once more at interpreter shutdown. When the buffer is full new rows
+    go to `on_overflow` if given, otherwise they are dropped; either way they
+    are counted rather than blocking the caller.
+
+    A batch that fails because the database is unavailable (a lock wait,
+    a lost connection) is kept and retried with exponential backoff, from
+    `retry_delay` up to `max_retry_delay` seconds. Rows the database rejects
+    outright are written one at a time so only those are dropped.
+    `on_written` is called with every list of rows once it is in the table.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_pending=10000,
+        flush_size=500,
+        flush_interval=1.0,
+        on_overflow=None,
+        retry_delay=0.1,
+        max_retry_delay=30.0,
+        on_written=None,
+    ):
+        self.model = model
+        self.max_pending = max_pending
+        self.on_overflow = on_overflow
+        self.on_written = on_written
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._held = []  # a batch waiting to be retried
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.flushed = 0
+        self.dropped = 0
+        self.overflowed = 0
+        self.failed = 0
+        self.retries = 0
+        self.high_water = 0
+        self._thread = threading.Thread(
+            target=self._run, name=f"bulk-writer-{model._meta.label}", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, obj):
+        try:
+            self._queue.put_nowait(obj)
+        except queue.Full:
+            if self.on_overflow is None:
+                with self._counts_lock:
+                    self.dropped += 1
+                return False
+            self.on_overflow(obj)
+            with self._counts_lock:
+                self.overflowed += 1
+            return True
+        pending = self._queue.qsize()
+        if pending > self.high_water:
+            self.high_water = pending
+        if pending >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Write every pending row; False if a batch is held for a retry."""
+        with self._flush_lock:
+            while True:
+                batch, self._held = self._held, []
+                while len(batch) < self.flush_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return True
+                if not self._write(batch):
+                    self._held = batch
+                    return False
+
+    def _write(self, batch):
+        # Written rows are removed from `batch`, so what is left after a
+        # failure is exactly what still has to be retried.
+        close_old_connections()
+        try:
+            try:
+                self.model.objects.bulk_create(batch)
+            except (DataError, IntegrityError):
+                self._write_each(batch)
+            else:
+                with self._counts_lock:
+                    self.flushed += len(batch)
+                self._written(batch[:])
+                batch.clear()
+        except DatabaseError:
+            logger.warning(
+                "Could not write %d buffered %s rows, will retry",
+                len(batch),
+                self.model._meta.label,
+                exc_info=True,
+            )
+            with self._counts_lock:
+                self.retries += 1
+            return False
+        return True
+
+    def _write_each(self, batch):
+        while batch:
+            try:
+                self.model.objects.bulk_create(batch[:1])
+            except (DataError, IntegrityError):
+                logger.exception("Dropping a buffered %s row", self.model._meta.label)
+                with self._counts_lock:
+                    self.failed += 1
+            else:
+                with self._counts_lock:
+                    self.flushed += 1
+                self._written(batch[:1])
+            batch.pop(0)
+
+    def _written(self, rows):
+        if self.on_written is None:
+            return
+        try:
+            self.on_written(rows)
+        except Exception:
+            # The rows are stored; a failing callback must not retry them
+            logger.exception("on_written failed for %s rows", self.model._meta.label)
+
+    def _run(self):
+        delay = None
+        while not self._stopped.is_set():
+            if delay is None:
+                self._wakeup.wait(self.flush_interval)
+            else:
+                # Backing off: new rows must not cut the wait short
+                self._stopped.wait(delay)
+            self._wakeup.clear()
+            if self.flush():
+                delay = None
+            else:
+                delay = min(2 * (delay or self.retry_delay), self.max_retry_delay)
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        if self.flush():
+            return
+        with self._flush_lock:
+            lost, self._held = self._held, []
+            while True:
+                try:
+                    lost.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        logger.error(
+            "Dropping %d buffered %s rows at shutdown",
+            len(lost),
+            self.model._meta.label,
+        )
+        with self._counts_lock:
+            self.failed += len(lost)
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() + len(self._held),
+            "capacity": self.max_pending,
+            "high_water": self.high_water,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "overflowed": self.overflowed,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+
+def get_writer(name, model, options, on_overflow=None, on_written=None):
+    """Return the process-wide writer `name`, starting it on first use."""
+    with _writers_lock:
+        if name not in _writers:
+            _writers[name] = BulkWriter(
+                model,
+                max_pending=options.get("MAX_PENDING", 10000),
+                flush_size=options.get("FLUSH_SIZE", 500),
+                flush_interval=options.get("FLUSH_INTERVAL", 1.0),
+                on_overflow=on_overflow,
+                retry_delay=options.get("RETRY_DELAY", 0.1),
+                max_retry_delay=options.get("MAX_RETRY_DELAY", 30.0),
+                on_written=on_written,
+            )
+        return _writers[name]
+
+
+def writer_stats():
+    with _writers_lock:
+        return {name: writer.stats() for name, writer in _writers.items()}
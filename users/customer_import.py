@@ -0,0 +1,296 @@
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import IntegrityError
+from django.db import transaction as db_transaction
+
+from users.account_numbers import PREFIX, get_allocator, is_valid_account_number
+from users.documents import store_document
+from users.models import KYC, BankAccount, LedgerEntry, User
+
+FIELDS = (
+    "username",
+    "email",
+    "full_name",
+    "password_hash",  # Django-encoded, e.g. "bcrypt_sha256$..."; blank = unusable
+    "document_type",
+    "document",  # name of the KYC file in storage; blank = no KYC record
+    "kyc_status",  # pending / verified / rejected, default pending
+    "account_type",  # blank = no account
+    "balance",
+    "account_number",  # legacy number to keep, blank = allocate one
+)
+KYC_STATUSES = ("pending", "verified", "rejected")
+DOCUMENT_TYPES = {value for value, _ in KYC.DOCUMENT_TYPES}
+ACCOUNT_TYPES = {value for value, _ in BankAccount.ACCOUNT_TYPES}
+
+
+class RowError(Exception):
+    pass
+
+
+def partition(path, data_start, count):
+    """
+    Split the bytes of `path` after `data_start` (the CSV header) into
+    `count` ranges. A range boundary may fall inside a line; that line is
+    read by the range it starts in.
+    """
+    size = os.path.getsize(path)
+    step = max((size - data_start) // count, 1)
+    bounds = [data_start + step * i for i in range(count)] + [size]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def read_lines(path, start, end, aligned):
+    """
+    Yield (offset, line) for the lines starting in [start, end). `aligned`
+    says `start` is known to be a line start, as for the header end or a
+    checkpoint; otherwise reading begins at the first line after it.
+    """
+    with open(path, "rb") as f:
+        if aligned:
+            f.seek(start)
+        else:
+            f.seek(start - 1)
+            f.readline()
+        while True:
+            offset = f.tell()
+            if offset >= end:
+                return
+            line = f.readline()
+            if not line:
+                return
+            yield offset, line
+
+
+def parse_line(line, header):
+    text = line.decode("utf-8").strip()
+    if not text:
+        return None
+    if header is None:
+        raw = json.loads(text)
+        if not isinstance(raw, dict):
+            raise RowError("row is not a JSON object")
+        return raw
+    return dict(zip(header, next(csv.reader([text]))))
+
+
+def clean_row(raw):
+    """Validated User/KYC/BankAccount values of one input row."""
+    row = {field: str(raw.get(field) or "").strip() for field in FIELDS}
+    if not row["username"]:
+        raise RowError("username is required")
+    if len(row["username"]) > 150:
+        raise RowError("username is too long")
+    if row["document"]:
+        if row["document_type"] not in DOCUMENT_TYPES:
+            raise RowError(f"unknown document_type {row['document_type']!r}")
+        if not KYC._meta.get_field("file").storage.exists(row["document"]):
+            raise RowError(f"document {row['document']!r} is not in storage")
+    row["kyc_status"] = row["kyc_status"] or "pending"
+    if row["kyc_status"] not in KYC_STATUSES:
+        raise RowError(f"unknown kyc_status {row['kyc_status']!r}")
+    if row["password_hash"]:
+        try:
+            identify_hasher(row["password_hash"])
+        except ValueError:
+            raise RowError("password_hash is not in a known format")
+    else:
+        row["password_hash"] = make_password(None)  # must reset the password
+    if row["account_type"]:
+        if row["account_type"] not in ACCOUNT_TYPES:
+            raise RowError(f"unknown account_type {row['account_type']!r}")
+        try:
+            row["balance"] = Decimal(row["balance"] or "0").quantize(Decimal("0.01"))
+        except InvalidOperation:
+            raise RowError(f"invalid balance {row['balance']!r}")
+        if row["account_number"] and not is_valid_account_number(row["account_number"]):
+            raise RowError(f"invalid account_number {row['account_number']!r}")
+        if row["account_number"].startswith(PREFIX):
+            # Allocated numbers start with PREFIX; a legacy one there would
+            # collide with a serial the allocator hands out later
+            raise RowError(
+                f"account_number {row['account_number']!r} is in the allocator's "
+                "range, leave it blank to allocate one"
+            )
+    row["email"] = row["email"] or None
+    return row
+
+
+def existing(rows):
+    """Usernames and emails of `rows` that are already taken."""
+    usernames = set(
+        User.objects.filter(username__in=[r["username"] for r in rows]).values_list(
+            "username", flat=True
+        )
+    )
+    emails = set(
+        User.objects.filter(
+            email__in=[r["email"] for r in rows if r["email"]]
+        ).values_list("email", flat=True)
+    )
+    return usernames, emails
+
+
+def insert_rows(rows):
+    """
+    Create the users, their KYC records and accounts of `rows` with one
+    bulk INSERT per table, plus opening-balance ledger postings. Ids are
+    read back by natural key, as MySQL's bulk_create doesn't return them.
+    KYC documents are registered in the blob store one by one.
+    """
+    User.objects.bulk_create(
+        [
+            User(
+                username=row["username"],
+                email=row["email"],
+                full_name=row["full_name"],
+                password=row["password_hash"],
+                role="customer",
+                kyc_verified=row["kyc_status"] == "verified",
+            )
+            for row in rows
+        ]
+    )
+    user_ids = dict(
+        User.objects.filter(username__in=[row["username"] for row in rows]).values_list(
+            "username", "pk"
+        )
+    )
+    kycs = []
+    storage = KYC._meta.get_field("file").storage
+    for row in rows:
+        if not row["document"]:
+            continue
+        # Copied into content-addressed storage with a reference on its
+        # blob, like an upload; rolled back with the rows if they are
+        with storage.open(row["document"]) as document:
+            name, digest = store_document(document)
+        kycs.append(
+            KYC(
+                user_id=user_ids[row["username"]],
+                document_type=row["document_type"],
+                file=name,
+                digest=digest,
+                status=row["kyc_status"],
+            )
+        )
+    KYC.objects.bulk_create(kycs)
+
+    with_accounts = [row for row in rows if row["account_type"]]
+    if not with_accounts:
+        return
+    BankAccount.objects.bulk_create(
+        [
+            BankAccount(
+                user_id=user_ids[row["username"]],
+                account_number=row["account_number"],
+                account_type=row["account_type"],
+                balance=row["balance"],
+            )
+            for row in with_accounts
+        ]
+    )
+    account_ids = dict(
+        BankAccount.objects.filter(
+            account_number__in=[row["account_number"] for row in with_accounts]
+        ).values_list("account_number", "pk")
+    )
+    # Same opening postings the ledger migration made for existing balances
+    LedgerEntry.objects.bulk_create(
+        [
+            entry
+            for row in with_accounts
+            if row["balance"]
+            for entry in (
+                LedgerEntry(
+                    account_id=account_ids[row["account_number"]],
+                    kind="opening_balance",
+                    amount=row["balance"],
+                ),
+                LedgerEntry(
+                    account_id=None, kind="opening_balance", amount=-row["balance"]
+                ),
+            )
+        ]
+    )
+
+
+def imported_before(rows):
+    """
+    Usernames of `rows` that already exist exactly as the row would create
+    them: the work of an earlier run that stopped before its checkpoint.
+    """
+    users = User.objects.filter(username__in=[r["username"] for r in rows])
+    found = {
+        username: (email, full_name, password)
+        for username, email, full_name, password in users.values_list(
+            "username", "email", "full_name", "password"
+        )
+    }
+    matches = set()
+    for row in rows:
+        if row["username"] not in found:
+            continue
+        email, full_name, password = found[row["username"]]
+        if (email, full_name) != (row["email"], row["full_name"]):
+            continue
+        # Rows without a hash got a random unusable password
+        if password == row["password_hash"] or (
+            password.startswith("!") and row["password_hash"].startswith("!")
+        ):
+            matches.add(row["username"])
+    return matches
+
+
+def import_chunk(rows, resumed=False):
+    """
+    Import a chunk of cleaned rows in one transaction. Rows whose username
+    or email is already taken are skipped, which also makes re-importing a
+    chunk after a crash harmless. With `resumed`, rows an earlier run
+    already imported count as imported rather than skipped. Returns
+    (imported, skipped, rejects).
+    """
+    usernames, emails = existing(rows)
+    done = imported_before(rows) if resumed and usernames else set()
+    fresh, seen_usernames, seen_emails = [], set(), set()
+    for row in rows:
+        if row["username"] in usernames or row["username"] in seen_usernames:
+            continue
+        if row["email"] and (row["email"] in emails or row["email"] in seen_emails):
+            continue
+        seen_usernames.add(row["username"])
+        if row["email"]:
+            seen_emails.add(row["email"])
+        fresh.append(row)
+    skipped = len(rows) - len(fresh) - len(done)
+    if not fresh:
+        return len(done), skipped, []
+
+    # Numbers are reserved before the transaction opens, so it never waits
+    # on the sequence row
+    unnumbered = [r for r in fresh if r["account_type"] and not r["account_number"]]
+    for row, number in zip(unnumbered, get_allocator().allocate(len(unnumbered))):
+        row["account_number"] = number
+
+    try:
+        with db_transaction.atomic():
+            insert_rows(fresh)
+        return len(done) + len(fresh), skipped, []
+    except IntegrityError:
+        pass
+
+    # Something in the chunk collides with a concurrent partition (or a
+    # legacy account number); fall back to one row at a time.
+    imported, rejects = len(done), []
+    for row in fresh:
+        try:
+            with db_transaction.atomic():
+                insert_rows([row])
+            imported += 1
+        except IntegrityError as e:
+            rejects.append((row, f"conflicts with an existing row: {e}"))
+    return imported, skipped, rejects
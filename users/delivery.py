@@ -0,0 +1,125 @@
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive, or None when the
+    header is absent or not one we serve partially (e.g. multiple ranges),
+    in which case the whole file is sent.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = int(last)  # suffix range: the last N bytes
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+def delivery_mode():
+    return getattr(settings, "KYC_DOCUMENT_DELIVERY", "django")
+
+
+def serve_file(request, name, path, content_type, etag=None, filename=None):
+    """
+    Respond with the stored file `name` (absolute `path` on this host),
+    after the caller has checked permissions.
+
+    Conditional requests are answered here for every mode. In "x-accel"
+    (nginx) and "x-sendfile" (Apache, lighttpd) mode the front server is
+    told which file to send and handles byte ranges itself, so no worker
+    is held for the transfer. In "django" mode a full file goes out as a
+    FileResponse, which the WSGI server can send with sendfile(), and a
+    single byte range is streamed in chunks.
+
+    Raises Http404 when the file is missing from storage.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404(f"{name} is missing from storage")
+    # Content-addressed files never change, so the digest is a strong ETag
+    etag = f'"{etag}"' if etag else None
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = _send(request, name, path, stat.st_size, content_type, etag)
+    if etag:
+        response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = "private, max-age=3600"
+    if filename and response.status_code in (200, 206):
+        response["Content-Disposition"] = f'inline; filename="{filename}"'
+    return response
+
+
+def _send(request, name, path, size, content_type, etag):
+    mode = delivery_mode()
+    if mode == "x-accel":
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, "KYC_DOCUMENT_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + name
+        return response
+    if mode == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return response
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    # A stale If-Range validator means "send the whole file"
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(path, start, length), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,104 @@
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from users.models import KYC, DocumentBlob
+from users.storage import blob_name
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the accepted document types
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF-", "application/pdf"),
+)
+IMAGE_TYPES = ("image/jpeg", "image/png")
+
+# name -> (longest side in px, JPEG quality), largest first
+RENDITIONS = (
+    ("preview", 1600, 85),
+    ("thumbnail", 256, 80),
+)
+RENDITION_KINDS = [kind for kind, _, _ in RENDITIONS]
+
+
+def sniff(head):
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def rendition_name(digest, kind):
+    return f"kyc/renditions/{digest[:2]}/{digest}-{kind}.jpg"
+
+
+def delete_renditions(digest):
+    for kind, _, _ in RENDITIONS:
+        default_storage.delete(rendition_name(digest, kind))
+
+
+def render(source, digest):
+    """Write the preview and thumbnail JPEGs of an image document."""
+    with Image.open(source) as image:
+        largest = RENDITIONS[0][1]
+        # Let the JPEG decoder scale down by a power of two while decoding,
+        # which is much cheaper than decoding a full-resolution scan.
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for kind, size, quality in RENDITIONS:
+            # Each rendition is scaled from the previous, smaller one
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            out = BytesIO()
+            image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            name = rendition_name(digest, kind)
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(out.getvalue()))
+
+
+def process_blob(digest):
+    """
+    Validate a stored KYC document by its content and, for images, write
+    its renditions. Runs in the process_kyc_documents worker pool.
+    Returns the blob's new status.
+    """
+    storage = KYC._meta.get_field("file").storage
+    blob = DocumentBlob.objects.filter(digest=digest, status="pending").first()
+    if blob is None:
+        return None
+
+    content_type = ""
+    has_renditions = False
+    try:
+        with storage.open(blob_name(digest)) as source:
+            content_type = sniff(source.read(16)) or ""
+            source.seek(0)
+            if content_type in IMAGE_TYPES:
+                render(source, digest)
+                has_renditions = True
+    except FileNotFoundError:
+        logger.error("KYC document %s is missing from storage", digest)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        logger.warning("KYC document %s is not a readable image", digest)
+        content_type = ""
+        delete_renditions(digest)  # whatever render() got to write
+    except Exception:
+        # A corrupt upload can fail anywhere in the decoder; it is marked
+        # invalid rather than taking the rest of the batch down with it
+        logger.exception("KYC document %s could not be processed", digest)
+        content_type = ""
+        delete_renditions(digest)
+    status = "ready" if content_type else "invalid"
+
+    DocumentBlob.objects.filter(pk=blob.pk).update(
+        content_type=content_type,
+        status=status,
+        has_renditions=has_renditions,
+        processed_at=timezone.now(),
+    )
+    return status
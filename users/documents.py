@@ -0,0 +1,81 @@
+from django.db import IntegrityError
+from django.db import transaction as db_transaction
+from django.db.models import F
+
+from users.document_pipeline import delete_renditions, sniff
+from users.models import KYC, DocumentBlob
+from users.storage import blob_name, digest_of
+
+
+def _storage():
+    return KYC._meta.get_field("file").storage
+
+
+def store_document(upload):
+    """
+    Store `upload` once per distinct content and take a reference on its
+    blob. Returns (name, digest); callers put both on the KYC record inside
+    the same transaction. The file is written first, so when that
+    transaction rolls back a new file stays behind until
+    rebuild_document_refs removes it.
+    """
+    storage = _storage()
+    name = storage.save(f"kyc/{upload.name}", upload)
+    digest = digest_of(name)
+    with db_transaction.atomic():
+        blob = DocumentBlob.objects.select_for_update().filter(digest=digest).first()
+        if blob:
+            DocumentBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+        else:
+            try:
+                with db_transaction.atomic():
+                    DocumentBlob.objects.create(
+                        digest=digest,
+                        size=storage.size(name),
+                        refcount=1,
+                        content_type=_content_type(storage, name),
+                    )
+            except IntegrityError:
+                # A concurrent upload of the same content created it first
+                DocumentBlob.objects.filter(digest=digest).update(
+                    refcount=F("refcount") + 1
+                )
+        # The last reference may have been released, and the file removed,
+        # between the write above and taking our reference.
+        if not storage.exists(name):
+            storage.save(name, upload)
+    return name, digest
+
+
+def release_document(digest):
+    """Drop a reference; the blob and its file go with the last one."""
+    if not digest:
+        return
+    with db_transaction.atomic():
+        blob = DocumentBlob.objects.select_for_update().filter(digest=digest).first()
+        if blob is None:
+            return
+        if blob.refcount > 1:
+            DocumentBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") - 1)
+            return
+        blob.delete()
+        db_transaction.on_commit(lambda: _delete_files(digest))
+
+
+def _content_type(storage, name):
+    # Set up front so the document is served with its type (and extension)
+    # before process_kyc_documents has looked at it
+    with storage.open(name) as stored:
+        return sniff(stored.read(16)) or ""
+
+
+def _delete_files(digest):
+    # By now a concurrent store_document may have created a new blob for the
+    # same content and found the file still there. The locking read waits
+    # for such an insert and holds off new ones until the files are gone;
+    # store_document then sees the file missing and writes it again.
+    with db_transaction.atomic():
+        if DocumentBlob.objects.select_for_update().filter(digest=digest).exists():
+            return
+        _storage().delete(blob_name(digest))
+        delete_renditions(digest)
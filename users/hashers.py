@@ -0,0 +1,120 @@
+import binascii
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.contrib.auth.hashers import BCryptSHA256PasswordHasher
+
+
+class HashingPoolSaturated(Exception):
+    """
+    The pool is full or a hash timed out. API views answer it with 503
+    (see users.utils.exception_handler).
+    """
+
+    def __init__(self, message="Too many sign-ins in progress, please retry shortly."):
+        super().__init__(message)
+
+
+def _hashpw(password, salt):
+    # Runs in the pool; only needs bcrypt, not Django
+    import bcrypt
+
+    return bcrypt.hashpw(password, salt)
+
+
+def pool_settings():
+    return getattr(settings, "BCRYPT_POOL", {})
+
+
+class HashingPool:
+    """
+    Bounded process pool for bcrypt. At most `workers + max_queue` hashes
+    are admitted at once; callers beyond that are rejected immediately
+    instead of queueing behind a login storm and holding their web worker.
+    """
+
+    def __init__(self, workers=2, max_queue=16, timeout=5.0):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        # Spawned, not forked: the web worker has threads of its own
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.rejected = 0
+        self._rejected_lock = threading.Lock()
+
+    def hashpw(self, password, salt):
+        if not self._slots.acquire(blocking=False):
+            with self._rejected_lock:
+                self.rejected += 1
+            raise HashingPoolSaturated()
+        try:
+            future = self._executor.submit(_hashpw, password, salt)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the hash is done or cancelled, not just
+        # until this caller gives up waiting, so timed-out hashes still count
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingPoolSaturated()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide hashing pool, or None when hashing runs inline."""
+    global _pool
+    options = pool_settings()
+    if not options.get("ENABLED", True):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                workers=options.get("WORKERS", 2),
+                max_queue=options.get("MAX_QUEUE", 16),
+                timeout=options.get("TIMEOUT", 5.0),
+            )
+        return _pool
+
+
+def close_pool():
+    """Shut the pool down; the next hash starts one from current settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+class PooledBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """
+    Django's bcrypt_sha256 hasher with the work factor taken from
+    settings.BCRYPT_ROUNDS and the bcrypt call run in the hashing pool.
+    Hashes are interchangeable with the stock hasher. Because must_update()
+    compares against the configured rounds, changing BCRYPT_ROUNDS rehashes
+    each password on its next successful login.
+    """
+
+    @property
+    def rounds(self):
+        return getattr(settings, "BCRYPT_ROUNDS", 12)
+
+    def encode(self, password, salt):
+        pool = get_pool()
+        if pool is None:
+            return super().encode(password, salt)
+        password = binascii.hexlify(self.digest(password.encode()).digest())
+        data = pool.hashpw(password, salt)
+        return "%s$%s" % (self.algorithm, data.decode("ascii"))
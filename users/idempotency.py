@@ -0,0 +1,152 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+class _Entry:
+    def __init__(self, fingerprint, expires_at):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.done = threading.Event()
+        self.response = None  # (data, status_code) once the first request finishes
+
+
+class IdempotencyStore:
+    """
+    Bounded, TTL-evicted store of first responses, keyed by (user, path, key).
+
+    Entries are created when the first request starts so duplicates arriving
+    while it is still running can wait on it instead of re-executing.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint):
+        """Return (entry, owner); `owner` is True if the caller must execute."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                return entry, False
+
+            entry = _Entry(fingerprint, now + self.ttl)
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            self._evict(now)
+            return entry, True
+
+    def complete(self, entry, data, status_code):
+        entry.response = (data, status_code)
+        entry.done.set()
+
+    def abandon(self, key, entry):
+        # The first request blew up; let the next retry execute for real
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def _evict(self, now):
+        # Entries are kept in creation order, which with a fixed TTL is also
+        # expiry order, so eviction only ever looks at the oldest ones.
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore(
+                    max_entries=getattr(settings, "IDEMPOTENCY_MAX_ENTRIES", 10000),
+                    ttl=getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60),
+                )
+    return _store
+
+
+def request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotentPostMixin:
+    """
+    Replays the stored first response for POSTs carrying an Idempotency-Key
+    header, so client retries don't re-run validation or side effects.
+    Any response below 500 is stored, whether the view returned it or raised
+    an APIException; after a 500 the next request with the key runs again.
+    """
+
+    def post(self, request, *args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return super().post(request, *args, **kwargs)
+        if len(idempotency_key) > 255:
+            return Response(
+                {"error": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        store = get_store()
+        key = (request.user.pk, request.path, idempotency_key)
+        fingerprint = request_fingerprint(request)
+        while True:
+            entry, owner = store.begin(key, fingerprint)
+            if owner:
+                break
+            if entry.fingerprint != fingerprint:
+                return Response(
+                    {
+                        "error": f"{IDEMPOTENCY_HEADER} was reused for a different request."
+                    },
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            finished = entry.done.wait(
+                getattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 30)
+            )
+            if entry.response is not None:
+                data, status_code = entry.response
+                return Response(
+                    data, status=status_code, headers={"Idempotent-Replayed": "true"}
+                )
+            if not finished:
+                return Response(
+                    {"error": "A request with this key is still in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            # The first request failed and dropped the key; execute this one
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except APIException as exc:
+            # Raised rejections are replayed like returned ones
+            response = self.handle_exception(exc)
+        except Exception:
+            store.abandon(key, entry)
+            raise
+        if response.status_code >= 500:
+            store.abandon(key, entry)
+        else:
+            store.complete(entry, response.data, response.status_code)
+        return response
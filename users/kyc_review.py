@@ -0,0 +1,201 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from users import audit
+from users.authentication import bump_auth_version
+from users.models import KYC, DocumentBlob
+
+MAX_CLAIM = 50
+MAX_BULK_DECISIONS = 10000
+LOCK_CHUNK = 1000
+
+
+class KYCReviewError(Exception):
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+def lease_duration():
+    return timedelta(seconds=getattr(settings, "KYC_REVIEW_LEASE_SECONDS", 900))
+
+
+def claimable(now=None):
+    """Pending records nobody holds an unexpired lease on."""
+    now = now or timezone.now()
+    return KYC.objects.filter(status="pending").filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now)
+    )
+
+
+def with_document_info(queryset):
+    """
+    Annotate what reviewers see about the stored document: whether the same
+    content already passed review (`digest_verified`), and its processing
+    status and renditions from its DocumentBlob.
+    """
+    blob = DocumentBlob.objects.filter(digest=OuterRef("digest"))
+    return queryset.annotate(
+        digest_verified=Exists(
+            KYC.objects.filter(digest=OuterRef("digest"), status="verified")
+        ),
+        document_status=Subquery(blob.values("status")[:1]),
+        has_renditions=Subquery(blob.values("has_renditions")[:1]),
+    )
+
+
+def claim_next(reviewer, count):
+    """
+    Lease the `count` oldest claimable pending records to `reviewer`.
+    SKIP LOCKED lets concurrent reviewers pass over rows another claim is
+    taking, so parallel claims return disjoint records without waiting.
+    """
+    now = timezone.now()
+    expires = now + lease_duration()
+    with db_transaction.atomic():
+        ids = list(
+            claimable(now)
+            .select_for_update(skip_locked=True)
+            .order_by("submitted_at", "id")
+            .values_list("id", flat=True)[:count]
+        )
+        KYC.objects.filter(id__in=ids).update(
+            claimed_by=reviewer, lease_expires_at=expires
+        )
+    return list(
+        with_document_info(KYC.objects.filter(id__in=ids))
+        .select_related("user")
+        .order_by("submitted_at", "id")
+    )
+
+
+def release(reviewer, kyc_ids):
+    """Hand records leased by `reviewer` back to the queue."""
+    return KYC.objects.filter(
+        id__in=kyc_ids, status="pending", claimed_by=reviewer
+    ).update(claimed_by=None, lease_expires_at=None)
+
+
+def decide(reviewer, kyc_id, status_value, notes="", redecide=False):
+    """
+    Record a verification decision. The record must still be pending, or
+    `redecide` must be set to overturn an earlier decision, and it must not
+    be leased to another reviewer; either way the lease is cleared.
+    """
+    with db_transaction.atomic():
+        try:
+            kyc = KYC.objects.select_for_update().select_related("user").get(id=kyc_id)
+        except KYC.DoesNotExist:
+            raise KYCReviewError("not_found", "KYC not found")
+        if kyc.status != "pending" and not redecide:
+            raise KYCReviewError("already_decided", f"KYC is already {kyc.status}.")
+        if (
+            kyc.claimed_by_id not in (None, reviewer.pk)
+            and kyc.lease_expires_at
+            and kyc.lease_expires_at > timezone.now()
+        ):
+            raise KYCReviewError("claimed", "KYC is claimed by another reviewer.")
+
+        kyc.status = status_value
+        kyc.notes = notes
+        kyc.claimed_by = None
+        kyc.lease_expires_at = None
+        kyc.save(update_fields=["status", "notes", "claimed_by", "lease_expires_at"])
+
+        # Update user kyc_verified flag if approved, leave False if rejected
+        kyc.user.kyc_verified = status_value == "verified"
+        bump_auth_version([kyc.user_id], kyc_verified=kyc.user.kyc_verified)
+    return kyc
+
+
+def decide_bulk(reviewer, decisions):
+    """
+    Apply many decisions ({kyc_id, status, notes, redecide}) in one
+    transaction with set-based writes: the records are locked and read in
+    chunks, then updated, their users flipped and the audit rows inserted
+    in bulk. Each decision is checked like `decide`; failing ones are
+    reported and skipped, the rest applied.
+    """
+    now = timezone.now()
+    results = []
+    with db_transaction.atomic():
+        ids = list({decision["kyc_id"] for decision in decisions})
+        records = {}
+        for start in range(0, len(ids), LOCK_CHUNK):
+            records.update(
+                KYC.objects.select_for_update()
+                .select_related("user")
+                .only(
+                    "id",
+                    "status",
+                    "claimed_by_id",
+                    "lease_expires_at",
+                    "user__id",
+                    "user__username",
+                )
+                .in_bulk(ids[start : start + LOCK_CHUNK])
+            )
+
+        decided = {}
+        for index, decision in enumerate(decisions):
+            kyc = records.get(decision["kyc_id"])
+            result = {"index": index, "kyc_id": decision["kyc_id"]}
+            if kyc is None:
+                error = "not_found"
+            elif kyc.pk in decided:
+                error = "duplicate"
+            elif kyc.status != "pending" and not decision.get("redecide"):
+                error = "already_decided"
+            elif (
+                kyc.claimed_by_id not in (None, reviewer.pk)
+                and kyc.lease_expires_at
+                and kyc.lease_expires_at > now
+            ):
+                error = "claimed"
+            else:
+                error = None
+            if error:
+                result.update(status="failed", error=error)
+            else:
+                kyc.status = decision["status"]
+                kyc.notes = decision.get("notes", "")
+                decided[kyc.pk] = kyc
+                result["status"] = kyc.status
+            results.append(result)
+
+        # Vendor batches share a handful of outcomes, so one UPDATE per
+        # (status, notes) pair and chunk beats a per-row CASE bulk_update.
+        groups = {}
+        for kyc in decided.values():
+            groups.setdefault((kyc.status, kyc.notes), []).append(kyc.pk)
+        for (status_value, notes), kyc_ids in groups.items():
+            for start in range(0, len(kyc_ids), LOCK_CHUNK):
+                KYC.objects.filter(id__in=kyc_ids[start : start + LOCK_CHUNK]).update(
+                    status=status_value,
+                    notes=notes,
+                    claimed_by=None,
+                    lease_expires_at=None,
+                )
+        # A user with several submissions in the batch ends up with the last one
+        verified = {}
+        for kyc in decided.values():
+            verified[kyc.user_id] = kyc.status == "verified"
+        for flag in (True, False):
+            bump_auth_version(
+                [user_id for user_id, value in verified.items() if value is flag],
+                kyc_verified=flag,
+            )
+
+        audit.record_actions(
+            reviewer,
+            [
+                f"KYC {kyc.status} for user {kyc.user.username}"
+                for kyc in decided.values()
+            ],
+        )
+    return results
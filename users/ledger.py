@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from users.models import BankAccount, BalanceSnapshot, LedgerEntry
+
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+
+
+def transfer_entries(txn):
+    return [
+        LedgerEntry(
+            account=txn.from_account,
+            transaction_id=txn.transaction_id,
+            kind="transfer",
+            amount=-txn.amount,
+        ),
+        LedgerEntry(
+            account=txn.to_account,
+            transaction_id=txn.transaction_id,
+            kind="transfer",
+            amount=txn.amount,
+        ),
+    ]
+
+
+def post_transfers(txns):
+    LedgerEntry.objects.bulk_create(
+        [entry for txn in txns for entry in transfer_entries(txn)]
+    )
+
+
+def post_deposit(account, amount):
+    if not amount:
+        return
+    LedgerEntry.objects.bulk_create(
+        [
+            LedgerEntry(account=account, kind="deposit", amount=amount),
+            LedgerEntry(account=None, kind="deposit", amount=-amount),
+        ]
+    )
+
+
+def _latest_snapshot(field):
+    return Subquery(
+        BalanceSnapshot.objects.filter(account=OuterRef("pk"))
+        .order_by("-id")
+        .values(field)[:1]
+    )
+
+
+def ledger_positions(account_ids):
+    """
+    Map account id -> dict(balance, ledger_balance, last_entry_id) using the
+    latest snapshot of each account plus the entries posted after it.
+    Two queries regardless of how many accounts are passed.
+    """
+    accounts = BankAccount.objects.filter(pk__in=account_ids).annotate(
+        snapshot_balance=Coalesce(_latest_snapshot("balance"), ZERO),
+        snapshot_entry_id=Coalesce(_latest_snapshot("last_entry_id"), 0),
+    )
+    positions = {
+        account.pk: {
+            "account_number": account.account_number,
+            "balance": account.balance,
+            "ledger_balance": account.snapshot_balance,
+            "last_entry_id": account.snapshot_entry_id,
+        }
+        for account in accounts
+    }
+
+    since_snapshot = Coalesce(
+        Subquery(
+            BalanceSnapshot.objects.filter(account=OuterRef("account"))
+            .order_by("-id")
+            .values("last_entry_id")[:1]
+        ),
+        0,
+    )
+    deltas = (
+        LedgerEntry.objects.filter(account__in=account_ids, id__gt=since_snapshot)
+        .values("account")
+        .annotate(delta=Sum("amount"), last_id=Max("id"))
+        .values_list("account", "delta", "last_id")
+    )
+    for account_id, delta, last_id in deltas:
+        positions[account_id]["ledger_balance"] += Decimal(delta).quantize(CENT)
+        positions[account_id]["last_entry_id"] = last_id
+    return positions
+
+
+def take_snapshots(account_ids):
+    # Every ledger write for an account happens under its row lock, so
+    # holding the locks here means no entry can commit out of id order
+    # behind the snapshot's last_entry_id.
+    with db_transaction.atomic():
+        list(
+            BankAccount.objects.select_for_update()
+            .filter(pk__in=account_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        positions = ledger_positions(account_ids)
+        BalanceSnapshot.objects.bulk_create(
+            BalanceSnapshot(
+                account_id=account_id,
+                balance=position["ledger_balance"],
+                last_entry_id=position["last_entry_id"],
+            )
+            for account_id, position in positions.items()
+        )
+    return len(positions)
+
+
+def balance_as_of(account, when):
+    """Ledger balance at `when`: nearest earlier snapshot plus later entries."""
+    snapshot = (
+        BalanceSnapshot.objects.filter(account=account, taken_at__lte=when)
+        .order_by("-taken_at", "-id")
+        .first()
+    )
+    entries = LedgerEntry.objects.filter(account=account, created_at__lte=when)
+    balance = ZERO
+    if snapshot:
+        balance = snapshot.balance
+        entries = entries.filter(id__gt=snapshot.last_entry_id)
+    delta = entries.aggregate(total=Sum("amount"))["total"] or ZERO
+    return balance + Decimal(delta).quantize(CENT)
@@ -0,0 +1,59 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.audit_archive import AuditArchive, day_of
+from users.models import AuditLog
+from users.serializers import AuditLogSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Move audit log rows older than the retention window into compressed, "
+        "append-only daily segment files. Each batch is written to disk "
+        "before it is deleted, and re-running after an interruption skips "
+        "rows that are already archived."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.AUDIT_ARCHIVE_RETENTION_DAYS,
+        )
+        parser.add_argument("--archive-dir", default=settings.AUDIT_ARCHIVE_DIR)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        archive = AuditArchive(
+            options["archive_dir"], settings.AUDIT_ARCHIVE_BLOCK_SIZE
+        )
+        cutoff = timezone.now() - timedelta(days=options["retention_days"])
+        expired = (
+            AuditLog.objects.filter(timestamp__lt=cutoff)
+            .values(*AuditLogSerializer.VALUES)
+            .order_by("timestamp", "id")
+        )
+
+        archived = moved = 0
+        while True:
+            # Each batch is deleted once written, so the next one starts
+            # from the front of the table again.
+            rows = list(expired[: options["batch_size"]])
+            if not rows:
+                break
+            for day, day_rows in groupby(rows, key=lambda r: day_of(r["timestamp"])):
+                archived += archive.append(day, list(day_rows))
+            AuditLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+            moved += len(rows)
+        archive.mark_archived_before(cutoff)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {moved} audit rows older than {cutoff:%Y-%m-%d %H:%M} "
+                f"to {options['archive_dir']} ({moved - archived} already archived)."
+            )
+        )
@@ -0,0 +1,106 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from users.models import User, BankAccount, DailyOutflow, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the old aggregate-over-history daily limit query with the "
+        "DailyOutflow key lookup on an account with a large transaction history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=1_000_000)
+        parser.add_argument("--days", type=int, default=3 * 365)
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the benchmark rows afterwards."
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.create(
+            username=f"bench-{int(time.time() * 1000)}", role="customer"
+        )
+        account = BankAccount.objects.create(
+            user=user,
+            account_number=BankAccount.generate_account_number(),
+            account_type="savings",
+        )
+        try:
+            self.seed(account, options)
+            self.compare(account, options["iterations"])
+        finally:
+            if not options["keep"]:
+                user.delete()
+
+    def seed(self, account, options):
+        now = timezone.now()
+        days = options["days"]
+        per_day = max(1, options["transactions"] // days)
+        started = time.perf_counter()
+        last_pk = (
+            Transaction.objects.order_by("-pk").values_list("pk", flat=True).first()
+        )
+        for day in range(days):
+            Transaction.objects.bulk_create(
+                (
+                    Transaction(
+                        from_account=account, amount=Decimal("1.00"), status="success"
+                    )
+                    for _ in range(per_day)
+                ),
+                batch_size=options["batch_size"],
+            )
+            # auto_now_add stamps the rows with "now"; move them back in time
+            Transaction.objects.filter(
+                from_account=account, pk__gt=last_pk or 0
+            ).update(timestamp=now - timedelta(days=day))
+            last_pk = (
+                Transaction.objects.order_by("-pk").values_list("pk", flat=True).first()
+            )
+        DailyOutflow.objects.create(
+            account=account, day=now.date(), total=Decimal("1.00") * per_day
+        )
+        self.stdout.write(
+            f"Seeded {per_day * days} transactions over {days} days in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+    def compare(self, account, iterations):
+        today = timezone.now().date()
+
+        def old_path():
+            return (
+                Transaction.objects.filter(
+                    from_account=account, timestamp__date=today, status="success"
+                ).aggregate(Sum("amount"))["amount__sum"]
+                or 0
+            )
+
+        def new_path():
+            return (
+                DailyOutflow.objects.filter(account=account, day=today)
+                .values_list("total", flat=True)
+                .first()
+                or 0
+            )
+
+        for name, check in (("aggregate", old_path), ("outflow", new_path)):
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                check()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{name:>9}: mean {sum(timings) / len(timings):.3f} ms, "
+                f"p50 {timings[len(timings) // 2]:.3f} ms, "
+                f"p99 {timings[int(len(timings) * 0.99) - 1]:.3f} ms"
+            )
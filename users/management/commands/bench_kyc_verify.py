@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.kyc_review import decide, decide_bulk
+from users.models import KYC, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare deciding pending KYC submissions one by one with the bulk "
+        "path behind POST /kyc/verify/bulk/. The per-item path runs on a "
+        "sample and is extrapolated to the full item count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10_000)
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=500,
+            help="Submissions decided one by one for the per-item timing.",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the benchmark rows afterwards."
+        )
+
+    def handle(self, *args, **options):
+        items = options["items"]
+        sample = min(options["sample"], items)
+        prefix = f"kycbench-{int(time.time() * 1000)}"
+        reviewer = User.objects.create(username=f"{prefix}-admin", role="admin")
+        try:
+            single_ids = self.seed(f"{prefix}-one", sample)
+            bulk_ids = self.seed(f"{prefix}-bulk", items)
+
+            started = time.perf_counter()
+            for kyc_id in single_ids:
+                decide(reviewer, kyc_id, "verified")
+            single = (time.perf_counter() - started) / sample * items
+
+            decisions = [
+                {"kyc_id": kyc_id, "status": "verified" if i % 2 else "rejected"}
+                for i, kyc_id in enumerate(bulk_ids)
+            ]
+            started = time.perf_counter()
+            results = decide_bulk(reviewer, decisions)
+            bulk = time.perf_counter() - started
+
+            failed = sum(1 for result in results if result["status"] == "failed")
+            self.stdout.write(
+                f"per item: {single:.2f}s for {items} (extrapolated from {sample}), "
+                f"{items / single:.0f}/sec"
+            )
+            self.stdout.write(
+                f"    bulk: {bulk:.2f}s for {items}, {items / bulk:.0f}/sec, "
+                f"{failed} failed"
+            )
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {single / bulk:.1f}x"))
+        finally:
+            if not options["keep"]:
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def seed(self, prefix, count):
+        users = User.objects.bulk_create(
+            User(username=f"{prefix}-{i}", role="customer") for i in range(count)
+        )
+        if users and users[0].pk is None:
+            # Backends without RETURNING (MySQL) leave the pks unset
+            users = list(User.objects.filter(username__startswith=f"{prefix}-"))
+        KYC.objects.bulk_create(
+            (
+                KYC(user=user, document_type="pan", file="kyc/bench.png")
+                for user in users
+            ),
+            batch_size=1000,
+        )
+        return list(
+            KYC.objects.filter(user__username__startswith=f"{prefix}-").values_list(
+                "id", flat=True
+            )
+        )
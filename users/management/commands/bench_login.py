@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from users.hashers import HashingPoolSaturated, close_pool
+from users.models import User
+
+
+def _percentile(timings, fraction):
+    return timings[max(0, int(len(timings) * fraction) - 1)] if timings else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare login throughput and p99 latency with bcrypt running in the "
+        "hashing pool against inline hashing in the request thread. A probe "
+        "thread does light GIL-bound work meanwhile, standing in for other "
+        "requests served by the same worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--logins", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--workers", type=int, default=2, help="Pool size.")
+        parser.add_argument("--max-queue", type=int, default=16)
+        parser.add_argument("--rounds", type=int, default=12)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the benchmark users afterwards."
+        )
+
+    def handle(self, *args, **options):
+        prefix = f"loginbench-{int(time.time() * 1000)}"
+        password = "Bench-passw0rd!"
+        with override_settings(
+            BCRYPT_ROUNDS=options["rounds"], BCRYPT_POOL={"ENABLED": False}
+        ):
+            encoded = make_password(password)
+        usernames = [f"{prefix}-{i}" for i in range(options["users"])]
+        User.objects.bulk_create(
+            User(username=name, password=encoded, role="customer") for name in usernames
+        )
+
+        modes = (
+            ("inline", {"ENABLED": False}),
+            (
+                "pool",
+                {
+                    "ENABLED": True,
+                    "WORKERS": options["workers"],
+                    "MAX_QUEUE": options["max_queue"],
+                    "TIMEOUT": 30.0,
+                },
+            ),
+        )
+        try:
+            for name, pool_options in modes:
+                with override_settings(
+                    BCRYPT_ROUNDS=options["rounds"], BCRYPT_POOL=pool_options
+                ):
+                    try:
+                        self.run(name, usernames, password, options)
+                    finally:
+                        close_pool()
+        finally:
+            if not options["keep"]:
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def run(self, name, usernames, password, options):
+        per_thread = options["logins"] // options["concurrency"]
+        timings, probe_timings = [], []
+        counts = {"ok": 0, "rejected": 0}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def login(index):
+            local, local_counts = [], {"ok": 0, "rejected": 0}
+            try:
+                for i in range(per_thread):
+                    username = usernames[(index + i) % len(usernames)]
+                    started = time.perf_counter()
+                    try:
+                        authenticate(username=username, password=password)
+                        local_counts["ok"] += 1
+                        local.append((time.perf_counter() - started) * 1000)
+                    except HashingPoolSaturated:
+                        local_counts["rejected"] += 1
+            finally:
+                connection.close()
+                with lock:
+                    timings.extend(local)
+                    for key, value in local_counts.items():
+                        counts[key] += value
+
+        def probe():
+            payload = {"id": 1, "items": list(range(200))}
+            while not done.is_set():
+                started = time.perf_counter()
+                json.loads(json.dumps(payload))
+                probe_timings.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.005)
+
+        probe_thread = threading.Thread(target=probe)
+        threads = [
+            threading.Thread(target=login, args=(i,))
+            for i in range(options["concurrency"])
+        ]
+        started = time.perf_counter()
+        probe_thread.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        probe_thread.join()
+
+        timings.sort()
+        probe_timings.sort()
+        self.stdout.write(
+            f"{name:>6}: {counts['ok'] / elapsed:.1f} logins/sec, "
+            f"p50 {_percentile(timings, 0.5):.0f} ms, "
+            f"p99 {_percentile(timings, 0.99):.0f} ms, "
+            f"{counts['rejected']} rejected; "
+            f"probe p99 {_percentile(probe_timings, 0.99):.2f} ms"
+        )
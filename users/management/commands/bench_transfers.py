@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError
+from django.db.models import Sum
+
+from users.ledger import post_deposit
+from users.models import User, BankAccount, Transaction
+from users.transfers import TransferError, transfer_funds
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency stress benchmark for the transfer engine: hammers a few hot "
+        "accounts from many threads, reports transfers/sec and checks that "
+        "balances stay consistent with the recorded transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, default=4)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--transfers", type=int, default=2000)
+        parser.add_argument("--amount", default="0.01")
+        parser.add_argument("--initial-balance", default="1000.00")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the benchmark rows afterwards."
+        )
+
+    def handle(self, *args, **options):
+        amount = Decimal(options["amount"])
+        initial = Decimal(options["initial_balance"])
+
+        user = User.objects.create(
+            username=f"bench-{int(time.time() * 1000)}", role="customer"
+        )
+        accounts = [
+            BankAccount.objects.create(
+                user=user,
+                account_number=BankAccount.generate_account_number(),
+                account_type="current",
+                balance=initial,
+            )
+            for _ in range(options["accounts"])
+        ]
+        for account in accounts:
+            post_deposit(account, initial)
+
+        counts = {"success": 0, "rejected": 0, "errors": 0}
+        counts_lock = threading.Lock()
+        per_worker = options["transfers"] // options["workers"]
+
+        def worker():
+            local = {"success": 0, "rejected": 0, "errors": 0}
+            try:
+                for _ in range(per_worker):
+                    from_acc, to_acc = random.sample(accounts, 2)
+                    try:
+                        transfer_funds(from_acc, to_acc, amount)
+                        local["success"] += 1
+                    except TransferError:
+                        local["rejected"] += 1
+                    except DatabaseError:
+                        local["errors"] += 1
+            finally:
+                connection.close()
+                with counts_lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        threads = [threading.Thread(target=worker) for _ in range(options["workers"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{counts['success']} transfers in {elapsed:.2f}s "
+            f"({counts['success'] / elapsed:.1f} transfers/sec), "
+            f"{counts['rejected']} rejected, {counts['errors']} database errors"
+        )
+
+        consistent = self.check_consistency(accounts, initial)
+        if not options["keep"]:
+            user.delete()
+
+        if consistent:
+            self.stdout.write(self.style.SUCCESS("Balances are consistent."))
+        else:
+            self.stderr.write(self.style.ERROR("Balance mismatch detected!"))
+
+    def check_consistency(self, accounts, initial):
+        consistent = True
+        total = Decimal("0.00")
+        for account in BankAccount.objects.filter(pk__in=[a.pk for a in accounts]):
+            sent = (
+                Transaction.objects.filter(
+                    from_account=account, status="success"
+                ).aggregate(Sum("amount"))["amount__sum"]
+                or 0
+            )
+            received = (
+                Transaction.objects.filter(
+                    to_account=account, status="success"
+                ).aggregate(Sum("amount"))["amount__sum"]
+                or 0
+            )
+            expected = initial - sent + received
+            total += account.balance
+            if account.balance != expected:
+                consistent = False
+                self.stderr.write(
+                    f"{account.account_number}: balance {account.balance}, "
+                    f"expected {expected}"
+                )
+        if total != initial * len(accounts):
+            consistent = False
+            self.stderr.write(f"Total balance drifted to {total}")
+        return consistent
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from users.models import (
+    User,
+    KYC,
+    BankAccount,
+    DailyOutflow,
+    Transaction,
+    AuditLog,
+)
+from users.transfer_queue import next_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the database query plans of the hot query paths so index "
+        "regressions show up before they show up in latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Execute the queries and report actual timings (EXPLAIN ANALYZE).",
+        )
+
+    def hot_queries(self):
+        # Real ids keep the planner honest; fall back to a placeholder on an empty DB
+        account = BankAccount.objects.order_by("pk").first() or BankAccount(pk=0)
+        email = User.objects.values_list("email", flat=True).first() or "x@example.com"
+        now = timezone.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        return [
+            (
+                "Daily limit check (DailyOutflow key lookup)",
+                DailyOutflow.objects.filter(account=account, day=now.date()).values(
+                    "total"
+                ),
+            ),
+            (
+                "Daily transferred sum over Transaction",
+                Transaction.objects.filter(
+                    from_account=account,
+                    status="success",
+                    timestamp__gte=midnight,
+                    timestamp__lt=midnight + timedelta(days=1),
+                )
+                .values("from_account")
+                .annotate(total=Sum("amount")),
+            ),
+            ("Audit log listing", AuditLog.objects.order_by("-timestamp")[:50]),
+            (
+                "Pending KYC queue",
+                KYC.objects.filter(status="pending").order_by("submitted_at")[:50],
+            ),
+            ("User lookup by email", User.objects.filter(email=email)),
+            (
+                "Transfer queue drain",
+                next_batch(0, 4)[:200],
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        explain_options = {"analyze": True} if options["analyze"] else {}
+        self.stdout.write(f"Database vendor: {connection.vendor}\n")
+        for title, queryset in self.hot_queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
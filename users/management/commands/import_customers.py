@@ -0,0 +1,246 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.management.pool import process_pool
+from users.utils import log_action
+
+
+def _write_json(path, data):
+    # Written aside and renamed so a crash never leaves half a checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _import_partition(task):
+    from users.customer_import import (
+        RowError,
+        clean_row,
+        import_chunk,
+        parse_line,
+        read_lines,
+    )
+
+    state = task["state"]
+    rows = []
+    # Drop rejects recorded after the last checkpoint; they are seen again
+    with open(task["rejects"], "a") as f:
+        f.truncate(state.get("rejects_size", 0))
+
+    # The first chunk after a restart may have been committed just before
+    # the run stopped, without its checkpoint
+    resumed = task["resumed"]
+
+    def flush(next_offset):
+        nonlocal resumed
+        imported, skipped, rejects = import_chunk(rows, resumed) if rows else (0, 0, [])
+        resumed = False
+        state["imported"] += imported
+        state["skipped"] += skipped
+        reject(rejects)
+        state["offset"] = next_offset
+        state["rejects_size"] = os.path.getsize(task["rejects"])
+        _write_json(task["checkpoint"], state)
+        rows.clear()
+
+    def reject(rejects):
+        if not rejects:
+            return
+        state["rejected"] += len(rejects)
+        with open(task["rejects"], "a") as f:
+            # Offsets point into the source file; hashes stay out of here
+            for row, error in rejects:
+                record = {
+                    "offset": row["offset"],
+                    "username": row.get("username"),
+                    "error": error,
+                }
+                f.write(json.dumps(record) + "\n")
+
+    for offset, line in read_lines(
+        task["path"], state["offset"], task["end"], task["aligned"]
+    ):
+        raw = {}
+        try:
+            raw = parse_line(line, task["header"])
+            if raw is None:
+                continue
+            rows.append({**clean_row(raw), "offset": offset})
+        except (RowError, ValueError, csv.Error) as e:
+            reject([({"offset": offset, "username": raw.get("username")}, str(e))])
+            continue
+        if len(rows) >= task["chunk_size"]:
+            flush(offset + len(line))
+    flush(task["end"])
+    state["done"] = True
+    _write_json(task["checkpoint"], state)
+    return state
+
+
+class Command(BaseCommand):
+    help = (
+        "Import customers from a legacy system out of a CSV (with a header "
+        "row) or NDJSON file: one User, KYC record and, optionally, bank "
+        "account per row, written with chunked bulk inserts. Passwords must "
+        "come pre-hashed in a format Django knows (rows without one get an "
+        "unusable password and need a reset). The file is split into byte "
+        "ranges imported in parallel by a process pool; CSV values must not "
+        "span lines. Progress is checkpointed after every chunk, and an "
+        "interrupted import resumes where it stopped when rerun with the "
+        "same file. Usernames and emails that already exist are skipped. KYC "
+        "documents must already be in storage; they are registered in the "
+        "content-addressed blob store like uploads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--partitions",
+            type=int,
+            help="Byte ranges to split the file into (default: 4 per worker).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file prefix (default: <path>.checkpoint).",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="Where rejected rows are written as NDJSON (default: <path>.rejects).",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the beginning.",
+        )
+
+    def handle(self, *args, **options):
+        from users.customer_import import partition
+
+        path = os.path.abspath(options["path"])
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        file_format = options["format"] or (
+            "csv" if path.lower().endswith(".csv") else "ndjson"
+        )
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint"
+        rejects = options["rejects"] or f"{path}.rejects"
+
+        header, data_start = None, 0
+        if file_format == "csv":
+            with open(path, "rb") as f:
+                first = f.readline()
+            header = next(csv.reader([first.decode("utf-8-sig")]))
+            data_start = len(first)
+
+        plan = _read_json(checkpoint)
+        size = os.path.getsize(path)
+        resuming = bool(plan) and not options["restart"]
+        if resuming:
+            if plan["size"] != size:
+                raise CommandError(
+                    f"{path} changed since the checkpoint was written; "
+                    "use --restart to import it from the beginning."
+                )
+            self.stdout.write(f"Resuming from {checkpoint}.")
+        else:
+            count = options["partitions"] or options["workers"] * 4
+            plan = {"size": size, "ranges": partition(path, data_start, count)}
+            for index in range(len(plan["ranges"])):
+                for name in (f"{checkpoint}.{index}", f"{rejects}.{index}"):
+                    if os.path.exists(name):
+                        os.remove(name)
+            _write_json(checkpoint, plan)
+
+        tasks = []
+        for index, (start, end) in enumerate(plan["ranges"]):
+            state = _read_json(f"{checkpoint}.{index}")
+            if state is None:
+                state = {
+                    "offset": start,
+                    "imported": 0,
+                    "skipped": 0,
+                    "rejected": 0,
+                    "done": False,
+                }
+                aligned = start == data_start
+            else:
+                aligned = True  # checkpoints are always at a line start
+            tasks.append(
+                {
+                    "path": path,
+                    "header": header,
+                    "end": end,
+                    "aligned": aligned,
+                    "resumed": resuming,
+                    "chunk_size": options["chunk_size"],
+                    "checkpoint": f"{checkpoint}.{index}",
+                    "rejects": f"{rejects}.{index}",
+                    "state": state,
+                }
+            )
+
+        totals = {"imported": 0, "skipped": 0, "rejected": 0}
+        for task in tasks:
+            for key in totals:
+                totals[key] += task["state"][key]
+        already = dict(totals)  # done before this run
+        pending = [task for task in tasks if not task["state"]["done"]]
+
+        started = time.perf_counter()
+        with process_pool(options["workers"]) as pool:
+            futures = [pool.submit(_import_partition, task) for task in pending]
+            for finished, future in enumerate(as_completed(futures), 1):
+                state = future.result()
+                task = pending[futures.index(future)]
+                for key in totals:
+                    totals[key] += state[key] - task["state"][key]
+                elapsed = time.perf_counter() - started
+                rows = sum(totals[key] - already[key] for key in totals)
+                self.stdout.write(
+                    f"{finished}/{len(pending)} partitions, {totals['imported']} "
+                    f"imported, {rows / elapsed:.0f} rows/sec"
+                )
+
+        elapsed = time.perf_counter() - started
+        rows = sum(totals[key] - already[key] for key in totals)
+        with open(rejects, "w") as merged:
+            for task in tasks:
+                if os.path.exists(task["rejects"]):
+                    with open(task["rejects"]) as part:
+                        merged.write(part.read())
+                    os.remove(task["rejects"])
+        for task in tasks:
+            os.remove(task["checkpoint"])
+        os.remove(checkpoint)
+        if not totals["rejected"]:
+            os.remove(rejects)
+
+        log_action(
+            None,
+            f"Imported {totals['imported']} customers from {os.path.basename(path)}",
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {totals['imported']} customers, skipped "
+                f"{totals['skipped']} with a taken username or email, rejected {totals['rejected']} "
+                f"in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/sec)."
+            )
+        )
+        if totals["rejected"]:
+            self.stderr.write(f"Rejected rows are in {rejects}.")
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.management.pool import process_pool
+from users.models import DocumentBlob
+
+
+def _process(digest):
+    from users.document_pipeline import process_blob
+
+    return process_blob(digest)
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate newly uploaded KYC documents and render their thumbnails and "
+        "previews across a process pool, so image decoding never runs in a web "
+        "worker. Uploads are picked up from DocumentBlob rows still pending. "
+        "Run a single instance of this command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when there is nothing to process.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once every pending document is processed.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        counts = {"ready": 0, "invalid": 0}
+        started = time.perf_counter()
+        last_id = 0
+        with process_pool(options["workers"]) as pool:
+            try:
+                while True:
+                    pending = list(
+                        DocumentBlob.objects.filter(status="pending", id__gt=last_id)
+                        .order_by("id")
+                        .values_list("id", "digest")[:batch_size]
+                    )
+                    if not pending:
+                        if options["once"]:
+                            break
+                        last_id = 0  # pick up anything that failed to process
+                        time.sleep(options["poll_interval"])
+                        continue
+                    last_id = pending[-1][0]
+                    digests = [digest for _, digest in pending]
+                    for status in pool.map(_process, digests):
+                        if status in counts:
+                            counts[status] += 1
+            except KeyboardInterrupt:
+                pass
+
+        elapsed = time.perf_counter() - started
+        processed = sum(counts.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {processed} documents ({counts['ready']} ready, "
+                f"{counts['invalid']} invalid) in {elapsed:.2f}s "
+                f"({processed / elapsed:.1f}/sec)."
+            )
+        )
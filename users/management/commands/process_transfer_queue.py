@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.management.pool import process_pool
+
+
+def _drain(slot, slots, batch_size):
+    from users.transfer_queue import drain_partitions
+
+    return drain_partitions(slot, slots, batch_size)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the asynchronous transfer queue across a process pool. Queue "
+        "partitions are split between the workers by source account so each "
+        "account's transfers are applied in the order they were queued. Run a "
+        "single instance of this command per database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        batch_size = options["batch_size"]
+
+        processed = 0
+        started = time.perf_counter()
+        with process_pool(workers) as pool:
+            try:
+                while True:
+                    counts = list(
+                        pool.map(
+                            _drain,
+                            range(workers),
+                            [workers] * workers,
+                            [batch_size] * workers,
+                        )
+                    )
+                    processed += sum(counts)
+                    if not any(counts):
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+            except KeyboardInterrupt:
+                pass
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {processed} queued transfers in {elapsed:.2f}s "
+                f"({processed / elapsed:.1f}/sec)."
+            )
+        )
@@ -0,0 +1,62 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+from users.models import DailyOutflow, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill or rebuild the per-account daily outflow counters from the "
+        "Transaction history. Run it while transfers are paused, otherwise "
+        "transfers landing mid-rebuild for the rebuilt days can be lost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Only rebuild days on or after this date (YYYY-MM-DD).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        batch_size = options["batch_size"]
+
+        transactions = Transaction.objects.filter(
+            status="success", from_account__isnull=False
+        )
+        outflows = DailyOutflow.objects.all()
+        if since:
+            transactions = transactions.filter(timestamp__date__gte=since)
+            outflows = outflows.filter(day__gte=since)
+
+        totals = (
+            transactions.annotate(day=TruncDate("timestamp"))
+            .values_list("from_account", "day")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+
+        created = 0
+        with db_transaction.atomic():
+            deleted, _ = outflows.delete()
+            batch = []
+            for account_id, day, total in totals.iterator(chunk_size=batch_size):
+                batch.append(DailyOutflow(account_id=account_id, day=day, total=total))
+                if len(batch) >= batch_size:
+                    DailyOutflow.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            DailyOutflow.objects.bulk_create(batch)
+            created += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {created} daily outflow rows ({deleted} replaced)."
+            )
+        )
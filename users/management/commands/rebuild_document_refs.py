@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from users.models import KYC, DocumentBlob
+from users.storage import BLOB_DIR, blob_name, digest_of
+
+
+class Command(BaseCommand):
+    help = (
+        "Move KYC files uploaded before content-addressed storage into "
+        "digest-named blobs, then recount blob references from the KYC table "
+        "and delete blobs nothing points at (e.g. after users were deleted), "
+        "including files left by uploads whose transaction rolled back. "
+        "Run it while registrations and re-submissions are paused."
+    )
+
+    def handle(self, *args, **options):
+        storage = KYC._meta.get_field("file").storage
+
+        moved = 0
+        legacy = KYC.objects.filter(digest__isnull=True).exclude(file="")
+        for kyc in legacy.iterator(chunk_size=500):
+            old_name = kyc.file.name
+            if not storage.exists(old_name):
+                self.stderr.write(f"KYC {kyc.pk}: {old_name} is missing, skipped.")
+                continue
+            with storage.open(old_name) as content:
+                name = storage.save(old_name, content)
+            KYC.objects.filter(pk=kyc.pk).update(file=name, digest=digest_of(name))
+            storage.delete(old_name)
+            moved += 1
+
+        counts = dict(
+            KYC.objects.filter(digest__isnull=False)
+            .values_list("digest")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        blobs = {blob.digest: blob for blob in DocumentBlob.objects.all()}
+        created = []
+        for digest, refcount in counts.items():
+            blob = blobs.pop(digest, None)
+            if blob is None:
+                created.append(
+                    DocumentBlob(
+                        digest=digest,
+                        size=storage.size(blob_name(digest)),
+                        refcount=refcount,
+                    )
+                )
+            elif blob.refcount != refcount:
+                blob.refcount = refcount
+                blob.save(update_fields=["refcount"])
+        DocumentBlob.objects.bulk_create(created)
+
+        # Whatever is left has no KYC row pointing at it
+        for digest in blobs:
+            storage.delete(blob_name(digest))
+        DocumentBlob.objects.filter(digest__in=list(blobs)).delete()
+
+        # Files written by store_document for a transaction that rolled back
+        tracked = set(counts)
+        orphans = 0
+        prefixes = storage.listdir(BLOB_DIR)[0] if storage.exists(BLOB_DIR) else []
+        for prefix in prefixes:
+            if prefix == "tmp":  # uploads still being written
+                continue
+            for digest in storage.listdir(f"{BLOB_DIR}/{prefix}")[1]:
+                if digest not in tracked:
+                    storage.delete(blob_name(digest))
+                    orphans += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {moved} legacy files, tracked {len(counts)} blobs "
+                f"({len(created)} new), removed {len(blobs)} unreferenced "
+                f"and {orphans} orphaned files."
+            )
+        )
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.audit_archive import get_archive
+from users.audit_rollups import hour_of, rebuild_rollups, settled_before
+
+
+def _hour(value):
+    when = datetime.fromisoformat(value)
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return hour_of(when)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the hourly audit rollups from the AuditLog table, one day "
+        "per transaction. Use it to backfill after enabling rollups or to "
+        "repair counts lost by a crashed worker. Hours that are still being "
+        "counted by the running workers are never rebuilt, and hours already "
+        "moved to the audit archive are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=_hour,
+            help="First hour to rebuild (ISO 8601). Defaults to 24 hours ago.",
+        )
+        parser.add_argument(
+            "--until",
+            type=_hour,
+            help="Rebuild up to, not including, this hour (ISO 8601).",
+        )
+
+    def handle(self, *args, **options):
+        closed = settled_before()
+        until = min(options["until"] or closed, closed)
+        since = options["since"] or until - timedelta(hours=24)
+
+        archive = get_archive()
+        archived_before = archive.archived_before if archive else None
+        if archived_before and since < archived_before:
+            since = hour_of(archived_before) + timedelta(hours=1)
+            self.stdout.write(
+                f"Starting at {since:%Y-%m-%d %H}:00, earlier hours are archived."
+            )
+        if since >= until:
+            raise CommandError("Nothing to rebuild in the requested window.")
+
+        created = 0
+        start = since
+        while start < until:
+            end = min(start + timedelta(days=1), until)
+            created += rebuild_rollups(start, end)
+            start = end
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {created} rollup rows for {since:%Y-%m-%d %H}:00 "
+                f"to {until:%Y-%m-%d %H}:00."
+            )
+        )
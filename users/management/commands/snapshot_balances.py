@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from users.ledger import take_snapshots
+from users.models import BankAccount
+
+
+class Command(BaseCommand):
+    help = (
+        "Record a ledger balance snapshot for every account so as-of-date "
+        "balance queries only replay the entries posted since. Schedule it "
+        "periodically (e.g. nightly)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        ids = BankAccount.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk = 0
+        total = 0
+        while True:
+            chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            total += take_snapshots(chunk)
+            last_pk = chunk[-1]
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {total} accounts."))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.management.pool import process_pool
+from users.models import BankAccount
+
+
+def _verify_chunk(account_ids):
+    from django.db import transaction as db_transaction
+
+    from users.ledger import ledger_positions
+
+    # One consistent read view so in-flight transfers can't cause false alarms
+    with db_transaction.atomic():
+        positions = ledger_positions(account_ids)
+    return [
+        (p["account_number"], p["balance"], p["ledger_balance"])
+        for p in positions.values()
+        if p["balance"] != p["ledger_balance"]
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Check BankAccount.balance against latest snapshot + ledger delta for "
+        "every account, in chunks spread across a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def chunks(self, chunk_size):
+        ids = BankAccount.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk = 0
+        while True:
+            chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1]
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked = 0
+        mismatches = []
+        with process_pool(options["workers"]) as pool:
+            chunks = list(self.chunks(options["chunk_size"]))
+            for chunk, bad in zip(chunks, pool.map(_verify_chunk, chunks)):
+                checked += len(chunk)
+                mismatches.extend(bad)
+
+        for account_number, balance, ledger_balance in mismatches:
+            self.stderr.write(
+                f"{account_number}: balance {balance}, ledger {ledger_balance}"
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Checked {checked} accounts in {elapsed:.2f}s.")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} accounts disagree with the ledger.")
+        self.stdout.write(self.style.SUCCESS("All balances match the ledger."))
@@ -0,0 +1,17 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections
+
+
+def _init_worker():
+    # Spawned children start with a bare interpreter; forked ones inherit
+    # the parent's setup and only need fresh DB connections.
+    django.setup()
+    connections.close_all()
+
+
+def process_pool(workers):
+    # Never hand an open connection to a forked child
+    connections.close_all()
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
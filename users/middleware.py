@@ -1,20 +1,36 @@
-from users.models import AuditLog
+from users import audit
+from users.utils import get_client_ip
 from django.utils.deprecation import MiddlewareMixin
 
 
 class AuditLoggingMiddleware(MiddlewareMixin):
     def process_view(self, request, view_func, view_args, view_kwargs):
-        user = request.user if request.user.is_authenticated else None
-        ip = self.get_client_ip(request)
-        action = f"{request.method} {request.path}"
-        # Save log
-        AuditLog.objects.create(user=user, action=action, ip_address=ip)
+        # Views and serializers append to this context; it is written as one
+        # row once the response (and so the status code) is known.
+        request.audit_context = audit.open_context(request, get_client_ip(request))
         return None
 
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(",")[0]
-        else:
-            ip = request.META.get("REMOTE_ADDR")
-        return ip
+    def process_response(self, request, response):
+        opened = getattr(request, "audit_context", None)
+        if opened is None:
+            return response
+        context, token = opened
+        # DRF authenticates inside the view and mirrors the user back onto
+        # the Django request, so JWT users are visible here.
+        user = request.user if request.user.is_authenticated else None
+        audit.close_context(context, token, user, response.status_code)
+        response["X-Request-ID"] = context.request_id
+        return response
+
+
+class RateLimitHeadersMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        # Left by users.throttling.TokenBucketThrottle when the view ran
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit is None:
+            return response
+        response["RateLimit-Limit"] = str(rate_limit["limit"])
+        response["RateLimit-Remaining"] = str(rate_limit["remaining"])
+        response["RateLimit-Reset"] = str(rate_limit["reset"])
+        response["RateLimit-Policy"] = rate_limit["policy"]
+        return response
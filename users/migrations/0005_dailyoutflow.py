@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def backfill_today(apps, schema_editor):
+    # Only today's counters gate transfers; without them every account's
+    # limit would restart at zero on deploy day. Older days can be filled in
+    # with rebuild_daily_outflows if they are wanted for reporting.
+    DailyOutflow = apps.get_model("users", "DailyOutflow")
+    Transaction = apps.get_model("users", "Transaction")
+    today = timezone.now().date()
+    totals = (
+        Transaction.objects.filter(
+            status="success", from_account__isnull=False, timestamp__date=today
+        )
+        .values_list("from_account")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    DailyOutflow.objects.bulk_create(
+        (
+            DailyOutflow(account_id=account_id, day=today, total=total)
+            for account_id, total in totals.iterator()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_auditlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOutflow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_outflows', to='users.bankaccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'day'), name='unique_daily_outflow_per_account')],
+            },
+        ),
+        migrations.RunPython(backfill_today, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:51
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_dailyoutflow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('from_account_number', models.CharField(max_length=12)),
+                ('to_account_number', models.CharField(max_length=12)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('partition', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('success', 'Success'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('reason', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_transfers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'partition', 'id'], name='queued_transfer_drain_idx')],
+            },
+        ),
+    ]
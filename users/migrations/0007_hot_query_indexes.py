@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0006_queuedtransfer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp', 'id'], name='auditlog_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kyc',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['submitted_at'], name='kyc_pending_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kyc',
+            index=models.Index(fields=['status', 'submitted_at'], name='kyc_status_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['from_account', 'status', 'timestamp'], name='txn_sender_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='user_email_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['from_account', 'timestamp', 'id'], name='txn_sender_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['to_account', 'timestamp', 'id'], name='txn_recipient_ts_id_idx'),
+        ),
+    ]
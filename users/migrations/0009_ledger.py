@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_existing_balances(apps, schema_editor):
+    # Carry every pre-ledger balance forward as an opening posting so the
+    # ledger agrees with BankAccount.balance from day one.
+    BankAccount = apps.get_model("users", "BankAccount")
+    LedgerEntry = apps.get_model("users", "LedgerEntry")
+    batch = []
+    for account_id, balance in BankAccount.objects.values_list("id", "balance").iterator(chunk_size=2000):
+        if not balance:
+            continue
+        batch.append(LedgerEntry(account_id=account_id, kind="opening_balance", amount=balance))
+        batch.append(LedgerEntry(account_id=None, kind="opening_balance", amount=-balance))
+        if len(batch) >= 2000:
+            LedgerEntry.objects.bulk_create(batch)
+            batch = []
+    LedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_statement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('last_entry_id', models.BigIntegerField(default=0)),
+                ('taken_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='users.bankaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'taken_at'], name='snapshot_account_taken_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('transfer', 'Transfer'), ('deposit', 'Deposit'), ('opening_balance', 'Opening balance')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='users.bankaccount')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='users.transaction', to_field='transaction_id')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'id'], name='ledger_account_id_idx'), models.Index(fields=['account', 'created_at'], name='ledger_account_created_idx')],
+            },
+        ),
+        migrations.RunPython(open_existing_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_auditlog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('action_class', models.CharField(max_length=32)),
+                ('user_id', models.PositiveIntegerField(default=0)),
+                ('ip_address', models.CharField(blank=True, default='', max_length=45)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['action_class', 'hour'], name='rollup_class_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'action_class', 'user_id', 'ip_address'), name='unique_audit_rollup_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_audit_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kyc',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='kyc_claims', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='kyc',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_kyc_document_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentblob',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='documentblob',
+            name='has_renditions',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='documentblob',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentblob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('invalid', 'Invalid')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='documentblob',
+            index=models.Index(fields=['status', 'id'], name='blob_status_id_idx'),
+        ),
+    ]
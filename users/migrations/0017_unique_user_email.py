@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:17
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def dedupe_emails(apps, schema_editor):
+    # Blank addresses become NULL so they don't collide under the unique
+    # constraint. Addresses shared by several users (compared ignoring case,
+    # like MySQL's default collation does) can't be settled here without
+    # losing one of them, so the migration stops and lists them instead.
+    User = apps.get_model("users", "User")
+    User.objects.filter(email="").update(email=None)
+    shared = list(
+        User.objects.filter(email__isnull=False)
+        .values(address=Lower("email"))
+        .annotate(users=Count("id"))
+        .filter(users__gt=1)
+        .values_list("address", flat=True)
+    )
+    if not shared:
+        return
+    owners = {}
+    for address, pk in (
+        User.objects.annotate(address=Lower("email"))
+        .filter(address__in=shared)
+        .order_by("id")
+        .values_list("address", "id")
+    ):
+        owners.setdefault(address, []).append(str(pk))
+    raise RuntimeError(
+        "Email addresses must be unique before this migration can run. "
+        "Change or clear all but one of each and migrate again:\n"
+        + "\n".join(
+            f"  {address}: user ids {', '.join(ids)}"
+            for address, ids in sorted(owners.items())
+        )
+    )
+
+
+def restore_blank_emails(apps, schema_editor):
+    # The column goes back to NOT NULL on the way down
+    User = apps.get_model("users", "User")
+    User.objects.filter(email__isnull=True).update(email="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_user_auth_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254, null=True, verbose_name='email address'),
+        ),
+        migrations.RunPython(dedupe_emails, restore_blank_emails),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_email_idx',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254, null=True, unique=True, verbose_name='email address'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:19
+
+from django.db import migrations, models
+
+
+def create_account_number_sequence(apps, schema_editor):
+    # Allocated numbers start with "0", which uuid-derived ones never do,
+    # so the sequence can start at 1 whatever accounts already exist.
+    NumberSequence = apps.get_model("users", "NumberSequence")
+    NumberSequence.objects.get_or_create(name="account_number", defaults={"next_value": 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_unique_user_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_account_number_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:37
+
+import users.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_account_number_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.NullEmailUserManager()),
+            ],
+        ),
+    ]
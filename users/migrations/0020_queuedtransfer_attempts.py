@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_user_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedtransfer',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_queuedtransfer_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='credentials_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,9 +1,22 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.contrib.auth.models import AbstractUser, UserManager
 import uuid
+import zlib
 from django.contrib.auth import get_user_model
+from users.storage import ContentAddressedStorage
+
 
 # Create your models here.
+class NullEmailUserManager(UserManager):
+    # create_user() and create_superuser() (and AbstractUser.clean()) store
+    # a blank email as NULL, so any number of users can go without one
+    @classmethod
+    def normalize_email(cls, email):
+        return super().normalize_email(email) or None
+
+
 class User(AbstractUser):
     ROLE_CHOICES = (
         ("customer", "Customer"),
@@ -11,13 +24,105 @@ class User(AbstractUser):
         ("auditor", "Auditor"),
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="customer")
+    # Unique so concurrent registrations can't share an address; users
+    # without one store NULL, which the constraint doesn't compare.
+    email = models.EmailField("email address", unique=True, null=True, blank=True)
     full_name = models.CharField(max_length=255)
     kyc_verified = models.BooleanField(default=False)
+    # Bumped when role, KYC status, password or is_active change; see
+    # users.authentication
+    auth_version = models.PositiveIntegerField(default=0)
+    # Bumped with auth_version when the password or is_active change; tokens
+    # issued before are refused outright instead of reloading the user
+    credentials_version = models.PositiveIntegerField(default=0)
+
+    objects = NullEmailUserManager()
+
+    # Saving a change to any of these bumps auth_version, wherever it comes
+    # from (admin, shell, createsuperuser, changepassword)
+    AUTH_FIELDS = ("role", "kyc_verified", "password", "is_active")
+    CREDENTIAL_FIELDS = ("password", "is_active")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_auth_values = user._auth_values()
+        return user
+
+    def _auth_values(self):
+        deferred = self.get_deferred_fields()
+        return {
+            field: getattr(self, field)
+            for field in self.AUTH_FIELDS
+            if field not in deferred
+        }
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, "_loaded_auth_values", {})
+        update_fields = kwargs.get("update_fields")
+        changed = [
+            field
+            for field, value in loaded.items()
+            if getattr(self, field) != value
+            and (update_fields is None or field in update_fields)
+        ]
+        if changed:
+            versions = ["auth_version"]
+            if any(field in self.CREDENTIAL_FIELDS for field in changed):
+                versions.append("credentials_version")
+            previous = {field: getattr(self, field) for field in versions}
+            for field in versions:
+                setattr(self, field, F(field) + 1)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *versions}
+            try:
+                super().save(*args, **kwargs)
+            except BaseException:
+                for field, value in previous.items():
+                    setattr(self, field, value)
+                raise
+            self.refresh_from_db(fields=versions)
+
+            from users.authentication import get_user_cache
+
+            cache, pk = get_user_cache(), self.pk
+            db_transaction.on_commit(lambda: cache.discard([pk]))
+        else:
+            super().save(*args, **kwargs)
+        self._loaded_auth_values = self._auth_values()
 
     def __str__(self):
         return self.username
 
 
+def kyc_storage():
+    return ContentAddressedStorage()
+
+
+class DocumentBlob(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),  # waiting for process_kyc_documents
+        ("ready", "Ready"),
+        ("invalid", "Invalid"),  # not an accepted document type
+    )
+
+    # One stored KYC file per distinct content; KYC rows share it by digest
+    digest = models.CharField(max_length=64, unique=True)  # sha256 hex
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    has_renditions = models.BooleanField(default=False)  # thumbnail + preview
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"], name="blob_status_id_idx")]
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.refcount} refs)"
+
+
 class KYC(models.Model):
     DOCUMENT_TYPES = (
         ("pan", "PAN Card"),
@@ -26,10 +131,32 @@ class KYC(models.Model):
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="kyc")
     document_type = models.CharField(max_length=50, choices=DOCUMENT_TYPES)
-    file = models.FileField(upload_to="kyc/")
+    file = models.FileField(upload_to="kyc/", storage=kyc_storage)
+    digest = models.CharField(max_length=64, blank=True, null=True, db_index=True)
     status = models.CharField(max_length=20, default="pending")
     notes = models.TextField(blank=True, null=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
+    # Review queue lease: the admin currently working on a pending record.
+    # An expired lease puts the record back in the queue.
+    claimed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="kyc_claims",
+        null=True,
+        blank=True,
+    )
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # MySQL has no partial indexes, so it relies on the composite one
+            models.Index(
+                fields=["submitted_at"],
+                condition=models.Q(status="pending"),
+                name="kyc_pending_submitted_idx",
+            ),
+            models.Index(fields=["status", "submitted_at"], name="kyc_status_submitted_idx"),
+        ]
 
     def __str__(self):
         return f"KYC({self.user.username} - {self.status})"
@@ -53,8 +180,19 @@ class BankAccount(models.Model):
 
     @staticmethod
     def generate_account_number():
-        # Generate numeric account number from UUID (max 12 digits)
-        return str(uuid.uuid4().int)[:12]
+        # Check-digited number from this process's reserved block
+        from users.account_numbers import get_allocator
+
+        return get_allocator().allocate()[0]
+
+
+class NumberSequence(models.Model):
+    # Next unreserved value of a named counter; see users.account_numbers
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
 
 
 class Transaction(models.Model):
@@ -83,6 +221,145 @@ class Transaction(models.Model):
     reason = models.TextField(blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["from_account", "status", "timestamp"],
+                name="txn_sender_status_ts_idx",
+            ),
+            # Keyset scans for account statements
+            models.Index(
+                fields=["from_account", "timestamp", "id"], name="txn_sender_ts_id_idx"
+            ),
+            models.Index(
+                fields=["to_account", "timestamp", "id"], name="txn_recipient_ts_id_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} - {self.status}"
+
+
+class DailyOutflow(models.Model):
+    # Running total of successful outgoing transfers per account per day,
+    # maintained by the transfer path so the daily-limit check is a key lookup.
+    account = models.ForeignKey(
+        BankAccount, on_delete=models.CASCADE, related_name="daily_outflows"
+    )
+    day = models.DateField()
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "day"], name="unique_daily_outflow_per_account"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} - {self.day} - {self.total}"
+
+
+class LedgerEntry(models.Model):
+    # Double-entry postings: every movement writes legs that sum to zero. A
+    # leg with no account is the outside world (cash in from a deposit).
+    KIND_CHOICES = (
+        ("transfer", "Transfer"),
+        ("deposit", "Deposit"),
+        ("opening_balance", "Opening balance"),
+    )
+
+    account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        related_name="ledger_entries",
+        null=True,
+        blank=True,
+    )
+    transaction = models.ForeignKey(
+        Transaction,
+        to_field="transaction_id",
+        on_delete=models.CASCADE,
+        related_name="ledger_entries",
+        null=True,
+        blank=True,
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)  # signed
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["account", "id"], name="ledger_account_id_idx"),
+            models.Index(
+                fields=["account", "created_at"], name="ledger_account_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} ({self.account_id})"
+
+
+class BalanceSnapshot(models.Model):
+    # Ledger balance of an account covering every entry up to last_entry_id
+    account = models.ForeignKey(
+        BankAccount, on_delete=models.CASCADE, related_name="balance_snapshots"
+    )
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    last_entry_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["account", "taken_at"], name="snapshot_account_taken_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} - {self.balance} @ {self.taken_at}"
+
+
+class QueuedTransfer(models.Model):
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("success", "Success"),
+        ("failed", "Failed"),
+    )
+    PARTITIONS = 1024
+
+    transaction_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="queued_transfers"
+    )
+    from_account_number = models.CharField(max_length=12)
+    to_account_number = models.CharField(max_length=12)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    # Stable hash of the source account; workers own disjoint partition sets so
+    # transfers from the same account are always applied in queue order.
+    partition = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    reason = models.TextField(blank=True, null=True)
+    # Passes that hit a database error; the transfer fails at
+    # TRANSFER_QUEUE_MAX_ATTEMPTS so it stops holding up its partition.
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "partition", "id"], name="queued_transfer_drain_idx"
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.partition is None:
+            self.partition = self.partition_for(self.from_account_number)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def partition_for(cls, account_number):
+        return zlib.crc32(account_number.encode()) % cls.PARTITIONS
+
     def __str__(self):
         return f"{self.transaction_id} - {self.status}"
 
@@ -92,12 +369,55 @@ class AuditLog(models.Model):
     action = models.CharField(max_length=255)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # One row per request: every event logged while serving it, in order
+    request_id = models.CharField(max_length=64, blank=True, default="")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    events = models.JSONField(default=list, blank=True)
 
     class Meta:
         verbose_name = "Audit Log"
         verbose_name_plural = "Audit Logs"
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["timestamp", "id"], name="auditlog_ts_id_idx"),
+            # Filtered keyset scans for the auditor listing
+            models.Index(
+                fields=["user", "timestamp", "id"], name="auditlog_user_ts_id_idx"
+            ),
+            models.Index(
+                fields=["ip_address", "timestamp", "id"], name="auditlog_ip_ts_id_idx"
+            ),
+            models.Index(
+                fields=["action", "timestamp", "id"], name="auditlog_action_ts_id_idx"
+            ),
+        ]
 
     def __str__(self):
         username = self.user.username if self.user else "Anonymous"
         return f"{username} - {self.action} - - {self.ip_address} - {self.timestamp}"
+
+
+class AuditRollup(models.Model):
+    # Hourly AuditLog counts per (action class, user, IP). user_id 0 and an
+    # empty ip_address stand for "none" so the unique key never holds NULLs.
+    hour = models.DateTimeField()
+    action_class = models.CharField(max_length=32)
+    user_id = models.PositiveIntegerField(default=0)
+    ip_address = models.CharField(max_length=45, blank=True, default="")
+    count = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)  # responses with status >= 400
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["hour", "action_class", "user_id", "ip_address"],
+                name="unique_audit_rollup_key",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["action_class", "hour"], name="rollup_class_hour_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}:00 {self.action_class} x{self.count}"
@@ -0,0 +1,176 @@
+import base64
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from users.audit_archive import get_archive
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        timestamp, pk = datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor."})
+    # encode_cursor always writes an offset; without one the cursor was
+    # made up and can't be compared with stored timestamps
+    if timezone.is_naive(timestamp):
+        raise ValidationError({"cursor": "Invalid cursor."})
+    return timestamp, pk
+
+
+def after_cursor(queryset, cursor):
+    """Rows strictly older than `cursor` in (-timestamp, -id) order."""
+    if cursor is None:
+        return queryset
+    timestamp, pk = cursor
+    # The redundant timestamp__lte bound gives the planner a plain index range
+    return queryset.filter(timestamp__lte=timestamp).filter(
+        Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+    )
+
+
+def _sort_key(row):
+    return (
+        (row["timestamp"], row["id"])
+        if isinstance(row, dict)
+        else (row.timestamp, row.id)
+    )
+
+
+def fetch_page(legs, cursor, limit):
+    """
+    Return up to `limit` rows after `cursor`, newest first, from one or more
+    querysets ("legs") that are each keyset-scanned on (timestamp, id) and
+    merged. A row present in several legs is returned once.
+    """
+    pages = [
+        list(after_cursor(leg, cursor).order_by("-timestamp", "-id")[:limit])
+        for leg in legs
+    ]
+    rows = []
+    seen = set()
+    for row in heapq.merge(*pages, key=_sort_key, reverse=True):
+        key = _sort_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(row)
+        if len(rows) == limit:
+            break
+    return rows
+
+
+def iter_keyset(legs, chunk_size=1000, cursor=None):
+    """Stream every row of `legs` newest first, one bounded query per chunk."""
+    while True:
+        rows = fetch_page(legs, cursor, chunk_size)
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        cursor = _sort_key(rows[-1])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over (timestamp, id), newest first, without OFFSET
+    scans. `paginate_queryset` also accepts a list of querysets, which are
+    merged (e.g. outgoing and incoming transfers of one account).
+    """
+
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        try:
+            size = int(
+                request.query_params.get(self.page_size_query_param, self.page_size)
+            )
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def fetch_rows(self, legs, cursor, limit):
+        return fetch_page(legs, cursor, limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        legs = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        cursor = request.query_params.get(self.cursor_query_param)
+        cursor = decode_cursor(cursor) if cursor else None
+        page_size = self.get_page_size(request)
+
+        rows = self.fetch_rows(legs, cursor, page_size + 1)
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = encode_cursor(*_sort_key(rows[-1]))
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "first": self.get_first_link(),
+                "results": data,
+            }
+        )
+
+
+class AuditLogPagination(KeysetPagination):
+    """
+    Keyset pagination that continues into the audit archive once the
+    database rows run out. Pages whose cursor is already past the archive
+    cutoff are served from the archive alone, without querying the table.
+    The view provides the filters through `get_filters()`.
+    """
+
+    def fetch_rows(self, legs, cursor, limit):
+        archive = get_archive()
+        archived_before = archive.archived_before if archive else None
+        if archived_before is None:
+            return super().fetch_rows(legs, cursor, limit)
+
+        rows = []
+        if cursor is None or cursor[0] >= archived_before:
+            rows = super().fetch_rows(legs, cursor, limit)
+        if len(rows) < limit:
+            # Archived rows are all older than the ones left in the table
+            after = _sort_key(rows[-1]) if rows else cursor
+            archived = archive.iter_rows(after, **self.view.get_filters())
+            rows.extend(islice(archived, limit - len(rows)))
+        return rows
+
+
+class KYCQueuePagination(CursorPagination):
+    """Oldest submissions first; the cursor seeks on submitted_at."""
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    ordering = ("submitted_at", "id")
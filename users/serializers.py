@@ -1,16 +1,26 @@
 from rest_framework import serializers
 from django.contrib.auth.hashers import make_password
-from users.models import User, KYC, BankAccount, Transaction, AuditLog
+from users.models import User, KYC, BankAccount, Transaction, AuditLog, QueuedTransfer
 from decimal import Decimal
-from django.utils import timezone
-from django.db.models import Sum
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
-
-# Atomic transaction to ensure both accounts are updated safely
+from django.db import IntegrityError
 from django.db import transaction as db_transaction
-
-DAILY_LIMIT = Decimal("5000.00")
+from django.utils import timezone
+from datetime import timedelta
+from users.ledger import post_deposit
+from users.documents import release_document, store_document
+from django.urls import reverse
+from users.kyc_review import MAX_BULK_DECISIONS, MAX_CLAIM
+from users.audit_rollups import ACTION_CLASS_NAMES, GROUP_FIELDS
+from users.authentication import bump_auth_version
+from users.account_numbers import is_valid_account_number
+from users.transfers import (
+    MAX_BATCH_SIZE,
+    TransferError,
+    record_failed_transaction,
+    transfer_funds,
+)
 
 
 class KYCReSubmitSerializer(serializers.Serializer):
@@ -28,10 +38,13 @@ class KYCReSubmitSerializer(serializers.Serializer):
         return data
 
     def update(self, instance, validated_data):
-        instance.file = validated_data["file"]
-        instance.status = "pending"
-        instance.notes = ""
-        instance.save()
+        previous = instance.digest
+        with db_transaction.atomic():
+            instance.file, instance.digest = store_document(validated_data["file"])
+            instance.status = "pending"
+            instance.notes = ""
+            instance.save()
+            release_document(previous)
         return instance
 
 
@@ -39,6 +52,14 @@ class KYCVerifySerializer(serializers.Serializer):
     kyc_id = serializers.IntegerField()
     status = serializers.ChoiceField(choices=["verified", "rejected"])
     notes = serializers.CharField(required=False, allow_blank=True)
+    # Overturn a decision already made, e.g. to revoke a verification
+    redecide = serializers.BooleanField(default=False)
+
+
+class KYCBulkVerifySerializer(serializers.Serializer):
+    decisions = KYCVerifySerializer(
+        many=True, allow_empty=False, max_length=MAX_BULK_DECISIONS
+    )
 
 
 class KYCSerializer(serializers.ModelSerializer):
@@ -51,6 +72,11 @@ class PendingKYCSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source="user.username")
     full_name = serializers.CharField(source="user.full_name")
     file_url = serializers.SerializerMethodField()
+    # Set by kyc_review.with_document_info()
+    digest_verified = serializers.BooleanField(read_only=True, default=False)
+    document_status = serializers.CharField(read_only=True, default=None)
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
 
     class Meta:
         model = KYC
@@ -61,15 +87,47 @@ class PendingKYCSerializer(serializers.ModelSerializer):
             "full_name",
             "document_type",
             "file_url",
+            "thumbnail_url",
+            "preview_url",
+            "document_status",
+            "digest",
+            "digest_verified",
             "status",
             "submitted_at",
+            "claimed_by",
+            "lease_expires_at",
         ]
 
-    def get_file_url(self, obj):
+    def _absolute(self, url):
         request = self.context.get("request")
         if request:
-            return request.build_absolute_uri(obj.file.url)
-        return obj.file.url
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_file_url(self, obj):
+        return self._absolute(reverse("kyc_document", args=[obj.id]))
+
+    def _rendition_url(self, obj, kind):
+        if not getattr(obj, "has_renditions", False):
+            return None
+        url = reverse("kyc_document", args=[obj.id])
+        return self._absolute(f"{url}?rendition={kind}")
+
+    def get_thumbnail_url(self, obj):
+        return self._rendition_url(obj, "thumbnail")
+
+    def get_preview_url(self, obj):
+        return self._rendition_url(obj, "preview")
+
+
+class KYCClaimSerializer(serializers.Serializer):
+    count = serializers.IntegerField(default=1, min_value=1, max_value=MAX_CLAIM)
+
+
+class KYCReleaseSerializer(serializers.Serializer):
+    kyc_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=MAX_CLAIM
+    )
 
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -77,19 +135,24 @@ class UserRegisterSerializer(serializers.ModelSerializer):
     file = serializers.FileField(write_only=True)
     password = serializers.CharField(write_only=True)
 
+    # Uniqueness is left to the database constraints (see create), instead
+    # of an exists() query per field that a concurrent signup can race.
+    UNIQUE_ERRORS = {
+        "username": "Username already exists.",
+        "email": "Email already registered.",
+    }
+
     class Meta:
         model = User
         fields = ["username", "email", "password", "full_name", "document_type", "file"]
-
-    def validate_username(self, value):
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Username already exists.")
-        return value
+        extra_kwargs = {
+            "username": {"validators": User._meta.get_field("username").validators},
+            "email": {"validators": []},
+        }
 
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Email already registered.")
-        return value
+        # Users without an address are stored as NULL, which never collides
+        return value or None
 
     def validate_password(self, value):
         try:
@@ -101,15 +164,33 @@ class UserRegisterSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         document_type = validated_data.pop("document_type")
         file = validated_data.pop("file")
-        password = validated_data.pop("password")
-        user = User.objects.create(
-            password=make_password(password), role="customer", **validated_data
-        )
-        KYC.objects.create(user=user, document_type=document_type, file=file)
+        # Hashed before the transaction opens, so no locks are held meanwhile
+        password = make_password(validated_data.pop("password"))
+        try:
+            with db_transaction.atomic():
+                user = User.objects.create(
+                    password=password, role="customer", **validated_data
+                )
+                name, digest = store_document(file)
+                self.kyc = KYC.objects.create(
+                    user=user, document_type=document_type, file=name, digest=digest
+                )
+        except IntegrityError:
+            raise serializers.ValidationError(self.unique_errors(validated_data))
         return user
 
+    def unique_errors(self, validated_data):
+        """Field errors for the values a failed insert collided with."""
+        errors = {}
+        for field, message in self.UNIQUE_ERRORS.items():
+            value = validated_data.get(field)
+            if value and User.objects.filter(**{field: value}).exists():
+                errors[field] = [message]
+        return errors or {"non_field_errors": ["Registration failed, please retry."]}
+
     def to_representation(self, instance):
-        kyc = instance.kyc.first()
+        # Built from the rows create() just wrote, without reading them back
+        kyc = getattr(self, "kyc", None) or instance.kyc.first()
         return {
             "user": {
                 "id": instance.id,
@@ -148,7 +229,7 @@ class ResetPasswordSerializer(serializers.Serializer):
 
         user = User.objects.get(email=email)
         user.password = make_password(new_password)
-        user.save()
+        bump_auth_version([user.pk], password=user.password)
         return user
 
 
@@ -180,24 +261,32 @@ class BankAccountCreateSerializer(serializers.ModelSerializer):
         user = self.context["request"].user
         initial_deposit = validated_data.pop("initial_deposit")
         account_number = BankAccount.generate_account_number()
-        account = BankAccount.objects.create(
-            user=user,
-            account_number=account_number,
-            account_type=validated_data["account_type"],
-            balance=initial_deposit,
-        )
+        with db_transaction.atomic():
+            account = BankAccount.objects.create(
+                user=user,
+                account_number=account_number,
+                account_type=validated_data["account_type"],
+                balance=initial_deposit,
+            )
+            post_deposit(account, initial_deposit)
         return account
 
 
 class TransferSerializer(serializers.Serializer):
     from_account = serializers.CharField()
     to_account = serializers.CharField()
-    amount = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0.01)
+    amount = serializers.DecimalField(
+        max_digits=15, decimal_places=2, min_value=Decimal("0.01")
+    )
 
     def validate(self, data):
         user = self.context["request"].user
         amount = data.get("amount")
 
+        # A mistyped recipient is caught by its check digit, before any query
+        if not is_valid_account_number(data["to_account"]):
+            raise serializers.ValidationError("Invalid recipient account number.")
+
         # Default failed transaction object (for logging)
         self.failed_txn = Transaction(amount=amount, status="failed")
 
@@ -208,7 +297,7 @@ class TransferSerializer(serializers.Serializer):
             )
         except BankAccount.DoesNotExist:
             self.failed_txn.reason = "Sender account not found."
-            self.failed_txn.save()
+            record_failed_transaction(self.failed_txn)
             raise serializers.ValidationError("Sender account not found.")
 
         # Check recipient account
@@ -217,32 +306,17 @@ class TransferSerializer(serializers.Serializer):
         except BankAccount.DoesNotExist:
             self.failed_txn.from_account = from_acc
             self.failed_txn.reason = "Recipient account not found."
-            self.failed_txn.save()
+            record_failed_transaction(self.failed_txn)
             raise serializers.ValidationError("Recipient account not found.")
 
+        # Cheap pre-check on the unlocked row; transfer_funds re-checks under lock
         if from_acc.balance < amount:
             self.failed_txn.from_account = from_acc
             self.failed_txn.to_account = to_acc
             self.failed_txn.reason = "Insufficient funds."
-            self.failed_txn.save()
+            record_failed_transaction(self.failed_txn)
             raise serializers.ValidationError("insufficient_funds")
 
-        # Daily limit check
-        today = timezone.now().date()
-        total_transferred_today = (
-            Transaction.objects.filter(
-                from_account=from_acc, timestamp__date=today, status="success"
-            ).aggregate(Sum("amount"))["amount__sum"]
-            or 0
-        )
-
-        if total_transferred_today + amount > DAILY_LIMIT:
-            self.failed_txn.from_account = from_acc
-            self.failed_txn.to_account = to_acc
-            self.failed_txn.reason = "Daily limit exceeded."
-            self.failed_txn.save()
-            raise serializers.ValidationError("daily_limit_exceeded")
-
         data["from_acc"] = from_acc
         data["to_acc"] = to_acc
         return data
@@ -252,26 +326,116 @@ class TransferSerializer(serializers.Serializer):
         to_acc = validated_data["to_acc"]
         amount = validated_data["amount"]
 
-        with db_transaction.atomic():
-            from_acc.balance -= amount
-            to_acc.balance += amount
-            from_acc.save()
-            to_acc.save()
-
-            txn = Transaction.objects.create(
-                from_account=from_acc,
-                to_account=to_acc,
-                amount=amount,
-                status="success",
-            )
-        return txn
+        try:
+            return transfer_funds(from_acc, to_acc, amount)
+        except TransferError as e:
+            # The atomic block was rolled back, so the failure is recorded after it
+            self.failed_txn.from_account = from_acc
+            self.failed_txn.to_account = to_acc
+            self.failed_txn.reason = e.reason
+            record_failed_transaction(self.failed_txn)
+            raise serializers.ValidationError({"non_field_errors": [e.code]})
+
+
+class QueuedTransferSerializer(serializers.ModelSerializer):
+    from_account = serializers.CharField(source="from_account_number", max_length=12)
+    to_account = serializers.CharField(source="to_account_number", max_length=12)
+    amount = serializers.DecimalField(
+        max_digits=15, decimal_places=2, min_value=Decimal("0.01")
+    )
+
+    class Meta:
+        model = QueuedTransfer
+        fields = ["transaction_id", "from_account", "to_account", "amount", "status"]
+        read_only_fields = ["transaction_id", "status"]
+
+    def validate_to_account(self, value):
+        if not is_valid_account_number(value):
+            raise serializers.ValidationError("Invalid recipient account number.")
+        return value
+
+
+class TransferBatchItemSerializer(serializers.Serializer):
+    from_account = serializers.CharField()
+    to_account = serializers.CharField()
+    amount = serializers.DecimalField(
+        max_digits=15, decimal_places=2, min_value=Decimal("0.01")
+    )
+
+
+class TransferBatchSerializer(serializers.Serializer):
+    MODES = ["all_or_nothing", "best_effort"]
+
+    transfers = TransferBatchItemSerializer(
+        many=True, allow_empty=False, max_length=MAX_BATCH_SIZE
+    )
+    mode = serializers.ChoiceField(choices=MODES, default="all_or_nothing")
 
 
 class AuditLogSerializer(serializers.ModelSerializer):
-    user_id = serializers.IntegerField(source="user.id", read_only=True)
-    username = serializers.CharField(source="user.username", read_only=True)
+    # Serializes AuditLog.objects.values(*AuditLogSerializer.VALUES) rows, so
+    # the username comes from the join instead of a lazy load per row.
+    VALUES = [
+        "id",
+        "user_id",
+        "user__username",
+        "action",
+        "ip_address",
+        "timestamp",
+        "request_id",
+        "status_code",
+        "duration_ms",
+        "events",
+    ]
+
+    user_id = serializers.IntegerField(read_only=True)
+    username = serializers.CharField(source="user__username", read_only=True)
 
     class Meta:
         model = AuditLog
-        fields = ["user_id", "username", "action", "ip_address", "timestamp"]
+        fields = [
+            "user_id",
+            "username",
+            "action",
+            "ip_address",
+            "timestamp",
+            "request_id",
+            "status_code",
+            "duration_ms",
+            "events",
+        ]
         read_only_fields = fields  # Logs cannot be created via API
+
+
+class AuditStatsQuerySerializer(serializers.Serializer):
+    # Rollups are hourly, so `since` is rounded down to the hour
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    group_by = serializers.CharField(required=False, default="action_class")
+    action_class = serializers.CharField(required=False)
+    user = serializers.IntegerField(required=False)
+    ip = serializers.IPAddressField(required=False)
+    limit = serializers.IntegerField(
+        required=False, default=50, min_value=1, max_value=500
+    )
+
+    def _names(self, value, allowed):
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if not names or unknown:
+            raise serializers.ValidationError(f"Choose from: {', '.join(allowed)}.")
+        return names
+
+    def validate_group_by(self, value):
+        return self._names(value, list(GROUP_FIELDS))
+
+    def validate_action_class(self, value):
+        return self._names(value, ACTION_CLASS_NAMES)
+
+    def validate(self, data):
+        until = data.get("until") or timezone.now()
+        data["until"] = until
+        data.setdefault("since", until - timedelta(hours=24))
+        if data["since"] >= until:
+            raise serializers.ValidationError({"since": "Must be earlier than until."})
+        return data
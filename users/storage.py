@@ -0,0 +1,59 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_DIR = "kyc/blobs"
+
+
+def blob_name(digest):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}"
+
+
+def digest_of(name):
+    """The digest a blob name was stored under, or None for legacy names."""
+    if not name or not name.startswith(BLOB_DIR + "/"):
+        return None
+    return os.path.basename(name)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each upload under the sha256 of its bytes instead of the name it
+    was uploaded with. The digest is computed while the upload is streamed
+    to a temporary file, which is then renamed into place, or dropped when
+    the same content is already stored. The upload's own name is ignored.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are digests, so an existing name already holds this content
+        return name
+
+    def _save(self, name, content):
+        tmp_dir = self.path(f"{BLOB_DIR}/tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            name = blob_name(digest.hexdigest())
+            path = self.path(name)
+            if os.path.exists(path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
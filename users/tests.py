@@ -1,3 +1,2030 @@
-from django.test import TestCase
+import csv
+import importlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from users import audit, authentication, idempotency
+from users.account_numbers import (
+    SEQUENCE,
+    AccountNumberAllocator,
+    format_account_number,
+    is_valid_account_number,
+    luhn_check_digit,
+)
+from users.audit_archive import SEGMENT_SUFFIX, ArchiveCorrupted, AuditArchive
+from users.audit_rollups import RollupAccumulator, hour_of, rebuild_rollups
+from users.buffers import BulkWriter
+from users.document_pipeline import process_blob, rendition_name
+from users.documents import release_document, store_document
+from users.authentication import (
+    CachedJWTAuthentication,
+    ClaimsRefreshToken,
+    UserVersionCache,
+    bump_auth_version,
+)
+from users.hashers import HashingPool, HashingPoolSaturated
+from users.kyc_review import (
+    KYCReviewError,
+    claim_next,
+    decide,
+    decide_bulk,
+    lease_duration,
+    release,
+)
+from users.ledger import post_deposit, take_snapshots
+from users.management.commands.explain_hot_queries import Command as ExplainHotQueries
+from users.management.commands.import_customers import _import_partition
+from users.management.commands.verify_balances import _verify_chunk
+from users.models import (
+    KYC,
+    AuditLog,
+    AuditRollup,
+    BankAccount,
+    DailyOutflow,
+    DocumentBlob,
+    LedgerEntry,
+    NumberSequence,
+    QueuedTransfer,
+    Transaction,
+    User,
+)
+from users.pagination import encode_cursor
+from users.throttling import BucketStore
+from users.transfer_queue import drain_partitions, process_queued_transfer
+from users.transfers import TransferError, transfer_batch, transfer_funds
+from users.utils import log_action
+
+# Views run unthrottled; the buckets live in a file shared between runs
+UNTHROTTLED = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={})
+
+# Numbers are assigned here rather than reserved from the sequence, which
+# runs on a connection of its own outside the test's transaction
+serials = itertools.count(10**9)
+
+
+def png_upload(name="id.png", color="red"):
+    out = BytesIO()
+    Image.new("RGB", (64, 48), color).save(out, "PNG")
+    return SimpleUploadedFile(name, out.getvalue(), content_type="image/png")
+
+
+class MediaRootMixin:
+    """Runs each test against an empty MEDIA_ROOT of its own."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+def make_account(username, balance, account_type="savings", user=None):
+    if user is None:
+        user = User.objects.create_user(
+            username=username, email=f"{username}@example.com", password="pw"
+        )
+    return BankAccount.objects.create(
+        user=user,
+        account_number=format_account_number(next(serials)),
+        account_type=account_type,
+        balance=Decimal(balance),
+    )
+
+
+@override_settings(
+    FAILED_TRANSFER_BUFFER={"ENABLED": False},
+    DAILY_TRANSFER_LIMITS={"savings": "500.00"},
+)
+class TransferFundsTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("alice", "300.00")
+        self.recipient = make_account("bob", "0.00")
+
+    def balances(self):
+        self.sender.refresh_from_db()
+        self.recipient.refresh_from_db()
+        return self.sender.balance, self.recipient.balance
+
+    def test_moves_money_and_posts_ledger_legs(self):
+        txn = transfer_funds(self.sender, self.recipient, Decimal("120.00"))
+        self.assertEqual(txn.status, "success")
+        self.assertEqual(self.balances(), (Decimal("180.00"), Decimal("120.00")))
+        legs = LedgerEntry.objects.filter(transaction=txn.transaction_id)
+        self.assertEqual(sorted(leg.amount for leg in legs), [-120, 120])
+
+    def test_overdraft_is_rejected_without_writes(self):
+        with self.assertRaises(TransferError) as caught:
+            transfer_funds(self.sender, self.recipient, Decimal("300.01"))
+        self.assertEqual(caught.exception.code, "insufficient_funds")
+        self.assertEqual(self.balances(), (Decimal("300.00"), Decimal("0.00")))
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(self.sender.daily_outflows.exists())
+
+    def test_whole_balance_can_be_sent(self):
+        transfer_funds(self.sender, self.recipient, Decimal("300.00"))
+        self.assertEqual(self.balances(), (Decimal("0.00"), Decimal("300.00")))
+
+    def test_daily_limit_counts_earlier_transfers(self):
+        BankAccount.objects.filter(pk=self.sender.pk).update(balance=1000)
+        transfer_funds(self.sender, self.recipient, Decimal("300.00"))
+        transfer_funds(self.sender, self.recipient, Decimal("200.00"))
+        with self.assertRaises(TransferError) as caught:
+            transfer_funds(self.sender, self.recipient, Decimal("0.01"))
+        self.assertEqual(caught.exception.code, "daily_limit_exceeded")
+        self.assertEqual(self.balances(), (Decimal("500.00"), Decimal("500.00")))
+        self.assertEqual(self.sender.daily_outflows.get().total, Decimal("500.00"))
+
+
+@override_settings(
+    FAILED_TRANSFER_BUFFER={"ENABLED": False},
+    DAILY_TRANSFER_LIMITS={"savings": "500.00"},
+)
+class TransferBatchTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("alice", "300.00")
+        self.recipient = make_account("bob", "0.00")
+
+    def item(self, amount, to_account=None):
+        return {
+            "from_account": self.sender.account_number,
+            "to_account": to_account or self.recipient.account_number,
+            "amount": Decimal(amount),
+        }
+
+    def test_running_balance_catches_overdraft(self):
+        results = transfer_batch(
+            self.sender.user,
+            [self.item("200.00"), self.item("100.00"), self.item("0.01")],
+            all_or_nothing=False,
+        )
+        self.assertEqual(
+            [r["status"] for r in results], ["success", "success", "failed"]
+        )
+        self.assertEqual(results[2]["error"], "insufficient_funds")
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal("0.00"))
+        self.assertEqual(Transaction.objects.filter(status="failed").count(), 1)
+
+    def test_all_or_nothing_applies_nothing_on_failure(self):
+        results = transfer_batch(
+            self.sender.user, [self.item("200.00"), self.item("200.00")]
+        )
+        self.assertEqual([r["status"] for r in results], ["not_applied", "failed"])
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal("300.00"))
+        self.assertFalse(Transaction.objects.filter(status="success").exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+
+    def test_daily_limit_includes_earlier_transfers(self):
+        BankAccount.objects.filter(pk=self.sender.pk).update(balance=1000)
+        transfer_funds(self.sender, self.recipient, Decimal("400.00"))
+        results = transfer_batch(
+            self.sender.user,
+            [self.item("100.00"), self.item("0.01")],
+            all_or_nothing=False,
+        )
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(results[1]["error"], "daily_limit_exceeded")
+        self.assertEqual(self.sender.daily_outflows.get().total, Decimal("500.00"))
+
+    def test_only_own_accounts_can_send(self):
+        results = transfer_batch(
+            self.recipient.user, [self.item("1.00")], all_or_nothing=False
+        )
+        self.assertEqual(results[0]["error"], "sender_not_found")
+
+
+@override_settings(
+    FAILED_TRANSFER_BUFFER={"ENABLED": False},
+    DAILY_TRANSFER_LIMITS={"savings": "500.00"},
+)
+class DailyOutflowTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("alice", "5000.00")
+        self.recipient = make_account("bob", "0.00")
+
+    def at(self, when):
+        return mock.patch("django.utils.timezone.now", return_value=when)
+
+    def send(self, amount, when):
+        with self.at(when):
+            return transfer_funds(self.sender, self.recipient, Decimal(amount))
+
+    def outflows(self):
+        return dict(self.sender.daily_outflows.values_list("day", "total"))
+
+    def test_limit_spans_several_transfers(self):
+        now = timezone.now()
+        for amount in ("150.00", "150.00", "200.00"):
+            self.send(amount, now)
+        with self.assertRaises(TransferError) as caught:
+            self.send("0.01", now)
+        self.assertEqual(caught.exception.code, "daily_limit_exceeded")
+        self.assertEqual(self.outflows(), {now.date(): Decimal("500.00")})
+
+    def test_limit_restarts_at_the_day_boundary(self):
+        midnight = datetime(2026, 3, 2, tzinfo=dt_timezone.utc)
+        self.send("500.00", midnight - timedelta(seconds=1))
+        with self.assertRaises(TransferError):
+            self.send("0.01", midnight - timedelta(seconds=1))
+        self.send("500.00", midnight)
+        self.assertEqual(
+            self.outflows(),
+            {
+                date(2026, 3, 1): Decimal("500.00"),
+                date(2026, 3, 2): Decimal("500.00"),
+            },
+        )
+
+    def test_rebuild_matches_transaction_history(self):
+        day = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+        self.send("120.00", day)
+        self.send("80.00", day)
+        self.send("300.00", day + timedelta(days=1))
+        expected = self.outflows()
+        DailyOutflow.objects.all().delete()
+        DailyOutflow.objects.create(account=self.recipient, day=day, total=1)
+
+        call_command("rebuild_daily_outflows", stdout=StringIO())
+        self.assertEqual(self.outflows(), expected)
+        self.assertFalse(self.recipient.daily_outflows.exists())
+
+    def test_migration_backfills_today(self):
+        migration = importlib.import_module("users.migrations.0005_dailyoutflow")
+        self.send("100.00", timezone.now() - timedelta(days=1))
+        self.send("250.00", timezone.now())
+        DailyOutflow.objects.all().delete()
+
+        migration.backfill_today(django_apps, None)
+        self.assertEqual(self.outflows(), {timezone.now().date(): Decimal("250.00")})
+
+
+@override_settings(
+    REST_FRAMEWORK=UNTHROTTLED,
+    FAILED_TRANSFER_BUFFER={"ENABLED": False},
+    IDEMPOTENCY_WAIT_TIMEOUT=5,
+)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("alice", "300.00")
+        self.recipient = make_account("bob", "0.00")
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender.user)
+        self.key = str(uuid.uuid4())
+
+    def transfer(self, amount="100.00", key=None):
+        return self.client.post(
+            "/api/v1/transfer/",
+            {
+                "from_account": self.sender.account_number,
+                "to_account": self.recipient.account_number,
+                "amount": amount,
+            },
+            format="json",
+            headers={"Idempotency-Key": key or self.key},
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.transfer()
+        second = self.transfer()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal("200.00"))
+
+    def test_key_reused_for_other_request(self):
+        self.transfer()
+        self.assertEqual(self.transfer(amount="1.00").status_code, 422)
+
+    def test_raised_validation_errors_are_replayed(self):
+        self.client.force_authenticate(self.recipient.user)  # KYC not verified
+        body = {"account_type": "savings", "initial_deposit": "10.00"}
+        headers = {"Idempotency-Key": self.key}
+        first = self.client.post("/api/v1/accounts/", body, headers=headers)
+        User.objects.filter(pk=self.recipient.user_id).update(kyc_verified=True)
+        second = self.client.post("/api/v1/accounts/", body, headers=headers)
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+
+    def test_retry_after_failure_executes(self):
+        with mock.patch(
+            "users.serializers.transfer_funds", side_effect=RuntimeError("boom")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.transfer()
+        response = self.transfer()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response.headers)
+
+    def test_waiter_executes_when_first_request_fails(self):
+        store = idempotency.get_store()
+        key = (self.sender.user.pk, "/api/v1/transfer/", self.key)
+        body = {
+            "from_account": self.sender.account_number,
+            "to_account": self.recipient.account_number,
+            "amount": "100.00",
+        }
+        request = mock.Mock(data=body)
+        entry, owner = store.begin(key, idempotency.request_fingerprint(request))
+        self.assertTrue(owner)
+        threading.Timer(0.2, store.abandon, (key, entry)).start()
+        response = self.transfer()
+        self.assertEqual(response.status_code, 200)
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal("200.00"))
+
+
+@override_settings(FAILED_TRANSFER_BUFFER={"ENABLED": False})
+class TransferQueueTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("alice", "300.00")
+        self.other = make_account("carol", "300.00")
+        self.recipient = make_account("bob", "0.00")
+
+    def enqueue(self, account, amount):
+        return QueuedTransfer.objects.create(
+            user=account.user,
+            from_account_number=account.account_number,
+            to_account_number=self.recipient.account_number,
+            amount=Decimal(amount),
+        )
+
+    def test_applies_in_queue_order(self):
+        first = self.enqueue(self.sender, "200.00")
+        second = self.enqueue(self.sender, "200.00")
+        self.assertEqual(drain_partitions(0, 1, 10), 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ("success", "failed"))
+        self.assertEqual(second.reason, "Insufficient funds.")
+
+    def test_database_error_leaves_transfer_queued(self):
+        stuck = self.enqueue(self.sender, "10.00")
+        behind = self.enqueue(self.sender, "10.00")
+        unrelated = self.enqueue(self.other, "10.00")
+
+        def deadlock_once(from_acc, *args, **kwargs):
+            if from_acc.pk == self.sender.pk:
+                raise OperationalError("Deadlock found when trying to get lock")
+            return transfer_funds(from_acc, *args, **kwargs)
+
+        with mock.patch("users.transfer_queue.transfer_funds", deadlock_once):
+            with self.assertLogs("users.transfer_queue", "ERROR"):
+                self.assertEqual(drain_partitions(0, 1, 10), 1)
+        statuses = dict(QueuedTransfer.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[stuck.pk], "queued")
+        self.assertEqual(statuses[behind.pk], "queued")
+        self.assertEqual(statuses[unrelated.pk], "success")
+
+        self.assertEqual(drain_partitions(0, 1, 10), 2)
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal("280.00"))
+
+    @override_settings(TRANSFER_QUEUE_MAX_ATTEMPTS=3)
+    def test_poison_transfer_fails_after_max_attempts(self):
+        poison = self.enqueue(self.sender, "10.00")
+        behind = self.enqueue(self.sender, "20.00")
+        healthy = [self.enqueue(self.other, "10.00") for _ in range(2)]
+
+        def always_deadlock(queued):
+            if queued.pk == poison.pk:
+                raise OperationalError("Deadlock found when trying to get lock")
+            return process_queued_transfer(queued)
+
+        with mock.patch(
+            "users.transfer_queue.process_queued_transfer", always_deadlock
+        ):
+            with self.assertLogs("users.transfer_queue", "ERROR"):
+                self.assertEqual(drain_partitions(0, 1, 10), 2)
+                self.assertEqual(drain_partitions(0, 1, 10), 0)
+                # The third failure gives up, which lets the partition move on
+                self.assertEqual(drain_partitions(0, 1, 10), 2)
+        poison.refresh_from_db()
+        behind.refresh_from_db()
+        self.assertEqual((poison.status, poison.attempts), ("failed", 3))
+        self.assertEqual(behind.status, "success")
+        self.assertEqual(
+            set(
+                QueuedTransfer.objects.filter(
+                    pk__in=[h.pk for h in healthy]
+                ).values_list("status", flat=True)
+            ),
+            {"success"},
+        )
+
+    def test_backlog_does_not_starve_other_partitions(self):
+        self.assertNotEqual(
+            QueuedTransfer.partition_for(self.sender.account_number),
+            QueuedTransfer.partition_for(self.other.account_number),
+        )
+        backlog = [self.enqueue(self.sender, "1.00") for _ in range(3)]
+        late = self.enqueue(self.other, "1.00")
+        self.assertEqual(drain_partitions(0, 1, 2), 2)
+        statuses = dict(QueuedTransfer.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[backlog[0].pk], "success")
+        self.assertEqual(statuses[backlog[1].pk], "queued")
+        self.assertEqual(statuses[late.pk], "success")
+
+
+class HotQueryIndexTests(TestCase):
+    # The index each hot query is expected to use; KYC's partial index only
+    # applies where the planner can match its condition
+    EXPECTED = {
+        "Daily transferred sum over Transaction": ["txn_sender_status_ts_idx"],
+        "Audit log listing": ["auditlog_ts_id_idx"],
+        "Pending KYC queue": ["kyc_pending_submitted_idx", "kyc_status_submitted_idx"],
+        "Transfer queue drain": ["queued_transfer_drain_idx"],
+    }
+
+    def test_hot_queries_use_their_indexes(self):
+        plans = {
+            title: queryset.explain()
+            for title, queryset in ExplainHotQueries().hot_queries()
+        }
+        for title, indexes in self.EXPECTED.items():
+            with self.subTest(title):
+                self.assertTrue(
+                    any(index in plans[title] for index in indexes), plans[title]
+                )
+
+
+@override_settings(
+    REST_FRAMEWORK=UNTHROTTLED, FAILED_TRANSFER_BUFFER={"ENABLED": False}
+)
+class StatementTests(TestCase):
+    def setUp(self):
+        self.alice = make_account("alice", "1000.00")
+        self.bob = make_account("bob", "0.00")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+        self.url = f"/api/v1/accounts/{self.alice.account_number}/transactions/"
+
+    def at(self, when):
+        return mock.patch("django.utils.timezone.now", return_value=when)
+
+    def test_pages_split_rows_with_equal_timestamps(self):
+        for amount in ("10.00", "20.00", "30.00", "40.00"):
+            transfer_funds(self.alice, self.bob, Decimal(amount))
+        transfer_funds(self.bob, self.alice, Decimal("5.00"))
+        Transaction.objects.update(timestamp=timezone.now())
+        expected = [
+            str(txn_id)
+            for txn_id in Transaction.objects.order_by("-id").values_list(
+                "transaction_id", flat=True
+            )
+        ]
+
+        seen, url, pages = [], f"{self.url}?page_size=2", 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [entry["transaction_id"] for entry in response.data["results"]]
+            url = response.data["next"]
+            pages += 1
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_other_accounts_failed_attempts_are_left_out(self):
+        transfer_funds(self.alice, self.bob, Decimal("10.00"))
+        Transaction.objects.create(
+            from_account=self.bob,
+            to_account=self.alice,
+            amount=Decimal("99.00"),
+            status="failed",
+            reason="Insufficient funds.",
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["direction"], "debit")
+
+    def test_bad_cursor_is_400(self):
+        for cursor in (
+            "not base64!",
+            "bm9wZQ==",
+            encode_cursor(timezone.now(), 1)[:-4],
+        ):
+            with self.subTest(cursor):
+                response = self.client.get(self.url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.data)
+
+    def test_balance_as_of(self):
+        start = datetime(2026, 3, 1, 9, tzinfo=dt_timezone.utc)
+        with self.at(start):
+            post_deposit(self.alice, Decimal("1000.00"))
+        with self.at(start + timedelta(hours=1)):
+            transfer_funds(self.alice, self.bob, Decimal("300.00"))
+        with self.at(start + timedelta(hours=2)):
+            take_snapshots([self.alice.pk])
+        with self.at(start + timedelta(hours=3)):
+            transfer_funds(self.alice, self.bob, Decimal("200.00"))
+
+        url = f"/api/v1/accounts/{self.alice.account_number}/balance/"
+        for hours, balance in (
+            (-1, "0.00"),
+            (0.5, "1000.00"),
+            (1.5, "700.00"),
+            (2.5, "700.00"),
+            (4, "500.00"),
+        ):
+            as_of = (start + timedelta(hours=hours)).isoformat()
+            with self.subTest(as_of):
+                response = self.client.get(url, {"as_of": as_of})
+                self.assertEqual(response.data["balance"], balance)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_export_contains_every_leg(self):
+        outgoing = transfer_funds(self.alice, self.bob, Decimal("12.50"))
+        incoming = transfer_funds(self.bob, self.alice, Decimal("2.50"))
+        url = f"{self.url}export/"
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn(
+            f"statement-{self.alice.account_number}.csv",
+            response["Content-Disposition"],
+        )
+        rows = list(
+            csv.DictReader(StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(
+            [
+                (r["transaction_id"], r["direction"], r["counterparty"], r["amount"])
+                for r in rows
+            ],
+            [
+                (
+                    str(incoming.transaction_id),
+                    "credit",
+                    self.bob.account_number,
+                    "2.50",
+                ),
+                (
+                    str(outgoing.transaction_id),
+                    "debit",
+                    self.bob.account_number,
+                    "12.50",
+                ),
+            ],
+        )
+
+        response = self.client.get(url, {"type": "ndjson"})
+        entries = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            [(e["direction"], e["amount"]) for e in entries],
+            [("credit", "2.50"), ("debit", "12.50")],
+        )
+        self.assertEqual(self.client.get(url, {"type": "xml"}).status_code, 400)
+
+
+@override_settings(FAILED_TRANSFER_BUFFER={"ENABLED": False})
+class VerifyBalancesTests(TestCase):
+    def setUp(self):
+        self.accounts = [make_account(name, "500.00") for name in ("a", "b", "c")]
+        for account in self.accounts:
+            post_deposit(account, account.balance)
+        self.ids = [account.pk for account in self.accounts]
+
+    def transfer_around(self):
+        a, b, c = self.accounts
+        transfer_funds(a, b, Decimal("125.50"))
+        transfer_funds(b, c, Decimal("300.00"))
+        transfer_batch(
+            c.user,
+            [
+                {
+                    "from_account": c.account_number,
+                    "to_account": a.account_number,
+                    "amount": Decimal("42.25"),
+                },
+                {
+                    "from_account": c.account_number,
+                    "to_account": b.account_number,
+                    "amount": Decimal("9999.00"),  # fails, posts nothing
+                },
+            ],
+            all_or_nothing=False,
+        )
+
+    def test_balances_match_ledger_after_transfers(self):
+        self.transfer_around()
+        self.assertEqual(_verify_chunk(self.ids), [])
+
+    def test_balances_match_across_snapshots(self):
+        self.transfer_around()
+        take_snapshots(self.ids)
+        self.transfer_around()
+        self.assertEqual(_verify_chunk(self.ids), [])
+
+    def test_reports_balance_changed_outside_the_ledger(self):
+        self.transfer_around()
+        a = self.accounts[0]
+        BankAccount.objects.filter(pk=a.pk).update(balance=1)
+        self.assertEqual(
+            _verify_chunk(self.ids),
+            [(a.account_number, Decimal("1.00"), Decimal("416.75"))],
+        )
+
+
+class BulkWriterTests(SimpleTestCase):
+    def writer(self, errors=(), **options):
+        """A writer whose bulk_create raises `errors` in turn, then succeeds."""
+        self.batches = []
+        self.written = threading.Event()
+        errors = list(errors)
+
+        def bulk_create(batch):
+            if errors:
+                raise errors.pop(0)
+            self.batches.append(list(batch))
+            self.written.set()
+
+        model = mock.Mock()
+        model._meta.label = "users.Row"
+        model.objects.bulk_create.side_effect = bulk_create
+        writer = BulkWriter(model, **options)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_writes_once_flush_size_rows_are_pending(self):
+        writer = self.writer(flush_size=3, flush_interval=60)
+        for row in range(3):
+            writer.add(row)
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [[0, 1, 2]])
+        self.assertEqual(writer.stats()["flushed"], 3)
+
+    def test_writes_after_flush_interval(self):
+        writer = self.writer(flush_size=100, flush_interval=0.05)
+        writer.add("row")
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [["row"]])
+
+    def test_flush_splits_into_flush_size_batches(self):
+        writer = self.writer(flush_size=2, flush_interval=60)
+        for row in range(5):
+            writer._queue.put_nowait(row)  # queued without waking the thread
+        writer.flush()
+        self.assertEqual(self.batches, [[0, 1], [2, 3], [4]])
+
+    def test_close_writes_pending_rows(self):
+        writer = self.writer(flush_size=100, flush_interval=60)
+        writer.add(1)
+        writer.add(2)
+        writer.close()
+        self.assertEqual(self.batches, [[1, 2]])
+        self.assertFalse(writer._thread.is_alive())
+
+    def test_full_queue_drops_new_rows(self):
+        writer = self.writer(max_pending=2, flush_size=100, flush_interval=60)
+        self.assertEqual([writer.add(row) for row in range(3)], [True, True, False])
+        stats = writer.stats()
+        self.assertEqual((stats["dropped"], stats["high_water"]), (1, 2))
+
+    def test_full_queue_hands_rows_to_overflow(self):
+        overflow = []
+        writer = self.writer(
+            max_pending=1,
+            flush_size=100,
+            flush_interval=60,
+            on_overflow=overflow.append,
+        )
+        self.assertTrue(writer.add(1))
+        self.assertTrue(writer.add(2))
+        self.assertEqual(overflow, [2])
+        self.assertEqual(writer.stats()["overflowed"], 1)
+        writer.close()
+        self.assertEqual(self.batches, [[1]])
+
+    def test_unavailable_database_is_retried_with_backoff(self):
+        locked = OperationalError("database table is locked")
+        writer = self.writer(
+            errors=[locked, locked], flush_size=2, flush_interval=60, retry_delay=0.01
+        )
+        with self.assertLogs("users.buffers", "WARNING"):
+            writer.add(1)
+            writer.add(2)
+            self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [[1, 2]])
+        stats = writer.stats()
+        self.assertEqual((stats["retries"], stats["failed"]), (2, 0))
+
+    def test_held_batch_is_written_before_newer_rows(self):
+        writer = self.writer(errors=[OperationalError("gone away")], flush_interval=60)
+        writer._queue.put_nowait(1)
+        with self.assertLogs("users.buffers", "WARNING"):
+            self.assertFalse(writer.flush())
+        self.assertEqual(writer.stats()["pending"], 1)
+        writer._queue.put_nowait(2)
+        self.assertTrue(writer.flush())
+        self.assertEqual(self.batches, [[1, 2]])
+
+    def test_only_rejected_rows_are_dropped(self):
+        stored = []
+        writer = self.writer(flush_interval=60, on_written=stored.extend)
+        model = writer.model
+
+        def bulk_create(batch):
+            if "bad" in batch:
+                raise IntegrityError("NOT NULL constraint failed")
+            self.batches.append(list(batch))
+
+        model.objects.bulk_create.side_effect = bulk_create
+        for row in (1, "bad", 2):
+            writer._queue.put_nowait(row)
+        with self.assertLogs("users.buffers", "ERROR"):
+            self.assertTrue(writer.flush())
+        self.assertEqual(self.batches, [[1], [2]])
+        self.assertEqual((writer.stats()["flushed"], writer.stats()["failed"]), (2, 1))
+        self.assertEqual(stored, [1, 2])
+
+    def test_close_counts_rows_it_could_not_write(self):
+        writer = self.writer(
+            errors=[OperationalError("gone away")] * 10, flush_interval=60
+        )
+        writer.on_written = mock.Mock()
+        writer.add(1)
+        with self.assertLogs("users.buffers", "ERROR"):
+            writer.close()
+        self.assertEqual(writer.stats()["failed"], 1)
+        writer.on_written.assert_not_called()
+
+
+class AuditSinkTests(TestCase):
+    def test_durable_writes_use_the_sync_sink(self):
+        self.assertIsInstance(audit.get_sink(True), audit.SyncAuditSink)
+        self.assertTrue(audit.is_durable("POST"))
+        self.assertFalse(audit.is_durable("GET"))
+
+    def test_tests_write_non_durable_rows_inline(self):
+        self.assertIsInstance(audit.get_sink(False), audit.SyncAuditSink)
+        audit.record([AuditLog(action="GET /")], durable=False)
+        self.assertTrue(AuditLog.objects.filter(action="GET /").exists())
+
+    def test_async_sink_comes_from_settings(self):
+        buffered = dict(settings.AUDIT_LOG, SINK="users.audit.BufferedAuditSink")
+        writer = mock.Mock()
+        with override_settings(AUDIT_LOG=buffered):
+            with mock.patch("users.audit.get_writer", return_value=writer):
+                sink = audit.get_sink(False)
+            self.assertIsInstance(sink, audit.BufferedAuditSink)
+            entry = AuditLog(action="GET /")
+            audit.record([entry], durable=False)
+            writer.add.assert_called_once_with(entry)
+        # The cached sink is dropped along with the override
+        self.assertIsInstance(audit.get_sink(False), audit.SyncAuditSink)
+
+    @override_settings(AUDIT_LOG=dict(settings.AUDIT_LOG, READ_DURABILITY="sync"))
+    def test_reads_can_be_made_durable(self):
+        self.assertTrue(audit.is_durable("GET"))
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED)
+class AuditContextTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("alice", "100.00")
+        self.recipient = make_account("bob", "0.00")
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender.user)
+
+    def transfer(self, amount, **headers):
+        return self.client.post(
+            "/api/v1/transfer/",
+            {
+                "from_account": self.sender.account_number,
+                "to_account": self.recipient.account_number,
+                "amount": amount,
+            },
+            format="json",
+            headers=headers,
+        )
+
+    def test_request_events_share_one_row(self):
+        response = self.transfer("10.00", **{"X-Request-ID": "req-1"})
+        self.assertEqual(response["X-Request-ID"], "req-1")
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.request_id, entry.user), ("req-1", self.sender.user))
+        self.assertEqual(entry.status_code, 200)
+        self.assertTrue(entry.action.startswith("Transferred 10.00"))
+        self.assertEqual(
+            [event["action"] for event in entry.events],
+            ["POST /api/v1/transfer/", entry.action],
+        )
+
+    def test_each_request_gets_its_own_context(self):
+        first = self.transfer("10.00")
+        second = self.transfer("500.00")  # rejected
+        self.assertEqual(second.status_code, 400)
+        request_ids = [first["X-Request-ID"], second["X-Request-ID"]]
+        self.assertNotEqual(*request_ids)
+        entries = AuditLog.objects.order_by("id")
+        self.assertEqual([e.request_id for e in entries], request_ids)
+        self.assertEqual(entries[1].status_code, 400)
+        self.assertIn(
+            "transfer_rejected", [event["action"] for event in entries[1].events]
+        )
+
+    def test_context_is_reset_after_the_request(self):
+        self.transfer("10.00")
+        self.assertIsNone(audit.current_context())
+        log_action(self.sender.user, "Outside a request")
+        entry = AuditLog.objects.get(action="Outside a request")
+        self.assertEqual((entry.request_id, entry.events), ("", []))
+
+    def test_contexts_are_per_thread(self):
+        request = mock.Mock(method="GET", path="/", headers={})
+        seen = {}
+
+        def serve(name):
+            context, token = audit.open_context(request, "10.0.0.1")
+            seen[name] = audit.current_context() is context
+            audit._current_context.reset(token)
+
+        threads = [threading.Thread(target=serve, args=(n,)) for n in "ab"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(seen, {"a": True, "b": True})
+        self.assertIsNone(audit.current_context())
+
+    def test_buffered_writes_carry_the_request_context(self):
+        writer = mock.Mock()
+        buffered = dict(settings.AUDIT_LOG, SINK="users.audit.BufferedAuditSink")
+        with override_settings(AUDIT_LOG=buffered):
+            with mock.patch("users.audit.get_writer", return_value=writer):
+                response = self.client.get(
+                    "/api/v1/accounts/list/", headers={"X-Request-ID": "req-2"}
+                )
+        self.assertEqual(response.status_code, 200)
+        (entry,), _ = writer.add.call_args
+        self.assertEqual((entry.request_id, entry.user), ("req-2", self.sender.user))
+        self.assertEqual(entry.action, "GET /api/v1/accounts/list/")
+        self.assertFalse(AuditLog.objects.exists())
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED)
+class AuditLogListTests(TestCase):
+    def setUp(self):
+        self.auditor = User.objects.create_user(
+            username="auditor", email="auditor@example.com", role="auditor"
+        )
+        self.alice = User.objects.create_user(
+            username="alice", email="alice@example.com"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.auditor)
+        self.noon = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+
+    def log(self, request_id, when, user=None, action="GET /", ip="10.0.0.1"):
+        entry = AuditLog.objects.create(
+            user=user or self.alice, action=action, ip_address=ip, request_id=request_id
+        )
+        AuditLog.objects.filter(pk=entry.pk).update(timestamp=when)
+        return entry
+
+    def listing(self, **params):
+        response = self.client.get("/api/v1/audit/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [entry["request_id"] for entry in response.data["results"]]
+
+    def test_pages_walk_every_row_once(self):
+        for n in range(5):  # equal timestamps, told apart by id
+            self.log(f"same-{n}", self.noon)
+        self.log("older", self.noon - timedelta(hours=1))
+        self.log("newer", self.noon + timedelta(hours=1))
+
+        seen, params = [], {"user": self.alice.pk, "page_size": 2}
+        url = "/api/v1/audit/"
+        while url:
+            response = self.client.get(url, params)
+            seen += [entry["request_id"] for entry in response.data["results"]]
+            url, params = response.data["next"], None
+        self.assertEqual(
+            seen, ["newer"] + [f"same-{n}" for n in range(4, -1, -1)] + ["older"]
+        )
+
+    def test_filters(self):
+        self.log("transfer", self.noon, action="Transferred 5.00 from 1 to 2")
+        self.log("other-ip", self.noon, ip="10.0.0.2")
+        self.log("auditor", self.noon, user=self.auditor)
+        self.log("yesterday", self.noon - timedelta(days=1))
+        user = {"user": self.alice.pk}
+
+        self.assertEqual(self.listing(action="Transferred", **user), ["transfer"])
+        self.assertEqual(self.listing(ip="10.0.0.2"), ["other-ip"])
+        self.assertEqual(
+            self.listing(until=self.noon.isoformat(), **user), ["yesterday"]
+        )
+        self.assertEqual(
+            sorted(self.listing(since=self.noon.isoformat(), **user)),
+            ["other-ip", "transfer"],
+        )
+
+    def test_bad_filters_are_400(self):
+        for params in ({"user": "alice"}, {"since": "yesterday"}):
+            with self.subTest(params):
+                response = self.client.get("/api/v1/audit/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_naive_cursor_is_400(self):
+        archive = mock.Mock(archived_before=self.noon)
+        naive = encode_cursor(datetime(2026, 3, 2), 10)
+        with mock.patch("users.pagination.get_archive", return_value=archive):
+            response = self.client.get("/api/v1/audit/", {"cursor": naive})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cursor", response.data)
+
+    def test_only_auditors_can_list(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get("/api/v1/audit/").status_code, 403)
+
+
+def archive_row(pk, when, user_id=1, action="GET /", ip="10.0.0.1"):
+    return {
+        "id": pk,
+        "user_id": user_id,
+        "user__username": f"user{user_id}",
+        "action": action,
+        "ip_address": ip,
+        "timestamp": when,
+        "request_id": f"req-{pk}",
+        "status_code": 200,
+        "duration_ms": 1,
+        "events": [],
+    }
+
+
+class AuditArchiveTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.archive = AuditArchive(root, block_size=2)
+        self.day = date(2026, 3, 1)
+        self.noon = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+
+    def ids(self, *args, **filters):
+        return [row["id"] for row in self.archive.iter_rows(*args, **filters)]
+
+    def test_append_and_iter_rows(self):
+        rows = [
+            archive_row(1, self.noon, user_id=1),
+            archive_row(2, self.noon, user_id=2, ip="10.0.0.2"),
+            archive_row(3, self.noon + timedelta(minutes=1), action="POST /x"),
+            archive_row(4, self.noon + timedelta(minutes=2), user_id=2),
+            archive_row(5, self.noon + timedelta(minutes=3)),
+        ]
+        self.assertEqual(self.archive.append(self.day, rows), 5)
+        self.assertEqual(len(self.archive.load_index(self.day)["blocks"]), 3)
+        # Re-running after a crash skips what is already there
+        self.assertEqual(self.archive.append(self.day, rows[3:]), 0)
+        self.archive.append(
+            date(2026, 3, 2), [archive_row(6, self.noon + timedelta(days=1))]
+        )
+
+        self.assertEqual(self.ids(), [6, 5, 4, 3, 2, 1])
+        (row,) = list(self.archive.iter_rows(user=2, ip="10.0.0.2"))
+        self.assertEqual(row["timestamp"], self.noon)
+        self.assertEqual(self.ids(user=2), [4, 2])
+        self.assertEqual(self.ids(action="POST"), [3])
+        self.assertEqual(self.ids(cursor=(self.noon, 2)), [1])
+        self.assertEqual(
+            self.ids(
+                since=self.noon + timedelta(minutes=1),
+                until=self.noon + timedelta(minutes=3),
+            ),
+            [4, 3],
+        )
+
+    def test_truncated_segment(self):
+        self.archive.append(self.day, [archive_row(n, self.noon) for n in (1, 2, 3)])
+        path = self.archive._path(self.day, SEGMENT_SUFFIX)
+        os.truncate(path, os.path.getsize(path) - 1)
+        with self.assertRaisesMessage(ArchiveCorrupted, "truncated"):
+            self.ids()
+        os.truncate(path, 0)
+        with self.assertRaisesMessage(ArchiveCorrupted, "empty"):
+            self.ids()
+
+    def test_corrupt_segment(self):
+        self.archive.append(self.day, [archive_row(n, self.noon) for n in (1, 2, 3)])
+        with open(self.archive._path(self.day, SEGMENT_SUFFIX), "r+b") as segment:
+            segment.write(b"\0" * 8)
+        # The newest block is intact and comes out before the bad one
+        rows = self.archive.iter_rows()
+        self.assertEqual(next(rows)["id"], 3)
+        with self.assertRaisesMessage(ArchiveCorrupted, "does not decompress"):
+            next(rows)
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED)
+class AuditArchivePaginationTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        archive_dir = override_settings(
+            AUDIT_ARCHIVE_DIR=root, AUDIT_ARCHIVE_BLOCK_SIZE=2
+        )
+        archive_dir.enable()
+        self.addCleanup(archive_dir.disable)
+        auditor = User.objects.create_user(
+            username="auditor", email="auditor@example.com", role="auditor"
+        )
+        self.alice = User.objects.create_user(
+            username="alice", email="alice@example.com"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(auditor)
+
+    def test_pages_continue_into_the_archive(self):
+        now = timezone.now()
+        for n, age in enumerate([0, 0, 0, 10, 10, 10, 11]):
+            entry = AuditLog.objects.create(user=self.alice, request_id=f"r{n}")
+            AuditLog.objects.filter(pk=entry.pk).update(
+                timestamp=now - timedelta(days=age, minutes=n)
+            )
+        call_command("archive_audit_logs", "--retention-days", "1", stdout=StringIO())
+        self.assertEqual(AuditLog.objects.filter(user=self.alice).count(), 3)
+
+        seen, params = [], {"user": self.alice.pk, "page_size": 2}
+        url = "/api/v1/audit/"
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.data)
+            seen += [entry["request_id"] for entry in response.data["results"]]
+            url, params = response.data["next"], None
+        self.assertEqual(seen, [f"r{n}" for n in range(7)])
+
+        response = self.client.get(
+            "/api/v1/audit/", {"user": self.alice.pk, "action": "GET"}
+        )
+        self.assertEqual(response.data["results"], [])
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED)
+class AuditRollupTests(TestCase):
+    def setUp(self):
+        self.auditor = User.objects.create_user(
+            username="auditor", email="auditor@example.com", role="auditor"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.auditor)
+
+    def counts(self, **filters):
+        return {
+            (rollup.action_class, rollup.count, rollup.errors)
+            for rollup in AuditRollup.objects.filter(**filters)
+        }
+
+    def entries(self):
+        return [
+            AuditLog(user=self.auditor, action="Transferred 5.00 from 1 to 2"),
+            AuditLog(action="GET /", status_code=200),
+            AuditLog(action="GET /missing", status_code=404),
+        ]
+
+    def test_sync_rows_are_counted_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record(self.entries())
+            self.assertFalse(AuditRollup.objects.exists())
+        self.assertEqual(self.counts(), {("transfer", 1, 0), ("request", 2, 1)})
+
+    def test_rolled_back_rows_are_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ZeroDivisionError), transaction.atomic():
+                audit.record(self.entries())
+                1 / 0
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertFalse(AuditRollup.objects.exists())
+
+    def test_buffered_rows_are_counted_once_written(self):
+        writer = mock.Mock()
+        with mock.patch("users.audit.get_writer", return_value=writer) as get_writer:
+            sink = audit.BufferedAuditSink()
+        sink.write(self.entries())
+        self.assertFalse(AuditRollup.objects.exists())
+
+        on_written = get_writer.call_args.kwargs["on_written"]
+        written = [entry for (entry,), _ in writer.add.call_args_list]
+        AuditLog.objects.bulk_create(written)
+        on_written(written)
+        sink._write_inline(AuditLog(action="GET /"))
+        self.assertEqual(self.counts(), {("transfer", 1, 0), ("request", 3, 1)})
+
+    def test_counts_for_settled_hours_are_discarded(self):
+        accumulator = RollupAccumulator(flush_interval=None, settle_seconds=300)
+        with self.assertLogs("users.audit_rollups", "WARNING"):
+            accumulator.add(
+                [
+                    AuditLog(
+                        action="GET /", timestamp=timezone.now() - timedelta(hours=2)
+                    )
+                ]
+            )
+        self.assertFalse(AuditRollup.objects.exists())
+        accumulator.add([AuditLog(action="GET /", timestamp=timezone.now())])
+        self.assertEqual(self.counts(), {("request", 1, 0)})
+
+    def test_rebuild_matches_counts_and_skips_unsettled_hours(self):
+        now = timezone.now()
+        earlier = now - timedelta(hours=3)
+        with mock.patch("django.utils.timezone.now", return_value=earlier):
+            with self.captureOnCommitCallbacks(execute=True):
+                audit.record(self.entries())
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record([AuditLog(action="GET /")])
+        counted = self.counts()
+        AuditRollup.objects.update(count=99)
+
+        rebuilt = rebuild_rollups(
+            hour_of(earlier) - timedelta(hours=1), hour_of(now) + timedelta(hours=1)
+        )
+        self.assertEqual(rebuilt, 2)
+        self.assertEqual(
+            self.counts(hour=hour_of(earlier)), counted - {("request", 1, 0)}
+        )
+        # The open hour is still being counted by the workers
+        self.assertEqual(self.counts(hour=hour_of(now)), {("request", 99, 0)})
+
+    def test_stats(self):
+        hour = datetime(2026, 3, 1, 10, tzinfo=dt_timezone.utc)
+        for offset, name, user_id, ip, count, errors in [
+            (0, "transfer", self.auditor.pk, "10.0.0.1", 3, 0),
+            (0, "request", 0, "", 5, 2),
+            (1, "transfer", self.auditor.pk, "10.0.0.2", 4, 1),
+        ]:
+            AuditRollup.objects.create(
+                hour=hour + timedelta(hours=offset),
+                action_class=name,
+                user_id=user_id,
+                ip_address=ip,
+                count=count,
+                errors=errors,
+            )
+        window = {
+            "since": (hour + timedelta(minutes=30)).isoformat(),
+            "until": (hour + timedelta(hours=2)).isoformat(),
+        }
+
+        response = self.client.get("/api/v1/audit/stats/", window)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"action_class": "transfer", "count": 7, "errors": 1},
+                {"action_class": "request", "count": 5, "errors": 2},
+            ],
+        )
+
+        response = self.client.get(
+            "/api/v1/audit/stats/",
+            dict(window, group_by="hour,user", action_class="transfer"),
+        )
+        self.assertEqual(
+            [
+                (row["hour"], row["username"], row["count"])
+                for row in response.data["results"]
+            ],
+            [(hour, "auditor", 3), (hour + timedelta(hours=1), "auditor", 4)],
+        )
+
+        response = self.client.get("/api/v1/audit/stats/", dict(window, ip="10.0.0.2"))
+        self.assertEqual([row["count"] for row in response.data["results"]], [4])
+
+    def test_stats_rejects_bad_queries(self):
+        for params in (
+            {"group_by": "country"},
+            {"action_class": "nope"},
+            {"since": "2026-03-02T00:00Z", "until": "2026-03-01T00:00Z"},
+        ):
+            with self.subTest(params):
+                response = self.client.get("/api/v1/audit/stats/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_stats_are_for_auditors(self):
+        self.client.force_authenticate(make_account("alice", "0").user)
+        self.assertEqual(self.client.get("/api/v1/audit/stats/").status_code, 403)
+
+
+class KYCDecisionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="pw", role="admin"
+        )
+        self.customer = User.objects.create_user(
+            username="alice", email="alice@example.com", password="pw"
+        )
+        self.kyc = KYC.objects.create(
+            user=self.customer, document_type="pan", file="kyc/alice.png"
+        )
+
+    def test_decided_record_needs_redecide(self):
+        decide(self.admin, self.kyc.pk, "verified")
+        with self.assertRaises(KYCReviewError) as caught:
+            decide(self.admin, self.kyc.pk, "rejected")
+        self.assertEqual(caught.exception.code, "already_decided")
+
+    def test_redecide_revokes_verification(self):
+        decide(self.admin, self.kyc.pk, "verified")
+        self.customer.refresh_from_db()
+        version = self.customer.auth_version
+        self.assertTrue(self.customer.kyc_verified)
+
+        decide(self.admin, self.kyc.pk, "rejected", "Forged", redecide=True)
+        self.kyc.refresh_from_db()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.kyc.status, "rejected")
+        self.assertFalse(self.customer.kyc_verified)
+        self.assertGreater(self.customer.auth_version, version)
+
+    def test_bulk_redecide(self):
+        decide(self.admin, self.kyc.pk, "verified")
+        results = decide_bulk(
+            self.admin,
+            [
+                {"kyc_id": self.kyc.pk, "status": "rejected"},
+                {"kyc_id": self.kyc.pk, "status": "rejected", "redecide": True},
+            ],
+        )
+        self.assertEqual(results[0]["error"], "already_decided")
+        self.assertEqual(results[1]["status"], "rejected")
+        self.customer.refresh_from_db()
+        self.assertFalse(self.customer.kyc_verified)
+
+
+def pending_kycs(count, prefix="customer"):
+    users = [
+        User.objects.create_user(
+            username=f"{prefix}{n}", email=f"{prefix}{n}@example.com"
+        )
+        for n in range(count)
+    ]
+    return [
+        KYC.objects.create(
+            user=user, document_type="pan", file=f"kyc/{user.username}.png"
+        )
+        for user in users
+    ]
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED)
+class KYCClaimTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", role="admin"
+        )
+        self.other = User.objects.create_user(
+            username="other", email="other@example.com", role="admin"
+        )
+        self.kycs = pending_kycs(3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_claims_are_disjoint(self):
+        first = claim_next(self.admin, 2)
+        second = claim_next(self.other, 2)
+        self.assertEqual([kyc.pk for kyc in first], [k.pk for k in self.kycs[:2]])
+        self.assertEqual([kyc.pk for kyc in second], [self.kycs[2].pk])
+        self.assertEqual(claim_next(self.admin, 1), [])
+
+    def test_expired_lease_goes_back_to_the_queue(self):
+        claim_next(self.admin, 3)
+        later = timezone.now() + lease_duration() + timedelta(seconds=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            reclaimed = claim_next(self.other, 3)
+            self.assertEqual(len(reclaimed), 3)
+            # The lapsed reviewer can no longer decide over the new lease
+            with self.assertRaises(KYCReviewError) as caught:
+                decide(self.admin, self.kycs[0].pk, "verified")
+        self.assertEqual(caught.exception.code, "claimed")
+
+    def test_release_only_hands_back_own_claims(self):
+        claim_next(self.admin, 1)
+        claim_next(self.other, 1)
+        ids = [kyc.pk for kyc in self.kycs]
+        self.assertEqual(release(self.admin, ids), 1)
+        self.assertEqual(
+            [kyc.pk for kyc in claim_next(self.other, 3)],
+            [self.kycs[0].pk, self.kycs[2].pk],
+        )
+
+    def test_claim_and_release_endpoints(self):
+        response = self.client.post("/api/v1/kyc/claim/", {"count": 2}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["claimed"], 2)
+        response = self.client.post(
+            "/api/v1/kyc/release/",
+            {"kyc_ids": [self.kycs[0].pk, self.kycs[1].pk]},
+            format="json",
+        )
+        self.assertEqual(response.data, {"released": 2})
+
+    def test_bulk_verify_reports_each_decision(self):
+        claim_next(self.other, 1)  # self.kycs[0]
+        decisions = [
+            {"kyc_id": self.kycs[0].pk, "status": "verified"},
+            {"kyc_id": self.kycs[1].pk, "status": "verified"},
+            {"kyc_id": self.kycs[1].pk, "status": "rejected"},
+            {"kyc_id": self.kycs[2].pk, "status": "rejected", "notes": "Blurry"},
+            {"kyc_id": 0, "status": "verified"},
+        ]
+        response = self.client.post(
+            "/api/v1/kyc/verify/bulk/", {"decisions": decisions}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [(r["status"], r.get("error")) for r in response.data["results"]],
+            [
+                ("failed", "claimed"),
+                ("verified", None),
+                ("failed", "duplicate"),
+                ("rejected", None),
+                ("failed", "not_found"),
+            ],
+        )
+        self.assertEqual(
+            (
+                response.data["verified"],
+                response.data["rejected"],
+                response.data["failed"],
+            ),
+            (1, 1, 3),
+        )
+        self.assertEqual(
+            sorted(KYC.objects.values_list("status", flat=True)),
+            ["pending", "rejected", "verified"],
+        )
+        self.assertEqual(
+            sorted(
+                AuditLog.objects.filter(user=self.admin).values_list(
+                    "action", flat=True
+                )
+            ),
+            [
+                "Bulk KYC review: 1 verified, 1 rejected, 3 failed",
+                "KYC rejected for user customer2",
+                "KYC verified for user customer1",
+            ],
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class ConcurrentKYCClaimTests(TransactionTestCase):
+    def test_concurrent_claims_are_disjoint(self):
+        kycs = pending_kycs(20)
+        reviewers = [
+            User.objects.create_user(
+                username=f"admin{n}", email=f"admin{n}@example.com", role="admin"
+            )
+            for n in range(4)
+        ]
+        start = threading.Barrier(len(reviewers))
+        claims = {}
+
+        def claim(reviewer):
+            start.wait()
+            try:
+                claims[reviewer.pk] = [kyc.pk for kyc in claim_next(reviewer, 5)]
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(r,)) for r in reviewers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        claimed = sorted(itertools.chain(*claims.values()))
+        self.assertEqual(claimed, sorted(kyc.pk for kyc in kycs))
+
+
+class DocumentRefTests(MediaRootMixin, TestCase):
+    def store(self, color="red"):
+        return store_document(png_upload(color=color))
+
+    def refcount(self, digest):
+        blob = DocumentBlob.objects.filter(digest=digest).first()
+        return blob and blob.refcount
+
+    def release(self, digest):
+        with self.captureOnCommitCallbacks(execute=True):
+            release_document(digest)
+
+    def test_same_content_is_stored_once(self):
+        first = self.store()
+        self.assertEqual(self.store(), first)
+        self.assertEqual(self.refcount(first[1]), 2)
+        self.assertNotEqual(self.store(color="blue"), first)
+
+    def test_file_goes_with_the_last_reference(self):
+        name, digest = self.store()
+        self.store()
+        self.release(digest)
+        self.assertEqual(self.refcount(digest), 1)
+        self.assertTrue(default_storage.exists(name))
+        self.release(digest)
+        self.assertIsNone(self.refcount(digest))
+        self.assertFalse(default_storage.exists(name))
+        self.release(digest)  # nothing left to release
+
+    def test_store_after_release_writes_the_file_again(self):
+        name, digest = self.store()
+        self.release(digest)
+        self.assertEqual(self.store(), (name, digest))
+        self.assertEqual(self.refcount(digest), 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_store_before_the_deletion_runs_keeps_the_file(self):
+        name, digest = self.store()
+        with self.captureOnCommitCallbacks() as callbacks:
+            release_document(digest)
+        # The content is uploaded again between the commit and the cleanup
+        self.store()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.refcount(digest), 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_rebuild_removes_files_of_rolled_back_uploads(self):
+        kept, digest = self.store()
+        KYC.objects.create(
+            user=make_account("alice", "0").user,
+            document_type="pan",
+            file=kept,
+            digest=digest,
+        )
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            orphan, _ = self.store(color="blue")
+            1 / 0
+        self.assertTrue(default_storage.exists(orphan))
+        call_command("rebuild_document_refs", stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(kept))
+
+
+class DocumentPipelineTests(MediaRootMixin, TestCase):
+    def test_image_gets_renditions(self):
+        _, digest = store_document(png_upload())
+        self.assertEqual(process_blob(digest), "ready")
+        blob = DocumentBlob.objects.get(digest=digest)
+        self.assertEqual(blob.content_type, "image/png")
+        self.assertTrue(blob.has_renditions)
+        self.assertTrue(default_storage.exists(rendition_name(digest, "thumbnail")))
+
+    def test_unrecognised_content_is_invalid(self):
+        upload = SimpleUploadedFile("id.png", b"not a document")
+        _, digest = store_document(upload)
+        self.assertEqual(process_blob(digest), "invalid")
+
+    def test_decoder_failure_marks_only_that_blob_invalid(self):
+        _, broken = store_document(png_upload(color="red"))
+        _, fine = store_document(png_upload(color="blue"))
+
+        def fail_after_preview(source, digest):
+            default_storage.save(rendition_name(digest, "preview"), source)
+            raise ValueError("bad chunk")
+
+        with mock.patch("users.document_pipeline.render", fail_after_preview):
+            with self.assertLogs("users.document_pipeline", "ERROR"):
+                self.assertEqual(process_blob(broken), "invalid")
+        self.assertEqual(process_blob(fine), "ready")
+        self.assertEqual(DocumentBlob.objects.get(digest=broken).status, "invalid")
+        self.assertFalse(default_storage.exists(rendition_name(broken, "preview")))
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED, KYC_DOCUMENT_DELIVERY="django")
+class KYCDocumentViewTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(
+            username="alice", email="alice@example.com", password="pw"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_owner_gets_document(self):
+        name, digest = store_document(png_upload())
+        kyc = KYC.objects.create(
+            user=self.customer, document_type="pan", file=name, digest=digest
+        )
+        response = self.client.get(f"/api/v1/kyc/{kyc.pk}/document/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{digest}"')
+        # Typed before process_kyc_documents has run
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertIn(f'filename="kyc-{kyc.pk}.png"', response["Content-Disposition"])
+
+    def test_missing_file_is_404(self):
+        kyc = KYC.objects.create(
+            user=self.customer, document_type="pan", file="kyc/gone.png"
+        )
+        response = self.client.get(f"/api/v1/kyc/{kyc.pk}/document/")
+        self.assertEqual(response.status_code, 404)
+
+
+class HashingPoolTests(TestCase):
+    def setUp(self):
+        self.pool = HashingPool(workers=1, max_queue=0, timeout=0.01)
+        self.addCleanup(self.pool.shutdown)
+        self.futures = []
+        self.running = True
+
+        def submit(fn, *args):
+            future = Future()
+            if self.running:
+                future.set_running_or_notify_cancel()  # can't be cancelled
+            self.futures.append(future)
+            return future
+
+        self.pool._executor = mock.Mock(submit=submit)
+
+    def test_timed_out_hash_keeps_its_slot_until_done(self):
+        with self.assertRaises(HashingPoolSaturated):
+            self.pool.hashpw(b"pw", b"salt")
+        # The first hash is still running, so there is no slot for another
+        with self.assertRaises(HashingPoolSaturated):
+            self.pool.hashpw(b"pw", b"salt")
+        self.assertEqual(len(self.futures), 1)
+        self.assertEqual(self.pool.rejected, 1)
+
+        self.futures[0].set_result(b"hash")
+        with self.assertRaises(HashingPoolSaturated):
+            self.pool.hashpw(b"pw", b"salt")  # admitted, then timed out
+        self.assertEqual(len(self.futures), 2)
+
+    def test_cancelled_hash_frees_its_slot(self):
+        self.running = False  # still queued when the caller gives up
+        with self.assertRaises(HashingPoolSaturated):
+            self.pool.hashpw(b"pw", b"salt")
+        self.assertTrue(self.futures[0].cancelled())
+        self.futures.clear()
+        with self.assertRaises(HashingPoolSaturated):
+            self.pool.hashpw(b"pw", b"salt")
+        self.assertEqual(len(self.futures), 1)
+
+    @override_settings(
+        REST_FRAMEWORK=UNTHROTTLED,
+        PASSWORD_HASHERS=["users.hashers.PooledBCryptSHA256PasswordHasher"],
+    )
+    def test_api_answers_saturation_with_503(self):
+        saturated = mock.Mock(hashpw=mock.Mock(side_effect=HashingPoolSaturated))
+        with mock.patch("users.hashers.get_pool", return_value=saturated):
+            response = APIClient().post(
+                "/api/v1/auth/token/", {"username": "nobody", "password": "pw"}
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="alice", email="alice@example.com", password="pw"
+        )
+        self.auth = CachedJWTAuthentication()
+        self.token = self.issue()
+        # Ids are reused between tests; start from an empty version cache
+        cache = mock.patch("users.authentication._cache", UserVersionCache(100, 30))
+        cache.start()
+        self.addCleanup(cache.stop)
+
+    def issue(self):
+        access = ClaimsRefreshToken.for_user(self.user).access_token
+        return self.auth.get_validated_token(str(access))
+
+    def reload(self):
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_current_token_is_trusted_without_loading_the_user(self):
+        self.auth.get_user(self.token)  # caches the version
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(self.token)
+        self.assertEqual((user.pk, user.kyc_verified), (self.user.pk, False))
+
+    def test_bumped_version_stops_trusting_claims(self):
+        self.auth.get_user(self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_auth_version([self.user.pk], kyc_verified=True)
+        self.assertTrue(self.auth.get_user(self.token).kyc_verified)
+
+    def test_saving_auth_fields_bumps_version(self):
+        for field, value in (("role", "auditor"), ("kyc_verified", True)):
+            self.reload()
+            version = self.user.auth_version
+            setattr(self.user, field, value)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+            self.assertEqual(self.user.auth_version, version + 1)
+            self.assertEqual(getattr(self.auth.get_user(self.token), field), value)
+
+    def test_password_change_bumps_version(self):
+        self.reload()
+        self.user.set_password("new password")
+        self.user.save(update_fields=["password"])
+        self.reload()
+        self.assertEqual(
+            (self.user.auth_version, self.user.credentials_version), (1, 1)
+        )
+
+    def test_other_changes_keep_version(self):
+        self.reload()
+        self.user.full_name = "Alice"
+        self.user.save()
+        self.user.role = "auditor"
+        self.user.save()
+        self.reload()
+        self.assertEqual(
+            (self.user.auth_version, self.user.credentials_version), (1, 0)
+        )
+
+    def test_password_change_revokes_tokens_on_commit(self):
+        self.auth.get_user(self.token)
+        self.reload()
+        self.user.set_password("new password")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            # Until the change commits, the cached version still applies
+            self.auth.get_user(self.token)
+        with self.assertRaises(AuthenticationFailed) as caught:
+            self.auth.get_user(self.token)
+        self.assertEqual(caught.exception.get_codes(), "token_revoked")
+        self.assertEqual(self.auth.get_user(self.issue()).pk, self.user.pk)
+
+    @override_settings(REST_FRAMEWORK=UNTHROTTLED)
+    def test_password_reset_revokes_refresh_tokens(self):
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_auth_version([self.user.pk], password="!")
+        with self.assertRaises(TokenError):
+            refresh.access_token
+        response = APIClient().post(
+            "/api/v1/auth/token/refresh/", {"refresh": str(refresh)}, format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_other_workers_see_changes_after_the_ttl(self):
+        self.auth.get_user(self.token)
+        # Committed by another process: this one's cache entry is not dropped
+        with self.captureOnCommitCallbacks():
+            bump_auth_version([self.user.pk], password="!")
+        self.auth.get_user(self.token)
+        ttl = authentication.get_user_cache().ttl
+        later = time.monotonic() + ttl
+        with mock.patch("users.authentication.time.monotonic", return_value=later):
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.get_user(self.token)
+
+    def test_deactivated_user_is_refused(self):
+        self.auth.get_user(self.token)
+        self.reload()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED)
+class UserEmailTests(MediaRootMixin, TestCase):
+    def register(self, username, email=""):
+        return APIClient().post(
+            "/api/v1/auth/register/",
+            {
+                "username": username,
+                "email": email,
+                "password": "correct horse battery",
+                "full_name": username.title(),
+                "document_type": "pan",
+                "file": png_upload(),
+            },
+        )
+
+    def test_users_without_email_store_null(self):
+        first = User.objects.create_user(username="alice")
+        second = User.objects.create_user(username="bob", email="")
+        admin = User.objects.create_superuser(username="root", password="pw")
+        self.assertEqual((first.email, second.email, admin.email), (None, None, None))
+
+    def test_registration_without_email(self):
+        self.assertEqual(self.register("alice").status_code, 201)
+        self.assertEqual(self.register("bob").status_code, 201)
+
+    def test_registration_with_taken_email(self):
+        self.assertEqual(self.register("alice", "a@example.com").status_code, 201)
+        response = self.register("bob", "a@example.com")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"email": ["Email already registered."]})
+        self.assertFalse(User.objects.filter(username="bob").exists())
+
+    def test_migration_refuses_addresses_differing_only_in_case(self):
+        migration = importlib.import_module("users.migrations.0017_unique_user_email")
+        first = User.objects.create_user(username="alice", email="a@example.com")
+        second = User.objects.create_user(username="bob", email="A@example.com")
+        User.objects.create_user(username="carol", email="c@example.com")
+        with self.assertRaisesMessage(
+            RuntimeError, f"a@example.com: user ids {first.pk}, {second.pk}"
+        ):
+            migration.dedupe_emails(django_apps, None)
+        self.assertEqual(User.objects.get(username="bob").email, "A@example.com")
+
+    def test_migration_turns_blank_emails_into_null_and_back(self):
+        migration = importlib.import_module("users.migrations.0017_unique_user_email")
+        user = User.objects.create_user(username="alice", email="a@example.com")
+        User.objects.filter(pk=user.pk).update(email="")
+        migration.dedupe_emails(django_apps, None)
+        user.refresh_from_db()
+        self.assertIsNone(user.email)
+        migration.restore_blank_emails(django_apps, None)
+        user.refresh_from_db()
+        self.assertEqual(user.email, "")
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        store = mock.patch(
+            "users.throttling._store", BucketStore(f"{tmp}/ratelimit.sqlite3")
+        )
+        store.start()
+        self.addCleanup(store.stop)
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post(
+            "/api/v1/auth/token/", {"username": "nobody", "password": "pw"}
+        )
+
+    def rates(self, **rates):
+        return override_settings(
+            REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates)
+        )
+
+    def test_scope_applies_on_top_of_anon_rate(self):
+        with self.rates(anon="2/hour", strict="10/hour"):
+            self.assertEqual(self.login().status_code, 401)
+            self.assertEqual(self.login().status_code, 401)
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["RateLimit-Limit"], "2")
+        self.assertEqual(response["Retry-After"], "1800")
+
+    def test_denied_request_takes_no_token(self):
+        with self.rates(anon="2/hour", strict="1/hour"):
+            self.assertEqual(self.login().status_code, 401)
+            self.assertEqual(self.login().status_code, 429)
+            # The anon bucket still has the token the denied login didn't use
+            self.assertNotEqual(
+                self.client.get("/api/v1/auth/register/").status_code, 429
+            )
+            response = self.client.get("/api/v1/auth/register/")
+        self.assertEqual(response.status_code, 429)
+
+    def test_headers_describe_the_tighter_bucket(self):
+        with self.rates(anon="10/hour", strict="3/hour"):
+            response = self.login()
+        self.assertEqual(response["RateLimit-Limit"], "3")
+        self.assertEqual(response["RateLimit-Remaining"], "2")
+        self.assertEqual(response["RateLimit-Policy"], "3;w=3600")
+
+    def test_standalone_scope_replaces_the_user_rate(self):
+        account = make_account("alice", "0")
+        self.client.force_authenticate(account.user)
+
+        def list_accounts(times):
+            return [
+                self.client.get("/api/v1/accounts/list/").status_code
+                for _ in range(times)
+            ]
+
+        standalone = dict(settings.RATE_LIMIT, STANDALONE_SCOPES=["list"])
+        with self.rates(user="2/day", list="3/minute"), override_settings(
+            RATE_LIMIT=standalone
+        ):
+            self.assertEqual(list_accounts(4), [200, 200, 200, 429])
+            # The user bucket was left alone
+            balance = f"/api/v1/accounts/{account.account_number}/balance/"
+            self.assertNotEqual(self.client.get(balance).status_code, 429)
+            stacked = dict(settings.RATE_LIMIT, STANDALONE_SCOPES=[])
+            with override_settings(RATE_LIMIT=stacked):
+                self.client.force_authenticate(make_account("bob", "0").user)
+                self.assertEqual(list_accounts(3), [200, 200, 429])
+
+
+class AccountNumberTests(TestCase):
+    def test_check_digit(self):
+        # The classic Luhn example: 7992739871 -> 3
+        self.assertEqual(luhn_check_digit("7992739871"), "3")
+        self.assertEqual(format_account_number(1), "000000000018")
+
+    def test_allocated_numbers_are_valid(self):
+        for serial in (0, 1, 42, 10**10 - 1):
+            self.assertTrue(is_valid_account_number(format_account_number(serial)))
+
+    def test_typos_are_rejected(self):
+        number = format_account_number(123456)
+        wrong_digit = number[:5] + str((int(number[5]) + 1) % 10) + number[6:]
+        swapped = number[:6] + number[7] + number[6] + number[8:]
+        self.assertNotEqual(swapped, number)
+        self.assertFalse(is_valid_account_number(wrong_digit))
+        self.assertFalse(is_valid_account_number(swapped))
+
+    def test_format_is_checked(self):
+        number = format_account_number(7)
+        for bad in (number[:-1], number + "0", number[:-1] + "x", ""):
+            self.assertFalse(is_valid_account_number(bad))
+
+    def test_legacy_numbers_only_need_the_format(self):
+        self.assertTrue(is_valid_account_number("123456789012"))
+
+
+class AccountNumberAllocatorTests(TransactionTestCase):
+    # The allocator reserves serials on a connection of its own, which must
+    # not wait on a test transaction
+    def setUp(self):
+        NumberSequence.objects.get_or_create(name=SEQUENCE)
+
+    def test_allocators_hand_out_disjoint_valid_numbers(self):
+        first, second = AccountNumberAllocator(3), AccountNumberAllocator(3)
+        numbers = first.allocate(2) + second.allocate(4) + first.allocate(2)
+        self.assertEqual(len(set(numbers)), 8)
+        self.assertTrue(all(is_valid_account_number(n) for n in numbers))
+        self.assertEqual(NumberSequence.objects.get(name=SEQUENCE).next_value, 11)
+
+
+class ImportFileMixin:
+    """An NDJSON input file and a one-partition import of it."""
+
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "customers.ndjson")
+        self.checkpoint = self.path + ".checkpoint.0"
+        self.rejects = self.path + ".rejects.0"
+
+    def write(self, *rows):
+        with open(self.path, "w") as f:
+            for row in rows:
+                f.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+
+    def customer(self, username, **fields):
+        return {"username": username, "email": f"{username}@example.com", **fields}
+
+    def run_import(self, state=None, resumed=False):
+        task = {
+            "path": self.path,
+            "header": None,
+            "end": os.path.getsize(self.path),
+            "aligned": True,
+            "resumed": resumed,
+            "chunk_size": 2,
+            "checkpoint": self.checkpoint,
+            "rejects": self.rejects,
+            "state": state or {"offset": 0, "imported": 0, "skipped": 0, "rejected": 0},
+        }
+        return _import_partition(task)
+
+    def rejected(self):
+        with open(self.rejects) as f:
+            return [json.loads(line)["error"] for line in f]
+
+
+class ImportCustomersTests(ImportFileMixin, MediaRootMixin, TestCase):
+    def test_bad_rows_are_rejected_without_stopping_the_run(self):
+        self.write(
+            self.customer("alice"),
+            "[1, 2]",
+            '"bob"',
+            "{not json",
+            self.customer("carol", kyc_status="approved"),
+            self.customer(
+                "dave",
+                account_type="savings",
+                balance="12.50",
+                account_number="123456789012",
+            ),
+        )
+        state = self.run_import()
+        self.assertEqual((state["imported"], state["rejected"]), (2, 4))
+        self.assertTrue(state["done"])
+        errors = self.rejected()
+        self.assertEqual(errors[:2], ["row is not a JSON object"] * 2)
+        self.assertIn("unknown kyc_status", errors[3])
+        account = BankAccount.objects.get(user__username="dave")
+        self.assertEqual(account.balance, Decimal("12.50"))
+        self.assertEqual(_verify_chunk([account.pk]), [])
+
+    def test_documents_go_through_the_blob_store(self):
+        legacy = os.path.join(settings.MEDIA_ROOT, "legacy", "alice.png")
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, "wb") as f:
+            f.write(png_upload().read())
+        self.write(
+            self.customer("alice", document="legacy/alice.png", document_type="pan"),
+            self.customer("bob"),
+            self.customer("carol", document="legacy/gone.png", document_type="pan"),
+        )
+        state = self.run_import()
+        self.assertEqual((state["imported"], state["rejected"]), (2, 1))
+        self.assertIn("not in storage", self.rejected()[0])
+
+        kyc = KYC.objects.get(user__username="alice")
+        blob = DocumentBlob.objects.get(digest=kyc.digest)
+        self.assertEqual((blob.refcount, blob.status), (1, "pending"))
+        self.assertTrue(kyc.file.storage.exists(kyc.file.name))
+        self.assertFalse(KYC.objects.filter(user__username="bob").exists())
+
+    def test_resume_counts_rows_committed_before_the_checkpoint(self):
+        User.objects.create_user(username="erin", email="other@example.com")
+        self.write(*(self.customer(name) for name in ("a", "b", "c", "d", "erin")))
+        write_json = json.dump
+
+        def crash_on_second_checkpoint(path, data):
+            crash_on_second_checkpoint.calls += 1
+            if crash_on_second_checkpoint.calls == 2:
+                raise KeyboardInterrupt
+            with open(path, "w") as f:
+                write_json(data, f)
+
+        crash_on_second_checkpoint.calls = 0
+        with mock.patch(
+            "users.management.commands.import_customers._write_json",
+            crash_on_second_checkpoint,
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_import()
+        # The second chunk was committed, its checkpoint never written
+        self.assertEqual(User.objects.filter(username__in="abcd").count(), 4)
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        self.assertEqual(state["imported"], 2)
+
+        state = self.run_import(state, resumed=True)
+        self.assertEqual((state["imported"], state["skipped"]), (4, 1))
+        self.assertEqual(User.objects.filter(username__in="abcd").count(), 4)
+
+
+class ImportAccountNumberTests(ImportFileMixin, TransactionTestCase):
+    # Blank account numbers are allocated, which needs a committed sequence
+    def test_numbers_in_the_allocator_range_are_rejected(self):
+        sequence, _ = NumberSequence.objects.get_or_create(name=SEQUENCE)
+        upcoming = format_account_number(sequence.next_value)
+        self.write(
+            self.customer("alice", account_type="savings", account_number=upcoming),
+            self.customer("bob", account_type="savings"),
+        )
+        # A fresh allocator, not one holding a block from an earlier test
+        with mock.patch(
+            "users.customer_import.get_allocator",
+            return_value=AccountNumberAllocator(10),
+        ):
+            state = self.run_import()
+        self.assertEqual((state["imported"], state["rejected"]), (1, 1))
+        self.assertIn("allocator's range", self.rejected()[0])
+        # Had alice's row been kept, this account could not have been opened
+        bob = BankAccount.objects.get(user__username="bob")
+        self.assertEqual(bob.account_number, upcoming)
+
+        for number in AccountNumberAllocator(10).allocate(3):
+            BankAccount.objects.create(
+                user=bob.user, account_number=number, account_type="savings"
+            )
+        self.assertEqual(BankAccount.objects.count(), 4)
@@ -0,0 +1,184 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Unit of a "<count>/<period>" rate -> seconds, as DRF parses them
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# Stale buckets are deleted every this many checks per process
+PRUNE_EVERY = 1000
+
+
+def parse_rate(rate):
+    """(capacity, tokens per second) of a "<count>/<period>" rate."""
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+class BucketStore:
+    """
+    Token buckets in a SQLite database in WAL mode, shared by every worker
+    process on the host. A bucket is one row (tokens left, when they were
+    counted, when it will be full again), so a check is a single-row read
+    and write under SQLite's write lock, however long the window.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._checks = 0
+
+    def _connection(self):
+        # One connection per thread, reopened in forked workers
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+                " updated REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def consume(self, buckets):
+        """
+        Take a token from each of `buckets`, given as (key, capacity, refill
+        rate) tuples, if every one of them has a token left; otherwise take
+        none. Returns (allowed, states) with a (remaining, seconds until
+        the bucket is full, seconds until its next token) state per bucket.
+        """
+        connection = self._connection()
+        now = time.time()
+        states = []
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key, capacity, refill_rate in buckets:
+                row = connection.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    levels.append(float(capacity))
+                else:
+                    levels.append(min(capacity, row[0] + (now - row[1]) * refill_rate))
+            allowed = all(tokens >= 1 for tokens in levels)
+            for (key, capacity, refill_rate), tokens in zip(buckets, levels):
+                if allowed:
+                    tokens -= 1
+                full_in = (capacity - tokens) / refill_rate
+                connection.execute(
+                    "INSERT INTO buckets (key, tokens, updated, full_at)"
+                    " VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET"
+                    " tokens = excluded.tokens, updated = excluded.updated,"
+                    " full_at = excluded.full_at",
+                    (key, tokens, now, now + full_in),
+                )
+                next_in = 0.0 if tokens >= 1 else (1 - tokens) / refill_rate
+                states.append((int(tokens), full_in, next_in))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        self._checks += 1
+        if self._checks % PRUNE_EVERY == 0:
+            self.prune(now)
+        return allowed, states
+
+    def prune(self, now=None):
+        # A full bucket behaves exactly like a missing one
+        self._connection().execute(
+            "DELETE FROM buckets WHERE full_at <= ?", (now or time.time(),)
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = getattr(settings, "RATE_LIMIT", {})
+                _store = BucketStore(
+                    options.get(
+                        "DB_PATH", os.path.join(settings.BASE_DIR, "ratelimit.sqlite3")
+                    )
+                )
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rate limits from DEFAULT_THROTTLE_RATES, enforced as token buckets that
+    are shared by all worker processes. Authenticated requests draw on the
+    "user" rate and anonymous ones on the "anon" rate; a view's
+    `throttle_scope` adds its rate on top, so a request goes through only
+    when both buckets have a token. Scopes listed in
+    RATE_LIMIT["STANDALONE_SCOPES"] replace the user/anon bucket instead,
+    for endpoints meant to allow more than the default rate. Clients are
+    keyed by user id, or by IP address when anonymous.
+
+    The outcome is left on the request for RateLimitHeadersMiddleware.
+    """
+
+    def get_scopes(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        options = getattr(settings, "RATE_LIMIT", {})
+        if scope and scope in options.get("STANDALONE_SCOPES", ()):
+            return [scope]
+        if request.user and request.user.is_authenticated:
+            scopes = ["user"]
+        else:
+            scopes = ["anon"]
+        if scope and scope not in scopes:
+            scopes.append(scope)
+        return scopes
+
+    def allow_request(self, request, view):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        scopes = [scope for scope in self.get_scopes(request, view) if rates.get(scope)]
+        if not scopes:
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+
+        limits = [parse_rate(rates[scope]) for scope in scopes]
+        allowed, states = get_store().consume(
+            [
+                (f"{scope}:{ident}", capacity, refill_rate)
+                for scope, (capacity, refill_rate) in zip(scopes, limits)
+            ]
+        )
+        # Retry once every bucket has a token again
+        self.next_in = max(next_in for _, _, next_in in states)
+
+        # The headers describe the bucket closest to running out
+        index = min(range(len(scopes)), key=lambda i: (states[i][0], -states[i][2]))
+        capacity, refill_rate = limits[index]
+        remaining, full_in, _ = states[index]
+        request._request.rate_limit = {
+            "limit": capacity,
+            "remaining": remaining,
+            "reset": math.ceil(full_in),
+            "policy": f"{capacity};w={round(capacity / refill_rate)}",
+        }
+        return allowed
+
+    def wait(self):
+        return math.ceil(self.next_in)
@@ -0,0 +1,127 @@
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db import transaction as db_transaction
+from django.db.models import Window
+from django.db.models.functions import Mod, RowNumber
+from django.utils import timezone
+
+from users.models import BankAccount, QueuedTransfer, Transaction
+from users.transfers import TransferError, transfer_funds
+from users.utils import log_action
+
+logger = logging.getLogger(__name__)
+
+
+def process_queued_transfer(queued):
+    accounts = BankAccount.objects.in_bulk(
+        [queued.from_account_number, queued.to_account_number],
+        field_name="account_number",
+    )
+    from_acc = accounts.get(queued.from_account_number)
+    to_acc = accounts.get(queued.to_account_number)
+    if from_acc is not None and from_acc.user_id != queued.user_id:
+        from_acc = None
+
+    try:
+        if from_acc is None:
+            raise TransferError("sender_not_found", "Sender account not found.")
+        if to_acc is None:
+            raise TransferError("recipient_not_found", "Recipient account not found.")
+        # The queue row is marked done in the same atomic block as the
+        # transfer, so a crashed worker never applies a transfer twice.
+        with db_transaction.atomic():
+            transfer_funds(
+                from_acc, to_acc, queued.amount, transaction_id=queued.transaction_id
+            )
+            queued.status = "success"
+            queued.processed_at = timezone.now()
+            queued.save(update_fields=["status", "processed_at"])
+    except TransferError as e:
+        with db_transaction.atomic():
+            Transaction.objects.create(
+                transaction_id=queued.transaction_id,
+                from_account=from_acc,
+                to_account=to_acc,
+                amount=queued.amount,
+                status="failed",
+                reason=e.reason,
+            )
+            queued.status = "failed"
+            queued.reason = e.reason
+            queued.processed_at = timezone.now()
+            queued.save(update_fields=["status", "reason", "processed_at"])
+        return queued
+
+    log_action(
+        queued.user,
+        f"Transferred {queued.amount} from {queued.from_account_number} "
+        f"to {queued.to_account_number} (queued)",
+    )
+    return queued
+
+
+def next_batch(slot, slots):
+    """Queued transfers of a slot's partitions, taking turns between partitions."""
+    return (
+        QueuedTransfer.objects.filter(status="queued")
+        .annotate(slot=Mod("partition", slots))
+        .filter(slot=slot)
+        .annotate(turn=Window(RowNumber(), partition_by="partition", order_by="id"))
+        .select_related("user")
+        .order_by("turn", "id")
+    )
+
+
+def drain_partitions(slot, slots, batch_size):
+    """
+    Process up to `batch_size` queued transfers whose partition falls in
+    `slot` (out of `slots`). Partitions take turns: every partition's oldest
+    transfer comes before any partition's second, so a long backlog on one
+    account doesn't starve the others. Only one worker may own a slot at a
+    time, otherwise per-account ordering is no longer guaranteed.
+
+    A transfer that hits a database error (a deadlock, a lock wait timeout)
+    is rolled back and stays queued for the next pass; the rest of its
+    partition waits for it so the order still holds. After
+    TRANSFER_QUEUE_MAX_ATTEMPTS such passes it is marked failed instead.
+    """
+    batch = list(next_batch(slot, slots)[:batch_size])
+    processed, stalled = 0, set()
+    for queued in batch:
+        if queued.partition in stalled:
+            continue
+        try:
+            process_queued_transfer(queued)
+        except DatabaseError:
+            logger.exception(
+                "Queued transfer %s failed (attempt %d)",
+                queued.transaction_id,
+                queued.attempts + 1,
+            )
+            if not _record_attempt(queued):
+                stalled.add(queued.partition)
+                continue
+        processed += 1
+    return processed
+
+
+def _record_attempt(queued):
+    """Count a failed pass; return True once the transfer has been given up on."""
+    queued.attempts += 1
+    fields = ["attempts"]
+    if queued.attempts >= settings.TRANSFER_QUEUE_MAX_ATTEMPTS:
+        queued.status = "failed"
+        queued.reason = "Could not be applied, please try again."
+        queued.processed_at = timezone.now()
+        fields += ["status", "reason", "processed_at"]
+    try:
+        queued.save(update_fields=fields)
+    except DatabaseError:
+        logger.exception(
+            "Could not record the attempt for queued transfer %s",
+            queued.transaction_id,
+        )
+        return False
+    return queued.status == "failed"
@@ -0,0 +1,220 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users import audit
+from users.account_numbers import is_valid_account_number
+from users.buffers import get_writer
+from users.ledger import post_transfers
+from users.models import BankAccount, DailyOutflow, Transaction
+
+DAILY_LIMIT = Decimal("5000.00")
+
+
+class TransferError(Exception):
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+def record_failed_transaction(txn):
+    audit.add_event(
+        "transfer_rejected",
+        transaction_id=str(txn.transaction_id),
+        amount=str(txn.amount),
+        reason=txn.reason,
+    )
+    # Rejections are written off the request path so bursts of bad transfers
+    # don't turn into a synchronous INSERT each.
+    options = getattr(settings, "FAILED_TRANSFER_BUFFER", {})
+    if not options.get("ENABLED", False):
+        txn.save()
+        return
+    get_writer("failed_transactions", Transaction, options).add(txn)
+
+
+def lock_accounts(*accounts):
+    # Always lock in primary-key order so two opposing transfers can't deadlock
+    pks = sorted({account.pk for account in accounts})
+    locked = BankAccount.objects.select_for_update().filter(pk__in=pks).order_by("pk")
+    return {account.pk: account for account in locked}
+
+
+def daily_limit_for(account):
+    limits = getattr(settings, "DAILY_TRANSFER_LIMITS", {})
+    return Decimal(limits.get(account.account_type, DAILY_LIMIT))
+
+
+def record_outflow(account, day, amount):
+    # Callers hold the account's row lock, so the UPDATE-then-INSERT can't race
+    updated = DailyOutflow.objects.filter(account=account, day=day).update(
+        total=F("total") + amount
+    )
+    if not updated:
+        DailyOutflow.objects.create(account=account, day=day, total=amount)
+
+
+def transfer_funds(from_acc, to_acc, amount, transaction_id=None):
+    """
+    Move `amount` from `from_acc` to `to_acc` and record the Transaction
+    (optionally under a pre-assigned `transaction_id`).
+
+    Both rows are locked for the duration of the atomic block, the balance
+    changes are single-statement conditional UPDATEs (never read-modify-write),
+    and any rejection raises TransferError with nothing written.
+    """
+    with db_transaction.atomic():
+        lock_accounts(from_acc, to_acc)
+
+        # The sender row is locked, so no concurrent transfer can slip in
+        # between this check and the debit below.
+        today = timezone.now().date()
+        sent_today = (
+            DailyOutflow.objects.filter(account=from_acc, day=today)
+            .values_list("total", flat=True)
+            .first()
+            or 0
+        )
+        if sent_today + amount > daily_limit_for(from_acc):
+            raise TransferError("daily_limit_exceeded", "Daily limit exceeded.")
+
+        debited = BankAccount.objects.filter(
+            pk=from_acc.pk, balance__gte=amount
+        ).update(balance=F("balance") - amount)
+        if not debited:
+            raise TransferError("insufficient_funds", "Insufficient funds.")
+        BankAccount.objects.filter(pk=to_acc.pk).update(balance=F("balance") + amount)
+        record_outflow(from_acc, today, amount)
+
+        txn = Transaction(
+            from_account=from_acc,
+            to_account=to_acc,
+            amount=amount,
+            status="success",
+        )
+        if transaction_id:
+            txn.transaction_id = transaction_id
+        txn.save()
+        post_transfers([txn])
+    return txn
+
+
+MAX_BATCH_SIZE = 1000
+
+
+def transfer_batch(user, items, all_or_nothing=True):
+    """
+    Apply a list of transfers ({"from_account", "to_account", "amount"}) for
+    `user` in one atomic block and return one result dict per item, in order.
+
+    All accounts are fetched with a single locking query, the items are
+    validated against running in-memory balances, and the writes are one
+    bulk UPDATE of the touched balances plus one bulk INSERT of Transactions.
+    In all-or-nothing mode a single failing item means nothing is applied.
+    """
+    numbers = {item["from_account"] for item in items} | {
+        item["to_account"] for item in items
+    }
+    # Malformed numbers can't match an account; keep them out of the lookup
+    numbers = {number for number in numbers if is_valid_account_number(number)}
+    results = []
+    failed_txns = []
+    with db_transaction.atomic():
+        accounts = {
+            account.account_number: account
+            for account in BankAccount.objects.select_for_update()
+            .filter(account_number__in=numbers)
+            .order_by("pk")
+        }
+        today = timezone.now().date()
+        outflows = {
+            outflow.account_id: outflow
+            for outflow in DailyOutflow.objects.filter(
+                account__in=[a.pk for a in accounts.values() if a.user_id == user.pk],
+                day=today,
+            )
+        }
+
+        success_txns = []
+        touched = {}
+        for index, item in enumerate(items):
+            from_acc = accounts.get(item["from_account"])
+            to_acc = accounts.get(item["to_account"])
+            amount = item["amount"]
+            txn = Transaction(
+                from_account=(
+                    from_acc if from_acc and from_acc.user_id == user.pk else None
+                ),
+                to_account=to_acc,
+                amount=amount,
+            )
+
+            error = None
+            if txn.from_account is None:
+                error = TransferError("sender_not_found", "Sender account not found.")
+            elif to_acc is None and not is_valid_account_number(item["to_account"]):
+                error = TransferError(
+                    "invalid_recipient_account", "Invalid recipient account number."
+                )
+            elif to_acc is None:
+                error = TransferError(
+                    "recipient_not_found", "Recipient account not found."
+                )
+            elif from_acc.balance < amount:
+                error = TransferError("insufficient_funds", "Insufficient funds.")
+            elif getattr(
+                outflows.get(from_acc.pk), "total", 0
+            ) + amount > daily_limit_for(from_acc):
+                error = TransferError("daily_limit_exceeded", "Daily limit exceeded.")
+
+            if error:
+                txn.status = "failed"
+                txn.reason = error.reason
+                failed_txns.append(txn)
+                results.append(
+                    {"index": index, "status": "failed", "error": error.code}
+                )
+                continue
+
+            from_acc.balance -= amount
+            to_acc.balance += amount
+            outflow = outflows.setdefault(
+                from_acc.pk, DailyOutflow(account=from_acc, day=today, total=0)
+            )
+            outflow.total += amount
+            touched[from_acc.pk] = from_acc
+            touched[to_acc.pk] = to_acc
+            txn.status = "success"
+            success_txns.append(txn)
+            results.append(
+                {
+                    "index": index,
+                    "status": "success",
+                    "transaction_id": str(txn.transaction_id),
+                }
+            )
+
+        if failed_txns and all_or_nothing:
+            # Nothing is applied; the rows stay locked until the block exits
+            for result in results:
+                if result["status"] == "success":
+                    result["status"] = "not_applied"
+                    del result["transaction_id"]
+        else:
+            # Rows are locked, so writing back the running balances is safe
+            BankAccount.objects.bulk_update(touched.values(), ["balance"])
+            DailyOutflow.objects.bulk_update(
+                [o for o in outflows.values() if o.pk], ["total"]
+            )
+            DailyOutflow.objects.bulk_create([o for o in outflows.values() if not o.pk])
+            Transaction.objects.bulk_create(success_txns + failed_txns)
+            post_transfers(success_txns)
+            failed_txns = []
+
+    if failed_txns:
+        Transaction.objects.bulk_create(failed_txns)
+    return results
@@ -1,27 +1,66 @@
 from django.urls import path
 from users.views import (
     RegisterView,
+    TokenObtainView,
     PendingKYCListView,
     KYCVerifyView,
+    KYCBulkVerifyView,
+    KYCClaimView,
+    KYCDocumentView,
+    KYCReleaseView,
     CreateBankAccountView,
     ListBankAccountsView,
+    AccountStatementView,
+    AccountStatementExportView,
+    AccountBalanceAsOfView,
     TransferMoneyView,
+    TransferBatchView,
+    TransferStatusView,
     AuditLogListView,
+    AuditStatsView,
+    WriterStatsView,
     KYCReSubmitView,
-    ResetPasswordView
+    ResetPasswordView,
 )
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     path("auth/register/", RegisterView.as_view(), name="register"),
-    path("auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("auth/token/", TokenObtainView.as_view(), name="token_obtain_pair"),
     path("auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("kyc/pending/", PendingKYCListView.as_view(), name="pending_kyc"),
     path("kyc/verify/", KYCVerifyView.as_view(), name="kyc_verify"),
+    path("kyc/verify/bulk/", KYCBulkVerifyView.as_view(), name="kyc_verify_bulk"),
+    path("kyc/<int:kyc_id>/document/", KYCDocumentView.as_view(), name="kyc_document"),
+    path("kyc/claim/", KYCClaimView.as_view(), name="kyc_claim"),
+    path("kyc/release/", KYCReleaseView.as_view(), name="kyc_release"),
     path("accounts/", CreateBankAccountView.as_view(), name="create_account"),
     path("accounts/list/", ListBankAccountsView.as_view(), name="list_accounts"),
+    path(
+        "accounts/<str:account_number>/transactions/",
+        AccountStatementView.as_view(),
+        name="account_statement",
+    ),
+    path(
+        "accounts/<str:account_number>/balance/",
+        AccountBalanceAsOfView.as_view(),
+        name="account_balance_as_of",
+    ),
+    path(
+        "accounts/<str:account_number>/transactions/export/",
+        AccountStatementExportView.as_view(),
+        name="account_statement_export",
+    ),
     path("transfer/", TransferMoneyView.as_view(), name="transfer_money"),
+    path("transfer/batch/", TransferBatchView.as_view(), name="transfer_batch"),
+    path(
+        "transfer/<uuid:transaction_id>/",
+        TransferStatusView.as_view(),
+        name="transfer_status",
+    ),
     path("audit/", AuditLogListView.as_view(), name="audit-logs"),
+    path("audit/stats/", AuditStatsView.as_view(), name="audit_stats"),
+    path("metrics/writers/", WriterStatsView.as_view(), name="writer_stats"),
     path("kyc/resubmit/", KYCReSubmitView.as_view(), name="kyc_resubmit"),
     path("auth/reset-password/", ResetPasswordView.as_view(), name="reset_password"),
 ]
@@ -1,7 +1,19 @@
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler
+
 from users.models import AuditLog
+from users import audit
+from users.hashers import HashingPoolSaturated
 
-def log_action(user, action, ip_address=None):
-    AuditLog.objects.create(user=user, action=action, ip_address=ip_address)
+def log_action(user, action, ip_address=None, durable=True):
+    # Inside a request the event joins that request's single audit row
+    context = audit.current_context()
+    if context is not None:
+        context.add(action, user=user, durable=durable)
+        return
+    audit.record(
+        [AuditLog(user=user, action=action, ip_address=ip_address)], durable
+    )
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -10,3 +22,11 @@ def get_client_ip(request):
     else:
         ip = request.META.get("REMOTE_ADDR")
     return ip
+
+def exception_handler(exc, context):
+    # A full hashing pool is load shedding, not a server error
+    if isinstance(exc, HashingPoolSaturated):
+        return Response(
+            {"detail": str(exc)}, status=503, headers={"Retry-After": "1"}
+        )
+    return drf_exception_handler(exc, context)
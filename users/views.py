@@ -1,33 +1,82 @@
+import mimetypes
+
 from django.shortcuts import render
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
 from rest_framework import generics, permissions, status, serializers
+from rest_framework.exceptions import NotFound
 from users.serializers import (
     UserRegisterSerializer,
     PendingKYCSerializer,
     KYCVerifySerializer,
+    KYCBulkVerifySerializer,
+    KYCClaimSerializer,
+    KYCReleaseSerializer,
     BankAccountCreateSerializer,
     BankAccountSerializer,
     TransferSerializer,
+    TransferBatchSerializer,
+    QueuedTransferSerializer,
     AuditLogSerializer,
+    AuditStatsQuerySerializer,
     KYCReSubmitSerializer,
-    ResetPasswordSerializer
+    ResetPasswordSerializer,
 )
 from rest_framework.response import Response
-from users.models import KYC, BankAccount, AuditLog
+from users.models import (
+    KYC,
+    DocumentBlob,
+    BankAccount,
+    AuditLog,
+    QueuedTransfer,
+    Transaction,
+)
 from users.permissions import IsAdminUser, IsAuditorUser
 from rest_framework.views import APIView
-from users.utils import log_action, get_client_ip
+from rest_framework_simplejwt.views import TokenObtainPairView
+from users.utils import log_action
+from users.transfers import transfer_batch
+from users.idempotency import IdempotentPostMixin
+from users.pagination import (
+    AuditLogPagination,
+    KeysetPagination,
+    KYCQueuePagination,
+)
+from users.ledger import balance_as_of
+from users.buffers import writer_stats
+from users.delivery import serve_file
+from users.document_pipeline import RENDITION_KINDS, rendition_name
+from users.audit_rollups import rollup_stats
+from users.kyc_review import (
+    KYCReviewError,
+    claim_next,
+    claimable,
+    decide,
+    decide_bulk,
+    release,
+    with_document_info,
+)
+from users.statements import (
+    statement_legs,
+    statement_entry,
+    stream_csv,
+    stream_ndjson,
+)
 
 # Create your views here.
 
 
+class TokenObtainView(TokenObtainPairView):
+    throttle_scope = "strict"  # password guessing
+
+
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserRegisterSerializer
     permission_classes = [permissions.AllowAny]
 
     def perform_create(self, serializer):
         user = serializer.save()
-        ip = get_client_ip(self.request)
-        log_action(user, "User registered", ip)
+        log_action(user, "User registered")
 
 
 class ResetPasswordView(generics.GenericAPIView):
@@ -40,8 +89,7 @@ class ResetPasswordView(generics.GenericAPIView):
         user = serializer.save()
 
         # Log the password reset attempt
-        ip = get_client_ip(request)
-        log_action(user, "password_reset", ip)
+        log_action(user, "password_reset")
 
         return Response(
             {"message": "Password reset successfully."}, status=status.HTTP_200_OK
@@ -59,8 +107,7 @@ class KYCReSubmitView(APIView):
         )
 
         # Audit logging
-        ip = get_client_ip(request)
-        log_action(request.user, f"Re-submitted KYC (id={kyc.id})", ip)
+        log_action(request.user, f"Re-submitted KYC (id={kyc.id})")
 
         return Response(
             {
@@ -76,14 +123,93 @@ class KYCReSubmitView(APIView):
 class PendingKYCListView(generics.ListAPIView):
     serializer_class = PendingKYCSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    throttle_scope = "list"
+    pagination_class = KYCQueuePagination
 
     def get_queryset(self):
-        return KYC.objects.filter(status="pending").order_by("submitted_at")
+        # ?available=true hides records another reviewer currently holds
+        if self.request.query_params.get("available") == "true":
+            queryset = claimable()
+        else:
+            queryset = KYC.objects.filter(status="pending")
+        return with_document_info(queryset).select_related("user")
+
+
+# --- KYC document (admins and the owning customer) ---
+class KYCDocumentView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, kyc_id):
+        try:
+            kyc = KYC.objects.get(id=kyc_id)
+        except KYC.DoesNotExist:
+            raise NotFound("KYC not found")
+        # Other customers get the same 404 as for a missing record
+        if request.user.role != "admin" and kyc.user_id != request.user.id:
+            raise NotFound("KYC not found")
+
+        kind = request.query_params.get("rendition")
+        if kind:
+            blob = DocumentBlob.objects.filter(digest=kyc.digest).first()
+            if kind not in RENDITION_KINDS or not (blob and blob.has_renditions):
+                raise NotFound("Rendition not available")
+            name = rendition_name(kyc.digest, kind)
+            return serve_file(
+                request,
+                name,
+                default_storage.path(name),
+                "image/jpeg",
+                etag=f"{kyc.digest}-{kind}",
+            )
+
+        blob = DocumentBlob.objects.filter(digest=kyc.digest).first()
+        content_type = (
+            (blob and blob.content_type)
+            or mimetypes.guess_type(kyc.file.name)[0]
+            or "application/octet-stream"
+        )
+        return serve_file(
+            request,
+            kyc.file.name,
+            kyc.file.path,
+            content_type,
+            etag=kyc.digest,
+            filename=f"kyc-{kyc.id}{mimetypes.guess_extension(content_type) or ''}",
+        )
+
+
+# --- KYC review queue ---
+class KYCClaimView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        serializer = KYCClaimSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        claimed = claim_next(request.user, serializer.validated_data["count"])
+        return Response(
+            {
+                "claimed": len(claimed),
+                "results": PendingKYCSerializer(
+                    claimed, many=True, context={"request": request}
+                ).data,
+            }
+        )
+
+
+class KYCReleaseView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        serializer = KYCReleaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        released = release(request.user, serializer.validated_data["kyc_ids"])
+        return Response({"released": released})
 
 
 # --- Verify/Reject KYC ---
 class KYCVerifyView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    ERROR_STATUS = {"not_found": 404, "already_decided": 409, "claimed": 409}
 
     def post(self, request):
         serializer = KYCVerifySerializer(data=request.data)
@@ -92,28 +218,19 @@ class KYCVerifyView(APIView):
         kyc_id = serializer.validated_data["kyc_id"]
         status_value = serializer.validated_data["status"]
         notes = serializer.validated_data.get("notes", "")
+        redecide = serializer.validated_data["redecide"]
 
         try:
-            kyc = KYC.objects.get(id=kyc_id)
-        except KYC.DoesNotExist:
-            return Response({"error": "KYC not found"}, status=404)
+            kyc = decide(request.user, kyc_id, status_value, notes, redecide)
+        except KYCReviewError as e:
+            return Response({"error": e.reason}, status=self.ERROR_STATUS[e.code])
 
-        kyc.status = status_value
-        kyc.notes = notes
-        kyc.save()
-
-        # Update user kyc_verified flag if approved, leave False if rejected
         if status_value == "verified":
-            kyc.user.kyc_verified = True
             message = "KYC approved successfully."
         else:
-            kyc.user.kyc_verified = False
             message = "KYC rejected successfully."
 
-        kyc.user.save()
-
-        ip = get_client_ip(request)
-        log_action(request.user, f"KYC {status_value} for user {kyc.user.username}", ip)
+        log_action(request.user, f"KYC {status_value} for user {kyc.user.username}")
 
         return Response(
             {
@@ -125,33 +242,145 @@ class KYCVerifyView(APIView):
         )
 
 
-class CreateBankAccountView(generics.CreateAPIView):
+class KYCBulkVerifyView(generics.GenericAPIView):
+    serializer_class = KYCBulkVerifySerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = decide_bulk(request.user, serializer.validated_data["decisions"])
+        counts = {"verified": 0, "rejected": 0, "failed": 0}
+        for result in results:
+            counts[result["status"]] += 1
+
+        log_action(
+            request.user,
+            f"Bulk KYC review: {counts['verified']} verified, "
+            f"{counts['rejected']} rejected, {counts['failed']} failed",
+        )
+        return Response({**counts, "results": results})
+
+
+class CreateBankAccountView(IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = BankAccountCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
         account = serializer.save()
-        ip = get_client_ip(self.request)
-        log_action(
-            self.request.user, f"Created bank account {account.account_number}", ip
-        )
+        log_action(self.request.user, f"Created bank account {account.account_number}")
 
 
 class ListBankAccountsView(generics.ListAPIView):
     serializer_class = BankAccountSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "list"
 
     def get_queryset(self):
         return BankAccount.objects.filter(user=self.request.user)
 
 
-class TransferMoneyView(generics.CreateAPIView):
+class AccountStatementMixin:
+    def get_account(self):
+        account = BankAccount.objects.filter(
+            account_number=self.kwargs["account_number"], user=self.request.user
+        ).first()
+        if account is None:
+            raise NotFound("Account not found.")
+        return account
+
+    def get_legs(self, account):
+        dates = {}
+        for param in ("since", "until"):
+            value = self.request.query_params.get(param)
+            try:
+                dates[param] = (
+                    serializers.DateField().to_internal_value(value) if value else None
+                )
+            except serializers.ValidationError as e:
+                raise serializers.ValidationError({param: e.detail})
+        return statement_legs(account, **dates)
+
+
+# --- Account statement (keyset paginated) ---
+class AccountStatementView(AccountStatementMixin, generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "list"
+    pagination_class = KeysetPagination
+
+    def get(self, request, account_number):
+        account = self.get_account()
+        rows = self.paginate_queryset(self.get_legs(account))
+        return self.get_paginated_response(
+            [statement_entry(row, account.account_number) for row in rows]
+        )
+
+
+# --- Account statement export (streamed, constant memory) ---
+class AccountStatementExportView(AccountStatementMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    EXPORT_TYPES = {
+        "csv": (stream_csv, "text/csv"),
+        "ndjson": (stream_ndjson, "application/x-ndjson"),
+    }
+
+    def get(self, request, account_number):
+        # "format" is reserved by DRF content negotiation, hence "type"
+        export_type = request.query_params.get("type", "csv")
+        if export_type not in self.EXPORT_TYPES:
+            return Response({"error": "type must be csv or ndjson"}, status=400)
+        stream, content_type = self.EXPORT_TYPES[export_type]
+
+        account = self.get_account()
+        legs = self.get_legs(account)
+
+        log_action(
+            request.user,
+            f"Exported {export_type} statement for account {account.account_number}",
+        )
+
+        response = StreamingHttpResponse(
+            stream(legs, account.account_number), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="statement-{account.account_number}.{export_type}"'
+        )
+        return response
+
+
+class AccountBalanceAsOfView(AccountStatementMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, account_number):
+        account = self.get_account()
+        value = request.query_params.get("as_of")
+        if not value:
+            return Response({"error": "as_of is required"}, status=400)
+        try:
+            as_of = serializers.DateTimeField().to_internal_value(value)
+        except serializers.ValidationError as e:
+            return Response({"as_of": e.detail}, status=400)
+
+        return Response(
+            {
+                "account_number": account.account_number,
+                "as_of": as_of.isoformat(),
+                "balance": str(balance_as_of(account, as_of)),
+            }
+        )
+
+
+class TransferMoneyView(IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = TransferSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "strict"
 
     def create(self, request, *args, **kwargs):
+        if "respond-async" in request.headers.get("Prefer", ""):
+            return self.enqueue(request)
+
         serializer = self.get_serializer(data=request.data)
-        ip = get_client_ip(request)
         try:
             serializer.is_valid(raise_exception=True)
             txn = serializer.save()
@@ -159,7 +388,6 @@ class TransferMoneyView(generics.CreateAPIView):
                 request.user,
                 f"Transferred {txn.amount} from {txn.from_account.account_number} "
                 f"to {txn.to_account.account_number}",
-                ip,
             )
             return Response(
                 {
@@ -180,14 +408,170 @@ class TransferMoneyView(generics.CreateAPIView):
                     return Response({"error": "Daily limit exceeded."}, status=400)
 
             # fallback
-            log_action(request.user, f"Transfer failed: {error_message}", ip)
+            log_action(request.user, f"Transfer failed: {errors}")
             return Response({"error": errors}, status=400)
 
+    def enqueue(self, request):
+        serializer = QueuedTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queued = serializer.save(user=request.user)
+
+        log_action(
+            request.user,
+            f"Queued transfer {queued.transaction_id} of {queued.amount} from "
+            f"{queued.from_account_number} to {queued.to_account_number}",
+        )
+        return Response(
+            {
+                "transaction_id": str(queued.transaction_id),
+                "status": queued.status,
+                "message": "Transfer queued for processing.",
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class TransferStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, transaction_id):
+        queued = QueuedTransfer.objects.filter(
+            transaction_id=transaction_id, user=request.user
+        ).first()
+        if queued:
+            return Response(
+                {
+                    "transaction_id": str(queued.transaction_id),
+                    "status": queued.status,
+                    "reason": queued.reason,
+                }
+            )
+
+        txn = Transaction.objects.filter(
+            transaction_id=transaction_id, from_account__user=request.user
+        ).first()
+        if txn is None:
+            return Response({"error": "Transaction not found"}, status=404)
+        return Response(
+            {
+                "transaction_id": str(txn.transaction_id),
+                "status": txn.status,
+                "reason": txn.reason,
+            }
+        )
+
+
+class TransferBatchView(generics.GenericAPIView):
+    serializer_class = TransferBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "strict"
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        all_or_nothing = serializer.validated_data["mode"] == "all_or_nothing"
+
+        results = transfer_batch(
+            request.user, serializer.validated_data["transfers"], all_or_nothing
+        )
+        succeeded = sum(1 for r in results if r["status"] == "success")
+        failed = sum(1 for r in results if r["status"] == "failed")
+
+        log_action(
+            request.user,
+            f"Batch transfer ({serializer.validated_data['mode']}): "
+            f"{succeeded} succeeded, {failed} failed",
+        )
+
+        return Response(
+            {
+                "mode": serializer.validated_data["mode"],
+                "succeeded": succeeded,
+                "failed": failed,
+                "results": results,
+            },
+            status=400 if failed and all_or_nothing else 200,
+        )
+
+
+class WriterStatsView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        # Counters are per worker process
+        return Response(writer_stats())
+
+
+class AuditStatsView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAuditorUser]
+
+    def get(self, request):
+        serializer = AuditStatsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+
+        results = rollup_stats(
+            query["since"],
+            query["until"],
+            query["group_by"],
+            {
+                "action_class": query.get("action_class"),
+                "user": query.get("user"),
+                "ip": query.get("ip"),
+            },
+            query["limit"],
+        )
+        return Response(
+            {
+                "since": query["since"],
+                "until": query["until"],
+                "group_by": query["group_by"],
+                "results": results,
+            }
+        )
+
 
 class AuditLogListView(generics.ListAPIView):
     permission_classes = [
         permissions.IsAuthenticated,
         IsAuditorUser,
     ]  # Only auditors can access
+    throttle_scope = "list"
     serializer_class = AuditLogSerializer
-    queryset = AuditLog.objects.all()
+    pagination_class = AuditLogPagination
+
+    def get_filters(self):
+        """Validated filters, shared by the table query and the archive scan."""
+        params = self.request.query_params
+        filters = {}
+        if params.get("user"):
+            try:
+                filters["user"] = int(params["user"])
+            except ValueError:
+                raise serializers.ValidationError({"user": "Must be a user id."})
+        if params.get("ip"):
+            filters["ip"] = params["ip"]
+        if params.get("action"):
+            filters["action"] = params["action"]
+        for param in ("since", "until"):
+            if params.get(param):
+                try:
+                    filters[param] = serializers.DateTimeField().to_internal_value(
+                        params[param]
+                    )
+                except serializers.ValidationError as e:
+                    raise serializers.ValidationError({param: e.detail})
+        return filters
+
+    def get_queryset(self):
+        queryset = AuditLog.objects.values(*AuditLogSerializer.VALUES)
+        lookups = {
+            "user": "user_id",
+            "ip": "ip_address",
+            "action": "action__startswith",
+            "since": "timestamp__gte",
+            "until": "timestamp__lt",
+        }
+        for name, value in self.get_filters().items():
+            queryset = queryset.filter(**{lookups[name]: value})
+        return queryset